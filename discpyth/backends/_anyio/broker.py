@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from anyio import (
+    CancelScope,
+    EndOfStream,
+    Event,
+    Lock,
+    connect_tcp,
+    connect_unix,
+    create_task_group,
+    create_tcp_listener,
+    create_unix_listener,
+    sleep,
+)
+
+from ...http.broker import BaseBrokerSession, BaseBucketBroker, BaseSharedBucketManager
+from ...http.exceptions import ConnectionLost
+from .http import BucketManager
+
+if TYPE_CHECKING:
+    from types import TracebackType
+    from typing import Any
+
+    from anyio.abc import ByteStream, TaskGroup
+    from typing_extensions import Self
+
+    from ...http.ratelimit import BaseBucketManager
+
+
+class SharedBucketManager(BaseSharedBucketManager):
+    """
+    Runs its background tasks in `task_group` if one is given, otherwise in
+    a task group of its own for the duration of `async with`.
+    """
+
+    socket: ByteStream
+    connect_lock: Lock
+    outbox_ready: Event
+    task_group: TaskGroup
+    owns_task_group: bool
+    cancel_scopes: list[CancelScope]
+
+    def __init__(
+        self: Self,
+        address: str | tuple[str, int],
+        *,
+        task_group: TaskGroup | None = None,
+    ) -> None:
+        BaseSharedBucketManager.__init__(self, address)
+        self.connect_lock = Lock()
+        self.task_group = task_group
+        self.owns_task_group = False
+        self.cancel_scopes = []
+
+    async def connect(self: Self) -> Self:
+        if self.task_group is None:
+            raise RuntimeError(
+                "Pass a task_group or use the manager as `async with "
+                "SharedBucketManager()`"
+            )
+        return await BaseSharedBucketManager.connect(self)
+
+    async def _open_socket(self: Self) -> ByteStream:
+        if isinstance(self.address, str):
+            return await connect_unix(self.address)
+        return await connect_tcp(*self.address)
+
+    async def _stream_recv(self: Self, max_bytes: int) -> bytes:
+        try:
+            return await self.socket.receive(max_bytes)
+        except EndOfStream:
+            return b""
+
+    async def _stream_send(self: Self, data: bytes) -> None:
+        await self.socket.send(data)
+
+    def _create_event(self: Self) -> Event:
+        return Event()
+
+    async def _spawn(self: Self, func: Any, *args: Any) -> None:
+        scope = CancelScope()
+        self.cancel_scopes.append(scope)
+
+        async def run() -> None:
+            try:
+                with scope:
+                    await func(*args)
+            finally:
+                self.cancel_scopes.remove(scope)
+
+        self.task_group.start_soon(run)
+
+    async def _close_socket(self: Self) -> None:
+        for scope in list(self.cancel_scopes):
+            scope.cancel()
+        # Closing the stream under a receive that is still being cancelled
+        # fails, so let the tasks finish first
+        while self.cancel_scopes:
+            await sleep(0)
+        await self.socket.aclose()
+
+    async def aclose(self: Self) -> None:
+        if self.socket is not None:
+            await self._close_socket()
+            self.socket = None
+            self._fail(ConnectionLost("rate-limit broker connection closed"))
+
+    async def __aenter__(self: Self) -> Self:
+        if self.task_group is None:
+            self.task_group = create_task_group()
+            self.owns_task_group = True
+            await self.task_group.__aenter__()
+        try:
+            return await self.connect()
+        except BaseException as exc:
+            await self._exit_task_group(type(exc), exc, exc.__traceback__)
+            raise
+
+    async def __aexit__(
+        self: Self,
+        exc_type: type[BaseException] | None,
+        exc_val: BaseException | None,
+        exc_tb: TracebackType | None,
+    ) -> None:
+        try:
+            await self.aclose()
+        finally:
+            await self._exit_task_group(exc_type, exc_val, exc_tb)
+
+    async def _exit_task_group(
+        self: Self,
+        exc_type: type[BaseException] | None,
+        exc_val: BaseException | None,
+        exc_tb: TracebackType | None,
+    ) -> None:
+        if self.owns_task_group:
+            task_group, self.task_group = self.task_group, None
+            self.owns_task_group = False
+            task_group.cancel_scope.cancel()
+            await task_group.__aexit__(exc_type, exc_val, exc_tb)
+
+
+class BrokerSession(BaseBrokerSession):
+    socket: ByteStream
+    write_lock: Lock
+    task_group: TaskGroup
+
+    def __init__(
+        self: Self,
+        manager: BaseBucketManager,
+        socket: ByteStream,
+        task_group: TaskGroup,
+    ) -> None:
+        BaseBrokerSession.__init__(self, manager)
+        self.socket = socket
+        self.write_lock = Lock()
+        self.task_group = task_group
+
+    async def _stream_recv(self: Self, max_bytes: int) -> bytes:
+        try:
+            return await self.socket.receive(max_bytes)
+        except EndOfStream:
+            return b""
+
+    async def _stream_send(self: Self, data: bytes) -> None:
+        await self.socket.send(data)
+
+    async def _spawn(self: Self, func: Any, *args: Any) -> None:
+        self.task_group.start_soon(func, *args)
+
+
+class BucketBroker(BaseBucketBroker):
+    def __init__(self: Self, manager: BaseBucketManager | None = None) -> None:
+        BaseBucketBroker.__init__(self, manager or BucketManager())
+
+    async def serve(self: Self, address: str | tuple[str, int]) -> None:
+        if isinstance(address, str):
+            listener = await create_unix_listener(address)
+        else:
+            host, port = address
+            listener = await create_tcp_listener(local_host=host, local_port=port)
+
+        async with listener:
+            await listener.serve(self._handle)
+
+    async def _handle(self: Self, socket: ByteStream) -> None:
+        async with socket, create_task_group() as task_group:
+            try:
+                await BrokerSession(self.manager, socket, task_group).run()
+            except Exception:
+                # One misbehaving peer must not take the broker down
+                pass
+            task_group.cancel_scope.cancel()
@@ -1,116 +1,112 @@
 from __future__ import annotations
 
-from ssl import create_default_context
 from typing import TYPE_CHECKING
 from urllib.parse import urlparse
-from weakref import WeakValueDictionary
 
-from anyio import BrokenResourceError, EndOfStream, Event, Lock, connect_tcp, sleep
-from anyio.streams.tls import TLSStream
-from certifi import where
-from h2.config import H2Configuration
-from h2.connection import H2Connection
+from anyio import (
+    BrokenResourceError,
+    CancelScope,
+    EndOfStream,
+    Event,
+    Lock,
+    aclose_forcefully,
+    connect_tcp,
+    create_task_group,
+    fail_after,
+    sleep,
+)
+from anyio.streams.tls import TLSAttribute, TLSStream
 
-from ...utils import exponential_backoff
 from ...http.base import BaseHTTPClient, ConnectionState
+from ...http.pool import BaseHTTPPool
+from ...http.ratelimit import BaseMemoryBucketManager
+from ...http.retry import RetryPolicy
+from ...http.tls import create_ssl_context
+from ...utils import exponential_backoff
 
 if TYPE_CHECKING:
-    from ssl import SSLContext
     from types import TracebackType
+    from typing import Any
 
+    from anyio.abc import TaskGroup
     from typing_extensions import Self
 
+    from ...http.cache import BaseResponseCache
+    from ...http.ratelimit import BaseBucketManager
+    from ...http.tls import ResumingSSLContext
+    from ...http.types import Timeout
 
-def create_ssl_context() -> SSLContext:
-    context = create_default_context(
-        cafile=where(),
-    )
-    context.set_alpn_protocols(["h2"])
-    return context
-
-
-class Bucket:
-    lock: Lock
-
-    def __init__(self, lock: Lock) -> None:
-        self.lock = lock
-        self.deferred = False
-
-    async def __aenter__(self) -> Lock:
-        await self.lock.acquire()
-        return self
-
-    async def __aexit__(
-        self,
-        exc_type: type[BaseException] | None,
-        exc_val: BaseException | None,
-        exc_tb: TracebackType | None,
-    ) -> None:
-        if self.deferred:
-            return
-        await self.release()
-
-    def defer(self) -> None:
-        if not self.deferred:
-            self.deferred = True
-
-    async def release(self) -> None:
-        self.lock.release()
-
-
-class BucketManager:
-    buckets: dict[str, Bucket]
-    global_limiter: Event
-
-    def __init__(self: Self) -> None:
-        self.global_limiter = None
-        self.buckets = WeakValueDictionary()
-
-    def get(self, key: str) -> Bucket:
-        try:
-            bucket = self.buckets[key]
-        except KeyError:
-            bucket = self.buckets[key] = Bucket(Lock())
-        return bucket
 
-    async def clear_global(self: Self) -> None:
-        self.global_limiter.set()
+class BucketManager(BaseMemoryBucketManager):
+    def _create_event(self: Self) -> Event:
+        return Event()
 
-    def is_global(self: Self) -> bool:
-        if self.global_limiter is None:
-            return False
-        return self.global_limiter.is_set()
-
-    async def wait_global(self: Self) -> None:
-        await self.global_limiter.wait()
-
-    async def set_global(self: Self) -> None:
-        self.global_limiter = Event()
+    async def _sleep(self: Self, seconds: float) -> None:
+        await sleep(seconds)
 
 
 class HTTPClient(BaseHTTPClient):
+    """
+    Runs its background tasks in `task_group` if one is given, otherwise in
+    a task group of its own for the duration of `async with HTTPClient()`.
+    """
+
     socket: TLSStream
-    state_lock: Lock
-    bucket_manager: BucketManager
+    bucket_manager: BaseBucketManager
+    ssl_context: ResumingSSLContext
     connect_lock: Lock
-    read_lock: Lock
+    reconnect_lock: Lock
+    window_updated: Event
+    stream_slot_freed: Event
+    output_ready: Event
+    output_flushed: Event
+    task_group: TaskGroup
+    owns_task_group: bool
+    cancel_scopes: list[CancelScope]
+    background_scopes: list[CancelScope]
+    keepalive_scope: CancelScope | None
 
     def __init__(
         self: Self,
         max_reconnect_retries: int = 3,
         max_request_retries: int = 3,
         default_headers: list[tuple[bytes, bytes]] | None = None,
+        retry_policy: RetryPolicy | None = None,
+        *,
+        bucket_manager: BaseBucketManager | None = None,
+        task_group: TaskGroup | None = None,
+        keepalive_interval: float | None = None,
+        keepalive_timeout: float = 20.0,
+        ssl_context: ResumingSSLContext | None = None,
+        timeout: Timeout | None = None,
+        single_flight: bool = False,
+        response_cache: BaseResponseCache | None = None,
     ) -> None:
         BaseHTTPClient.__init__(
             self,
             max_reconnect_retries=max_reconnect_retries,
             max_request_retries=max_request_retries,
             default_headers=default_headers,
+            retry_policy=retry_policy,
+            keepalive_interval=keepalive_interval,
+            keepalive_timeout=keepalive_timeout,
+            timeout=timeout,
+            single_flight=single_flight,
+            response_cache=response_cache,
         )
-        self.state_lock = Lock()
-        self.bucket_manager = BucketManager()
+        self.bucket_manager = bucket_manager or BucketManager()
+        self.ssl_context = ssl_context or create_ssl_context()
         self.connect_lock = Lock()
-        self.read_lock = Lock()
+        self.reconnect_lock = Lock()
+        self.window_updated = Event()
+        self.stream_slot_freed = Event()
+        self.output_ready = Event()
+        self.output_flushed = Event()
+        self.task_group = task_group
+        self.owns_task_group = False
+        self.cancel_scopes = []
+        self.background_scopes = []
+        self.keepalive_scope = None
 
     @property
     def port(self: Self) -> int:
@@ -118,45 +114,49 @@ class HTTPClient(BaseHTTPClient):
 
     async def connect(self: Self, url: str) -> Self:
         if self.connection_initialized:
-            return
+            return self
+        if self.task_group is None:
+            raise RuntimeError(
+                "Pass a task_group or use the client as `async with HTTPClient()`"
+            )
 
+        self.closed = False
         self.url = urlparse(url)
         self.server_name = self.url.netloc.encode("ascii")
         server_name = self.url.netloc
         self.connection = None
 
         retries = self.max_reconnect_retries
-
-        back_off = exponential_backoff(2, 0)
-
-        ssl_context = create_ssl_context()
+        attempt = 0
 
         async with self.connect_lock:
             while True:
                 try:
-                    self.socket = await connect_tcp(
-                        server_name,
-                        self.port,
-                        tls=True,
-                        ssl_context=ssl_context,
-                    )
+                    with fail_after(self.timeout.connect):
+                        self.socket = await connect_tcp(
+                            server_name,
+                            self.port,
+                            tls=True,
+                            ssl_context=self.ssl_context,
+                        )
                 except (OSError, TimeoutError, BrokenResourceError):
                     if retries == 0:
                         raise
                     retries -= 1
-                    back_off = exponential_backoff(2, back_off)
-                    await sleep(back_off)
+                    await sleep(exponential_backoff(attempt))
+                    attempt += 1
                 else:
                     self.connection_initialized = True
                     break
 
         assert isinstance(self.socket, TLSStream)
 
-        self.connection = H2Connection(
-            config=H2Configuration(validate_inbound_headers=False)
-        )
-        self.connection.initiate_connection()
-        await self._stream_send(self.connection.data_to_send())
+        await self._stream_send(self._initiate_connection())
+        self.state = ConnectionState.CONNECTED
+
+        await self._spawn(self._read_loop)
+        await self._spawn(self._write_loop)
+        await self._start_keepalive()
         return self
 
     async def _stream_recv(self: Self, max_bytes: int) -> bytes:
@@ -169,8 +169,231 @@ class HTTPClient(BaseHTTPClient):
     async def _stream_send(self: Self, data: bytes) -> None:
         await self.socket.send(data)
 
+    def _create_event(self: Self) -> Event:
+        return Event()
+
+    async def _spawn(self: Self, func: Any, *args: Any) -> None:
+        # Each task gets its own scope so that a client running inside a
+        # shared task group (see `HTTPPool`) can be closed on its own.
+        scope = CancelScope()
+        self.cancel_scopes.append(scope)
+
+        async def run() -> None:
+            try:
+                with scope:
+                    await func(*args)
+            finally:
+                self.cancel_scopes.remove(scope)
+
+        self.task_group.start_soon(run)
+
+    async def _spawn_background(self: Self, func: Any, *args: Any) -> None:
+        scope = CancelScope()
+        self.background_scopes.append(scope)
+
+        async def run() -> None:
+            try:
+                with scope:
+                    await func(*args)
+            finally:
+                self.background_scopes.remove(scope)
+
+        self.task_group.start_soon(run)
+
+    async def _sleep(self: Self, seconds: float) -> None:
+        await sleep(seconds)
+
+    async def _with_timeout(self: Self, seconds: float, func: Any, *args: Any) -> Any:
+        with fail_after(seconds):
+            return await func(*args)
+
+    async def _start_keepalive(self: Self) -> None:
+        if self.keepalive_interval is None or self.keepalive_scope is not None:
+            return
+
+        # Outlives the connection tasks, it is what replaces them
+        scope = self.keepalive_scope = CancelScope()
+
+        async def run() -> None:
+            with scope:
+                await self._keepalive_loop()
+
+        self.task_group.start_soon(run)
+
+    async def _close_transport(self: Self) -> None:
+        for scope in list(self.cancel_scopes):
+            scope.cancel()
+        # Closing the stream under a receive that is still being cancelled
+        # fails, so let the tasks finish first
+        while self.cancel_scopes:
+            await sleep(0)
+        if self.connection_error is None:
+            await self.socket.aclose()
+        else:
+            # A dead peer never answers the TLS closing handshake
+            await aclose_forcefully(self.socket)
+
+    def _save_tls_session(self: Self) -> None:
+        ssl_object = self.socket.extra(TLSAttribute.ssl_object, None)
+        if ssl_object is not None:
+            self.ssl_context.save_session(ssl_object.session)
+
     async def aclose(self: Self) -> None:
+        self.closed = True
+        for scope in self.background_scopes:
+            scope.cancel()
+        if self.keepalive_scope is not None:
+            self.keepalive_scope.cancel()
+            self.keepalive_scope = None
         if self.connection_initialized:
-            self.connection.close_connection()
-            await self._stream_send(self.connection.data_to_send())
+            self.connection_initialized = False
+            if self.connection_error is None:
+                self.connection.close_connection()
+                await self._drain()
             self.state = ConnectionState.CLOSED
+            await self._close_transport()
+
+    async def __aenter__(self: Self) -> Self:
+        if self.task_group is None:
+            self.task_group = create_task_group()
+            self.owns_task_group = True
+            await self.task_group.__aenter__()
+        return self
+
+    async def __aexit__(
+        self: Self,
+        exc_type: type[BaseException] | None,
+        exc_val: BaseException | None,
+        exc_tb: TracebackType | None,
+    ) -> None:
+        try:
+            await self.aclose()
+        finally:
+            if self.owns_task_group:
+                task_group, self.task_group = self.task_group, None
+                self.owns_task_group = False
+                task_group.cancel_scope.cancel()
+                await task_group.__aexit__(exc_type, exc_val, exc_tb)
+
+
+class HTTPPool(BaseHTTPPool):
+    """
+    Runs its connections and background tasks in `task_group` if one is
+    given, otherwise in a task group of its own for the duration of
+    `async with HTTPPool()`.
+    """
+
+    bucket_manager: BaseBucketManager
+    ssl_context: ResumingSSLContext
+    client_ready: Event
+    task_group: TaskGroup
+    owns_task_group: bool
+    cancel_scopes: list[CancelScope]
+
+    def __init__(
+        self: Self,
+        size: int = 2,
+        max_reconnect_retries: int = 3,
+        max_request_retries: int = 3,
+        default_headers: dict[bytes, bytes] | None = None,
+        refill_threshold: int = 2**16,
+        retry_policy: RetryPolicy | None = None,
+        *,
+        bucket_manager: BaseBucketManager | None = None,
+        task_group: TaskGroup | None = None,
+        keepalive_interval: float | None = None,
+        keepalive_timeout: float = 20.0,
+        ssl_context: ResumingSSLContext | None = None,
+        timeout: Timeout | None = None,
+        single_flight: bool = False,
+        response_cache: BaseResponseCache | None = None,
+    ) -> None:
+        BaseHTTPPool.__init__(
+            self,
+            size=size,
+            max_reconnect_retries=max_reconnect_retries,
+            max_request_retries=max_request_retries,
+            default_headers=default_headers,
+            refill_threshold=refill_threshold,
+            retry_policy=retry_policy,
+            keepalive_interval=keepalive_interval,
+            keepalive_timeout=keepalive_timeout,
+            timeout=timeout,
+            single_flight=single_flight,
+            response_cache=response_cache,
+        )
+        self.bucket_manager = bucket_manager or BucketManager()
+        # Shared so replacement connections resume the TLS session
+        self.ssl_context = ssl_context or create_ssl_context()
+        self.client_ready = Event()
+        self.task_group = task_group
+        self.owns_task_group = False
+        self.cancel_scopes = []
+
+    def _create_client(self: Self) -> HTTPClient:
+        return HTTPClient(
+            max_reconnect_retries=self.max_reconnect_retries,
+            max_request_retries=self.max_request_retries,
+            default_headers=self.default_headers,
+            retry_policy=self.retry_policy,
+            bucket_manager=self.bucket_manager,
+            task_group=self.task_group,
+            ssl_context=self.ssl_context,
+            timeout=self.timeout,
+        )
+
+    def _create_event(self: Self) -> Event:
+        return Event()
+
+    async def _spawn(self: Self, func: Any, *args: Any) -> None:
+        # Scoped like the tasks of `HTTPClient`, `aclose` stops them even
+        # if the task group belongs to the caller
+        scope = CancelScope()
+        self.cancel_scopes.append(scope)
+
+        async def run() -> None:
+            try:
+                with scope:
+                    await func(*args)
+            finally:
+                self.cancel_scopes.remove(scope)
+
+        self.task_group.start_soon(run)
+
+    async def _sleep(self: Self, seconds: float) -> None:
+        await sleep(seconds)
+
+    async def connect(self: Self, url: str) -> Self:
+        if self.task_group is None:
+            raise RuntimeError(
+                "Pass a task_group or use the pool as `async with HTTPPool()`"
+            )
+        return await BaseHTTPPool.connect(self, url)
+
+    async def aclose(self: Self) -> None:
+        # No new connections are opened or retired halfway through
+        for scope in list(self.cancel_scopes):
+            scope.cancel()
+        await BaseHTTPPool.aclose(self)
+
+    async def __aenter__(self: Self) -> Self:
+        if self.task_group is None:
+            self.task_group = create_task_group()
+            self.owns_task_group = True
+            await self.task_group.__aenter__()
+        return self
+
+    async def __aexit__(
+        self: Self,
+        exc_type: type[BaseException] | None,
+        exc_val: BaseException | None,
+        exc_tb: TracebackType | None,
+    ) -> None:
+        try:
+            await self.aclose()
+        finally:
+            if self.owns_task_group:
+                task_group, self.task_group = self.task_group, None
+                self.owns_task_group = False
+                task_group.cancel_scope.cancel()
+                await task_group.__aexit__(exc_type, exc_val, exc_tb)
@@ -1 +1,2 @@
-from .http import HTTPClient
+from .broker import BucketBroker, SharedBucketManager
+from .http import HTTPClient, HTTPPool
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from curio import Lock, UniversalEvent, open_connection, open_unix_connection, spawn
+from curio.network import tcp_server, unix_server
+
+from ...http.broker import BaseBrokerSession, BaseBucketBroker, BaseSharedBucketManager
+from ...http.exceptions import ConnectionLost
+from .http import BucketManager
+
+if TYPE_CHECKING:
+    from types import TracebackType
+    from typing import Any
+
+    from curio.io import Socket
+    from curio.task import Task
+    from typing_extensions import Self
+
+    from ...http.ratelimit import BaseBucketManager
+
+
+class SharedBucketManager(BaseSharedBucketManager):
+    socket: Socket
+    connect_lock: Lock
+    outbox_ready: UniversalEvent
+    tasks: list[Task]
+
+    def __init__(self: Self, address: str | tuple[str, int]) -> None:
+        BaseSharedBucketManager.__init__(self, address)
+        self.connect_lock = Lock()
+        self.tasks = []
+
+    async def _open_socket(self: Self) -> Socket:
+        if isinstance(self.address, str):
+            return await open_unix_connection(self.address)
+        return await open_connection(*self.address)
+
+    async def _stream_recv(self: Self, max_bytes: int) -> bytes:
+        return await self.socket.recv(max_bytes)
+
+    async def _stream_send(self: Self, data: bytes) -> None:
+        await self.socket.sendall(data)
+
+    def _create_event(self: Self) -> UniversalEvent:
+        return UniversalEvent()
+
+    async def _spawn(self: Self, func: Any, *args: Any) -> None:
+        self.tasks.append(await spawn(func, *args, daemon=True))
+
+    async def _close_socket(self: Self) -> None:
+        for task in self.tasks:
+            await task.cancel()
+        self.tasks.clear()
+        await self.socket.close()
+
+    async def aclose(self: Self) -> None:
+        if self.socket is not None:
+            await self._close_socket()
+            self.socket = None
+            self._fail(ConnectionLost("rate-limit broker connection closed"))
+
+    async def __aenter__(self: Self) -> Self:
+        return await self.connect()
+
+    async def __aexit__(
+        self: Self,
+        exc_type: type[BaseException] | None,
+        exc_val: BaseException | None,
+        exc_tb: TracebackType | None,
+    ) -> None:
+        await self.aclose()
+
+
+class BrokerSession(BaseBrokerSession):
+    socket: Socket
+    write_lock: Lock
+    tasks: list[Task]
+
+    def __init__(self: Self, manager: BaseBucketManager, socket: Socket) -> None:
+        BaseBrokerSession.__init__(self, manager)
+        self.socket = socket
+        self.write_lock = Lock()
+        self.tasks = []
+
+    async def _stream_recv(self: Self, max_bytes: int) -> bytes:
+        return await self.socket.recv(max_bytes)
+
+    async def _stream_send(self: Self, data: bytes) -> None:
+        await self.socket.sendall(data)
+
+    async def _spawn(self: Self, func: Any, *args: Any) -> None:
+        self.tasks = [task for task in self.tasks if not task.terminated]
+        self.tasks.append(await spawn(func, *args, daemon=True))
+
+
+class BucketBroker(BaseBucketBroker):
+    def __init__(self: Self, manager: BaseBucketManager | None = None) -> None:
+        BaseBucketBroker.__init__(self, manager or BucketManager())
+
+    async def serve(self: Self, address: str | tuple[str, int]) -> None:
+        if isinstance(address, str):
+            await unix_server(address, self._handle)
+        else:
+            await tcp_server(*address, self._handle)
+
+    async def _handle(self: Self, socket: Socket, address: Any) -> None:
+        session = BrokerSession(self.manager, socket)
+        async with socket:
+            try:
+                await session.run()
+            except Exception:
+                # One misbehaving peer must not take the broker down
+                pass
+            finally:
+                for task in session.tasks:
+                    await task.cancel()
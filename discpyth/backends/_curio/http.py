@@ -2,115 +2,99 @@ from __future__ import annotations
 
 from typing import TYPE_CHECKING
 from urllib.parse import urlparse
-from weakref import WeakValueDictionary
 
-from curio import Event, Lock, open_connection, sleep
-from curio.ssl import create_default_context
+from curio import (
+    Lock,
+    TaskTimeout,
+    UniversalEvent,
+    open_connection,
+    sleep,
+    spawn,
+    timeout_after,
+)
 from curio.io import Socket
-from certifi import where
-from h2.config import H2Configuration
-from h2.connection import H2Connection
+from curio.ssl import CurioSSLContext
 
-from ...utils import exponential_backoff
 from ...http.base import BaseHTTPClient, ConnectionState
+from ...http.pool import BaseHTTPPool
+from ...http.ratelimit import BaseMemoryBucketManager
+from ...http.retry import RetryPolicy
+from ...http.tls import create_ssl_context
+from ...utils import exponential_backoff
 
 if TYPE_CHECKING:
-    from curio.ssl import CurioSSLContext
     from types import TracebackType
+    from typing import Any
 
+    from curio.task import Task
     from typing_extensions import Self
 
+    from ...http.cache import BaseResponseCache
+    from ...http.ratelimit import BaseBucketManager
+    from ...http.tls import ResumingSSLContext
+    from ...http.types import Timeout
 
-def create_ssl_context() -> CurioSSLContext:
-    context = create_default_context(
-        cafile=where(),
-    )
-    context.set_alpn_protocols(["h2"])
-    return context
-
-
-class Bucket:
-    lock: Lock
-
-    def __init__(self, lock: Lock) -> None:
-        self.lock = lock
-        self.deferred = False
-
-    async def __aenter__(self) -> Lock:
-        await self.lock.acquire()
-        return self
-
-    async def __aexit__(
-        self,
-        exc_type: type[BaseException] | None,
-        exc_val: BaseException | None,
-        exc_tb: TracebackType | None,
-    ) -> None:
-        if self.deferred:
-            return
-        await self.release()
-
-    def defer(self) -> None:
-        if not self.deferred:
-            self.deferred = True
 
-    async def release(self) -> None:
-        await self.lock.release()
+class BucketManager(BaseMemoryBucketManager):
+    def _create_event(self: Self) -> UniversalEvent:
+        return UniversalEvent()
 
-
-class BucketManager:
-    buckets: dict[str, Bucket]
-    global_limiter: Event
-
-    def __init__(self: Self) -> None:
-        self.global_limiter = None
-        self.buckets = WeakValueDictionary()
-
-    def get(self, key: str) -> Bucket:
-        try:
-            bucket = self.buckets[key]
-        except KeyError:
-            bucket = self.buckets[key] = Bucket(Lock())
-        return bucket
-
-    async def clear_global(self: Self) -> None:
-        self.global_limiter.set()
-
-    def is_global(self: Self) -> bool:
-        if self.global_limiter is None:
-            return False
-        return self.global_limiter.is_set()
-
-    async def wait_global(self: Self) -> None:
-        await self.global_limiter.wait()
-
-    async def set_global(self: Self) -> None:
-        self.global_limiter = Event()
+    async def _sleep(self: Self, seconds: float) -> None:
+        await sleep(seconds)
 
 
 class HTTPClient(BaseHTTPClient):
     socket: Socket
-    state_lock: Lock
-    bucket_manager: BucketManager
+    bucket_manager: BaseBucketManager
+    ssl_context: CurioSSLContext
     connect_lock: Lock
-    read_lock: Lock
+    reconnect_lock: Lock
+    window_updated: UniversalEvent
+    stream_slot_freed: UniversalEvent
+    output_ready: UniversalEvent
+    output_flushed: UniversalEvent
+    tasks: list[Task]
+    background_tasks: list[Task]
+    keepalive_task: Task | None
 
     def __init__(
         self: Self,
         max_reconnect_retries: int = 3,
         max_request_retries: int = 3,
         default_headers: list[tuple[bytes, bytes]] | None = None,
+        retry_policy: RetryPolicy | None = None,
+        *,
+        bucket_manager: BaseBucketManager | None = None,
+        keepalive_interval: float | None = None,
+        keepalive_timeout: float = 20.0,
+        ssl_context: ResumingSSLContext | None = None,
+        timeout: Timeout | None = None,
+        single_flight: bool = False,
+        response_cache: BaseResponseCache | None = None,
     ) -> None:
         BaseHTTPClient.__init__(
             self,
             max_reconnect_retries=max_reconnect_retries,
             max_request_retries=max_request_retries,
             default_headers=default_headers,
+            retry_policy=retry_policy,
+            keepalive_interval=keepalive_interval,
+            keepalive_timeout=keepalive_timeout,
+            timeout=timeout,
+            single_flight=single_flight,
+            response_cache=response_cache,
         )
-        self.state_lock = Lock()
-        self.bucket_manager = BucketManager()
+        self.bucket_manager = bucket_manager or BucketManager()
+        self.ssl_context = CurioSSLContext(ssl_context or create_ssl_context())
         self.connect_lock = Lock()
-        self.read_lock = Lock()
+        self.reconnect_lock = Lock()
+        self.window_updated = UniversalEvent()
+        self.stream_slot_freed = UniversalEvent()
+        self.output_ready = UniversalEvent()
+        self.output_flushed = UniversalEvent()
+        self.tasks = []
+        self.background_tasks = []
+        self.keepalive_task = None
 
     @property
     def port(self: Self) -> int:
@@ -118,45 +102,47 @@ class HTTPClient(BaseHTTPClient):
 
     async def connect(self: Self, url: str) -> Self:
         if self.connection_initialized:
-            return
+            return self
 
+        self.closed = False
         self.url = urlparse(url)
         self.server_name = self.url.netloc.encode("ascii")
         server_name = self.url.netloc
         self.connection = None
 
         retries = self.max_reconnect_retries
-
-        back_off = exponential_backoff(2, 0)
-
-        ssl_context = create_ssl_context()
+        attempt = 0
 
         async with self.connect_lock:
             while True:
+                connecting = open_connection(
+                    server_name,
+                    self.port,
+                    ssl=self.ssl_context,
+                    server_hostname=server_name,
+                )
+                if self.timeout.connect is not None:
+                    connecting = timeout_after(self.timeout.connect, connecting)
                 try:
-                    self.socket = await open_connection(
-                        server_name,
-                        self.port,
-                        ssl=ssl_context,
-                        server_hostname=server_name,
-                    )
-                except (OSError, TimeoutError):
+                    self.socket = await connecting
+                except (OSError, TimeoutError, TaskTimeout):
                     if retries == 0:
                         raise
                     retries -= 1
-                    back_off = exponential_backoff(2, back_off)
-                    await sleep(back_off)
+                    await sleep(exponential_backoff(attempt))
+                    attempt += 1
                 else:
                     self.connection_initialized = True
                     break
 
         assert isinstance(self.socket, Socket)
 
-        self.connection = H2Connection(
-            config=H2Configuration(validate_inbound_headers=False)
-        )
-        self.connection.initiate_connection()
-        await self._stream_send(self.connection.data_to_send())
+        await self._stream_send(self._initiate_connection())
+        self.state = ConnectionState.CONNECTED
+
+        await self._spawn(self._read_loop)
+        await self._spawn(self._write_loop)
+        await self._start_keepalive()
         return self
 
     async def _stream_recv(self: Self, max_bytes: int) -> bytes:
@@ -166,8 +152,127 @@ class HTTPClient(BaseHTTPClient):
     async def _stream_send(self: Self, data: bytes) -> None:
         await self.socket.send(data)
 
+    def _create_event(self: Self) -> UniversalEvent:
+        # `curio.Event.set` is a coroutine, the reader sets events from
+        # synchronous dispatch code so the universal variant is used instead.
+        return UniversalEvent()
+
+    async def _spawn(self: Self, func: Any, *args: Any) -> None:
+        self.tasks.append(await spawn(func, *args, daemon=True))
+
+    async def _spawn_background(self: Self, func: Any, *args: Any) -> None:
+        self.background_tasks = [
+            task for task in self.background_tasks if not task.terminated
+        ]
+        self.background_tasks.append(await spawn(func, *args, daemon=True))
+
+    async def _sleep(self: Self, seconds: float) -> None:
+        await sleep(seconds)
+
+    async def _with_timeout(self: Self, seconds: float, func: Any, *args: Any) -> Any:
+        try:
+            return await timeout_after(seconds, func, *args)
+        except TaskTimeout:
+            raise TimeoutError() from None
+
+    async def _start_keepalive(self: Self) -> None:
+        if self.keepalive_interval is None or self.keepalive_task is not None:
+            return
+        # Outlives the connection tasks, it is what replaces them
+        self.keepalive_task = await spawn(self._keepalive_loop, daemon=True)
+
+    async def _close_transport(self: Self) -> None:
+        for task in self.tasks:
+            await task.cancel()
+        self.tasks.clear()
+        await self.socket.close()
+
+    def _save_tls_session(self: Self) -> None:
+        self.ssl_context.save_session(getattr(self.socket, "session", None))
+
     async def aclose(self: Self) -> None:
+        self.closed = True
+        for task in self.background_tasks:
+            await task.cancel()
+        self.background_tasks.clear()
+        if self.keepalive_task is not None:
+            await self.keepalive_task.cancel()
+            self.keepalive_task = None
         if self.connection_initialized:
-            self.connection.close_connection()
-            await self._stream_send(self.connection.data_to_send())
+            self.connection_initialized = False
+            if self.connection_error is None:
+                self.connection.close_connection()
+                await self._drain()
             self.state = ConnectionState.CLOSED
+            await self._close_transport()
+
+
+class HTTPPool(BaseHTTPPool):
+    bucket_manager: BaseBucketManager
+    ssl_context: ResumingSSLContext
+    client_ready: UniversalEvent
+    tasks: list[Task]
+
+    def __init__(
+        self: Self,
+        size: int = 2,
+        max_reconnect_retries: int = 3,
+        max_request_retries: int = 3,
+        default_headers: dict[bytes, bytes] | None = None,
+        refill_threshold: int = 2**16,
+        retry_policy: RetryPolicy | None = None,
+        *,
+        bucket_manager: BaseBucketManager | None = None,
+        keepalive_interval: float | None = None,
+        keepalive_timeout: float = 20.0,
+        ssl_context: ResumingSSLContext | None = None,
+        timeout: Timeout | None = None,
+        single_flight: bool = False,
+        response_cache: BaseResponseCache | None = None,
+    ) -> None:
+        BaseHTTPPool.__init__(
+            self,
+            size=size,
+            max_reconnect_retries=max_reconnect_retries,
+            max_request_retries=max_request_retries,
+            default_headers=default_headers,
+            refill_threshold=refill_threshold,
+            retry_policy=retry_policy,
+            keepalive_interval=keepalive_interval,
+            keepalive_timeout=keepalive_timeout,
+            timeout=timeout,
+            single_flight=single_flight,
+            response_cache=response_cache,
+        )
+        self.bucket_manager = bucket_manager or BucketManager()
+        # Shared so replacement connections resume the TLS session
+        self.ssl_context = ssl_context or create_ssl_context()
+        self.client_ready = UniversalEvent()
+        self.tasks = []
+
+    def _create_client(self: Self) -> HTTPClient:
+        return HTTPClient(
+            max_reconnect_retries=self.max_reconnect_retries,
+            max_request_retries=self.max_request_retries,
+            default_headers=self.default_headers,
+            retry_policy=self.retry_policy,
+            bucket_manager=self.bucket_manager,
+            ssl_context=self.ssl_context,
+            timeout=self.timeout,
+        )
+
+    def _create_event(self: Self) -> UniversalEvent:
+        return UniversalEvent()
+
+    async def _spawn(self: Self, func: Any, *args: Any) -> None:
+        self.tasks = [task for task in self.tasks if not task.terminated]
+        self.tasks.append(await spawn(func, *args, daemon=True))
+
+    async def _sleep(self: Self, seconds: float) -> None:
+        await sleep(seconds)
+
+    async def aclose(self: Self) -> None:
+        await BaseHTTPPool.aclose(self)
+        for task in self.tasks:
+            await task.cancel()
+        self.tasks.clear()
@@ -1,30 +1,169 @@
 from __future__ import annotations
 
+from collections import deque
 from enum import IntEnum
-from typing import TYPE_CHECKING, Any, AsyncIterable
-from urllib.parse import urlparse
+from functools import partial
+from time import monotonic
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Iterable,
+    Mapping,
+)
 
-from anyio import sleep
-from h2.events import DataReceived, ResponseReceived, StreamEnded
+from h2.config import H2Configuration
+from h2.connection import ConnectionState as H2ConnectionState
+from h2.connection import H2Connection
+from h2.errors import ErrorCodes
+from h2.events import (
+    ConnectionTerminated,
+    DataReceived,
+    PingAckReceived,
+    RemoteSettingsChanged,
+    ResponseReceived,
+    SettingsAcknowledged,
+    StreamEnded,
+)
+from h2.events import StreamReset as StreamResetEvent
+from h2.events import WindowUpdated
 from h2.exceptions import NoAvailableStreamIDError, ProtocolError
+from h2.settings import SettingCodes
+from hpack import NeverIndexedHeaderTuple
 
-from ..utils import loads
-from .exceptions import Forbidden, HTTPException, NotFound, ServerError
-from .types import Request, create_headers
+from .exceptions import ConnectionLost, RequestTimeout, StreamRefused, StreamReset
+from .pipeline import send_batch, send_request
+from .priority import STREAM_WEIGHTS, PriorityWaiters
+from .retry import RetryPolicy
+from .singleflight import SingleFlight
+from .types import (
+    Request,
+    Response,
+    StreamingResponse,
+    Timeout,
+    create_headers,
+    freeze_headers,
+)
 
 if TYPE_CHECKING:
     from types import TracebackType
     from urllib.parse import ParseResult
 
-    from h2.connection import H2Connection
     from h2.events import Event as BaseEvent
+    from h2.frame_buffer import Frame
+    from hyperframe.frame import GoAwayFrame
     from typing_extensions import Self
 
+    from .batch import BatchResult
+    from .cache import BaseResponseCache
+
+
+MAX_STREAM_ID = 2**31 - 1
+# Receive window of every stream, advertised once through SETTINGS. It also
+# bounds how much of a streamed body is buffered ahead of its reader.
+STREAM_WINDOW = 2**20
+# The connection window starts large enough for a few streamed responses that
+# are not being read, and doubles while the server keeps filling it faster
+# than one RTT
+INITIAL_CONNECTION_WINDOW = 2**22
+MAX_CONNECTION_WINDOW = 2**26
+# RFC 9113 section 6.9.2
+DEFAULT_WINDOW = 65535
+# Used until the SETTINGS acknowledgement provides a measurement
+DEFAULT_RTT = 0.1
+# Weight of a new PING sample in the smoothed RTT (RFC 6298)
+RTT_GAIN = 0.125
+# Upper bound on the body data handed to the socket in a single write
+MAX_WRITE_SIZE = 2**18
+# Assumed until the server's SETTINGS arrive, h2 defaults to unlimited.
+# RFC 9113 recommends servers to allow at least this many.
+INITIAL_MAX_CONCURRENT_STREAMS = 100
+
 
 class ConnectionState(IntEnum):
     INIT = 0
     CONNECTED = 1
     CLOSED = 2
+    DRAINING = 3
+
+
+class DrainingH2Connection(H2Connection):
+    """
+    `H2Connection` that keeps serving the streams a GOAWAY lets complete.
+
+    h2 closes the whole connection on GOAWAY, dropping whatever was queued
+    to send and rejecting every later frame, including the responses to
+    streams at or below `last_stream_id` the server is still working on.
+    Not opening new streams afterwards is left to the client.
+    """
+
+    def _receive_goaway_frame(
+        self: Self, frame: GoAwayFrame
+    ) -> tuple[list[Frame], list[BaseEvent]]:
+        state = self.state_machine.state
+        queued = self.data_to_send()
+        frames, events = H2Connection._receive_goaway_frame(self, frame)
+        if state != H2ConnectionState.CLOSED:
+            self.state_machine.state = state
+            self._data_to_send += queued
+        return frames, events
+
+
+class StreamState:
+    """
+    Per-stream bookkeeping filled in by the reader task.
+
+    Readers wait on `updated`, which is set whenever headers, data, the end
+    of the stream or an error arrive. Each of those waits is bounded by
+    `read_timeout`.
+    """
+
+    __slots__ = (
+        "stream_id",
+        "headers",
+        "chunks",
+        "ended",
+        "error",
+        "streaming",
+        "updated",
+        "read_timeout",
+    )
+
+    stream_id: int
+    headers: list[tuple[bytes, bytes]] | None
+    chunks: deque[bytes]
+    ended: Any
+    error: Exception | None
+    streaming: bool
+    updated: Any
+    read_timeout: float | None
+
+    def __init__(
+        self,
+        stream_id: int,
+        ended: Any,
+        streaming: bool = False,
+        read_timeout: float | None = None,
+    ) -> None:
+        self.stream_id = stream_id
+        self.headers = None
+        self.chunks = deque()
+        self.ended = ended
+        self.error = None
+        self.streaming = streaming
+        self.updated = None
+        self.read_timeout = read_timeout
+
+    def notify(self) -> None:
+        if self.updated is not None:
+            self.updated.set()
+
+    def fail(self, error: Exception) -> None:
+        if self.error is None:
+            self.error = error
+        self.ended.set()
+        self.notify()
 
 
 class BaseHTTPClient:
@@ -32,40 +171,89 @@ class BaseHTTPClient:
     server_name: bytes
     connection: H2Connection
     state: int
+    closed: bool
     max_reconnect_retries: int
     max_request_retries: int
+    retry_policy: RetryPolicy
+    timeout: Timeout
+    single_flight: SingleFlight | None
+    response_cache: BaseResponseCache | None
     connection_initialized: bool
+    settings_received: bool
     out_of_stream_ids: bool
     connection_fail: bool
-    connection_error: BaseEvent
-    write_error: Exception
-    default_headers: dict[bytes, bytes]
+    connection_error: Exception
+    flush_requested: int
+    flushed: int
+    rtt: float | None
+    settings_sent_at: float
+    keepalive_interval: float | None
+    keepalive_timeout: float
+    pings: dict[bytes, tuple[float, Any]]
+    next_ping: int
+    connection_window: int
+    window_sample_start: float
+    window_sample_bytes: int
+    default_headers: tuple[tuple[bytes, bytes], ...]
+    streams: dict[int, StreamState]
+    slot_waiters: PriorityWaiters
 
     socket: Any
-    state_lock: Any
     bucket_manager: Any
     connect_lock: Any
-    read_lock: Any
+    reconnect_lock: Any
+    window_updated: Any
+    stream_slot_freed: Any
+    output_ready: Any
+    output_flushed: Any
 
     def __init__(
         self: Self,
         max_reconnect_retries: int = 3,
         max_request_retries: int = 3,
-        default_headers: dict[bytes, bytes] | None = None,
+        default_headers: Mapping[str | bytes, str | bytes] | None = None,
+        retry_policy: RetryPolicy | None = None,
+        keepalive_interval: float | None = None,
+        keepalive_timeout: float = 20.0,
+        timeout: Timeout | None = None,
+        single_flight: bool = False,
+        response_cache: BaseResponseCache | None = None,
     ) -> None:
         self.url = None
         self.server_name = None
         self.connection = None
         self.socket = None
         self.state = ConnectionState.INIT
+        self.closed = False
         self.max_reconnect_retries = max_reconnect_retries
         self.max_request_retries = max_request_retries
+        self.retry_policy = retry_policy or RetryPolicy(max_request_retries)
+        self.timeout = timeout or Timeout()
+        self.single_flight = SingleFlight(self._create_event) if single_flight else None
+        self.response_cache = response_cache
         self.connection_initialized = False
+        self.settings_received = False
         self.out_of_stream_ids = False
         self.connection_fail = False
         self.connection_error = None
-        self.write_error = None
-        self.default_headers = default_headers or {}
+        self.flush_requested = 0
+        self.flushed = 0
+        self.rtt = None
+        self.settings_sent_at = 0.0
+        self.keepalive_interval = keepalive_interval
+        self.keepalive_timeout = keepalive_timeout
+        self.pings = {}
+        self.next_ping = 0
+        self.connection_window = DEFAULT_WINDOW
+        self.window_sample_start = 0.0
+        self.window_sample_bytes = 0
+        self.default_headers = freeze_headers(default_headers or {})
+        self.streams = {}
+        self.slot_waiters = PriorityWaiters()
+        self.window_updated = None
+        self.stream_slot_freed = None
+        self.output_ready = None
+        self.output_flushed = None
 
     async def connect(self: Self, url: str) -> Self:
         raise NotImplementedError()
@@ -76,155 +264,786 @@ class BaseHTTPClient:
     async def _stream_send(self: Self, data: bytes) -> None:
         raise NotImplementedError()
 
+    def _create_event(self: Self) -> Any:
+        raise NotImplementedError()
+
+    async def _spawn(self: Self, func: Any, *args: Any) -> None:
+        raise NotImplementedError()
+
+    async def _spawn_background(self: Self, func: Any, *args: Any) -> None:
+        """
+        Spawn `func(*args)` as a task that outlives the connection, unlike
+        those of `_spawn` it is only cancelled by `aclose`.
+        """
+        raise NotImplementedError()
+
+    async def _sleep(self: Self, seconds: float) -> None:
+        raise NotImplementedError()
+
+    async def _with_timeout(self: Self, seconds: float, func: Any, *args: Any) -> Any:
+        """
+        Run `func(*args)`, cancelling it with `TimeoutError` after `seconds`.
+        """
+        raise NotImplementedError()
+
+    async def _close_transport(self: Self) -> None:
+        raise NotImplementedError()
+
+    def _save_tls_session(self: Self) -> None:
+        """
+        Keep the TLS session of this connection for the next one to resume.
+        """
+        raise NotImplementedError()
+
     async def aclose(self: Self) -> None:
         raise NotImplementedError()
 
+    def _initiate_connection(self: Self) -> bytes:
+        """
+        Start a fresh h2 session, returns the connection preface to send.
+        """
+        connection = self.connection = DrainingH2Connection(
+            # Headers are lowercased by `create_headers` already. h2 would
+            # also keep `authorization` out of the HPACK table, which a
+            # long random token does not need since HPACK only ever matches
+            # whole values, and resending it costs ~80 bytes per request.
+            config=H2Configuration(
+                validate_inbound_headers=False, normalize_outbound_headers=False
+            )
+        )
+        connection.initiate_connection()
+        connection.update_settings({SettingCodes.INITIAL_WINDOW_SIZE: STREAM_WINDOW})
+        connection.increment_flow_control_window(
+            INITIAL_CONNECTION_WINDOW - DEFAULT_WINDOW
+        )
+        self.connection_window = INITIAL_CONNECTION_WINDOW
+        self.settings_sent_at = self.window_sample_start = monotonic()
+        self.window_sample_bytes = 0
+        return connection.data_to_send()
+
+    def _reset_connection(self: Self) -> None:
+        self.state = ConnectionState.INIT
+        self.connection_initialized = False
+        self.settings_received = False
+        self.out_of_stream_ids = False
+        self.connection_fail = False
+        self.connection_error = None
+        self.streams = {}
+
+    async def reconnect(self: Self) -> Self:
+        """
+        Replace the connection with a fresh one to the same URL.
+
+        Does nothing if the connection is still usable, so concurrent
+        callers reconnect only once. Requests still in flight on the old
+        connection fail with `ConnectionLost`.
+        """
+        if self.url is None:
+            raise RuntimeError("Please connect first")
+
+        async with self.reconnect_lock:
+            if self.is_available:
+                return self
+            if self.connection_initialized:
+                if self.connection_error is None:
+                    self._fail_connection(ConnectionLost("reconnecting"))
+                await self._close_transport()
+            self._reset_connection()
+            return await self.connect(self.url.geturl())
+
+    async def warmup(self: Self) -> float:
+        """
+        Make sure the connection is up before the first request needs it,
+        reconnecting if it was lost. Returns the round-trip time in seconds.
+        """
+        if not self.is_available:
+            await self.reconnect()
+        return await self.ping()
+
+    async def ping(self: Self, timeout: float | None = None) -> float:
+        """
+        Send a PING and wait for the server to answer it, returns the
+        round-trip time in seconds.
+
+        A connection that leaves it unanswered for `timeout` seconds,
+        `keepalive_timeout` by default, is considered dead and fails with
+        `ConnectionLost`.
+        """
+        if not self.is_available:
+            raise StreamRefused(
+                "connection is not available"
+            ) from self.connection_error
+
+        sent_at = monotonic()
+        acked = self._send_ping()
+        if timeout is None:
+            timeout = self.keepalive_timeout
+        if not await self._wait_for_ping(acked, timeout):
+            self._fail_connection(ConnectionLost("PING timed out"))
+        if self.connection_error is not None:
+            raise self.connection_error
+        return monotonic() - sent_at
+
+    def _send_ping(self: Self) -> Any:
+        """
+        Queue a PING, returns an event set once it is acknowledged or the
+        connection failed.
+        """
+        data = self.next_ping.to_bytes(8, "big")
+        self.next_ping += 1
+        acked = self._create_event()
+        self.pings[data] = (monotonic(), acked)
+        self.connection.ping(data)
+        self._flush()
+        return acked
+
+    async def _wait_for_ping(self: Self, acked: Any, timeout: float) -> bool:
+        """
+        Wait up to `timeout` seconds for the event of `_send_ping`, returns
+        whether it was set in time.
+        """
+        if acked.is_set():
+            return True
+        try:
+            await self._with_timeout(timeout, acked.wait)
+        except TimeoutError:
+            return False
+        return True
+
+    async def _keepalive_loop(self: Self) -> None:
+        """
+        Background task PINGing the server every `keepalive_interval` seconds.
+
+        A connection that leaves a PING unanswered for `keepalive_timeout`
+        seconds is considered dead and replaced right away, instead of by
+        the next request running into it.
+        """
+        while True:
+            await self._sleep(self.keepalive_interval)
+            if self.is_available:
+                acked = self._send_ping()
+                if await self._wait_for_ping(acked, self.keepalive_timeout):
+                    continue
+                self._fail_connection(ConnectionLost("keepalive PING timed out"))
+            elif self.state == ConnectionState.DRAINING and self.streams:
+                # Left to complete its in-flight requests first
+                continue
+
+            try:
+                await self.reconnect()
+            except Exception:
+                # Tried again on the next interval
+                pass
+
+    @property
+    def is_available(self: Self) -> bool:
+        """
+        Whether new requests can be opened on this connection.
+        """
+        return self.state == ConnectionState.CONNECTED and self.connection_error is None
+
+    @property
+    def max_concurrent_streams(self: Self) -> int:
+        limit = self.connection.remote_settings.max_concurrent_streams
+        if not self.settings_received:
+            return min(limit, INITIAL_MAX_CONCURRENT_STREAMS)
+        return limit
+
+    @property
+    def load(self: Self) -> float:
+        """
+        Fraction of the server's `max_concurrent_streams` currently in use.
+        """
+        return len(self.streams) / self.max_concurrent_streams
+
+    @property
+    def stream_ids_left(self: Self) -> int:
+        highest = self.connection.highest_outbound_stream_id or 0
+        return (MAX_STREAM_ID - highest) // 2
+
+    def start_draining(self: Self) -> None:
+        """
+        Stop opening new streams, in-flight requests are left to complete.
+        """
+        if self.state == ConnectionState.CONNECTED:
+            self.state = ConnectionState.DRAINING
+            self._notify_stream_slot_freed()
+
     async def send(
         self: Self,
         request: Request,
-    ) -> bytes:
+        *,
+        stream: bool = False,
+        timeout: Timeout | None = None,
+    ) -> Response:
+        """
+        Send `request` and wait for the complete response.
+
+        Failed attempts are retried according to `retry_policy`, the matching
+        `HTTPException` subclass is raised for a final 4xx or 5xx status. A
+        lost connection is replaced before the next attempt.
+
+        With `stream=True` a successful response is returned as soon as its
+        headers arrive, as a `StreamingResponse` whose body is read in chunks.
+
+        `timeout` overrides the client's limits for this request, exceeding
+        one raises `RequestTimeout`. A request that times out or is cancelled
+        only resets its own stream.
+
+        With `single_flight` enabled, identical GET requests sent while one
+        is already in flight share its response. A `response_cache` answers
+        GET requests before they reach the rate limiter.
+        """
+
+        return await send_request(
+            request,
+            lambda request: self._send_attempt(request, stream, timeout),
+            self.retry_policy,
+            self._sleep,
+            self._spawn_background,
+            stream=stream,
+            single_flight=self.single_flight,
+            response_cache=self.response_cache,
+        )
+
+    async def _send_attempt(
+        self: Self,
+        request: Request,
+        streaming: bool = False,
+        timeout: Timeout | None = None,
+    ) -> Response:
+        # What the pool does by rolling over to another connection, a
+        # client on its own has to do by replacing its only one
+        if self.url is not None and not self.closed and not self.is_available:
+            await self._restore_connection()
+        return await self._send_once(request, streaming, timeout)
+
+    async def _restore_connection(self: Self) -> None:
+        # A connection told to go away is left to finish its requests first
+        while self.state == ConnectionState.DRAINING and self.streams:
+            await self.stream_slot_freed.wait()
+        await self.reconnect()
+
+    def send_many(
+        self: Self,
+        requests: Iterable[Request],
+        *,
+        concurrency: int = 16,
+        timeout: Timeout | None = None,
+    ) -> AsyncIterator[BatchResult]:
+        """
+        Send a batch of requests with at most `concurrency` in flight,
+        yielding a `BatchResult` for each as it completes.
+
+        Requests of different rate-limit buckets are interleaved, so one
+        exhausted bucket does not hold up the rest. Failures are reported
+        per request and never cancel the others.
+        """
+        return send_batch(
+            requests,
+            partial(self.send, timeout=timeout),
+            # Not tied to the connection, a reconnect would cancel the
+            # workers halfway through the batch
+            self._spawn_background,
+            self._create_event,
+            concurrency,
+        )
+
+    async def _send_once(
+        self: Self,
+        request: Request,
+        streaming: bool = False,
+        timeout: Timeout | None = None,
+    ) -> Response:
         if not self.connection_initialized:
-            raise RuntimeError("Please connect first")
+            raise RuntimeError(
+                "Client is closed" if self.closed else "Please connect first"
+            )
 
         method = request.method
-        url = request.url
-        if url.netloc.encode("ascii") != self.server_name:
+        if request.authority != self.server_name:
             raise ValueError("Invalid URL")
 
-        path = url._replace(scheme="", netloc="").geturl() or "/"
+        path = request.path
+        route = request.route_key
 
-        async with self.state_lock:
-            if self.state not in (ConnectionState.INIT, ConnectionState.CONNECTED):
-                raise RuntimeError(
-                    "Cannot send request from an already closed connection"
+        if self.state == ConnectionState.CLOSED:
+            raise StreamRefused("connection is closed")
+
+        timeout = timeout or self.timeout
+        req_headers, req_body = await request.read()
+        # Headers that repeat come first and in the same order every time,
+        # so HPACK sends them as indices into its dynamic table
+        headers = [
+            (b":method", method),
+            (b":scheme", b"https"),
+            (b":authority", self.server_name),
+            NeverIndexedHeaderTuple(b":path", path.encode("utf-8")),
+        ]
+        if request.headers:
+            own = create_headers(request.headers)
+            names = {name for name, _ in own}
+            headers += [item for item in self.default_headers if item[0] not in names]
+            headers += own
+        else:
+            headers += self.default_headers
+        if req_headers:
+            headers += create_headers(req_headers)
+
+        bucket = await self.bucket_manager.acquire(
+            method, path, request.priority, route=route
+        )
+        response = None
+        try:
+            response = await self._with_deadline(
+                "total",
+                timeout.total,
+                self._exchange,
+                request,
+                headers,
+                req_body,
+                streaming,
+                timeout,
+            )
+            return response
+        finally:
+            if response is None:
+                self.bucket_manager.release(bucket, method, path, route=route)
+            else:
+                self.bucket_manager.release(
+                    bucket, method, path, response.status, response.headers, route=route
                 )
 
+    async def _exchange(
+        self: Self,
+        request: Request,
+        headers: list[tuple[bytes, bytes]],
+        body: AsyncIterable[bytes],
+        streaming: bool,
+        timeout: Timeout,
+    ) -> Response:
+        await self._with_deadline(
+            "connect", timeout.connect, self._wait_for_stream_slot, request.priority
+        )
+        end_stream = request.end_stream
+        stream = self._open_stream(
+            headers, end_stream, streaming, timeout.read, request.priority
+        )
+        response = None
+        try:
+            self._flush()
+            if not end_stream:
+                await self._send_body(stream.stream_id, body)
+
+            response = await self._receive_response(stream, request)
+            return response
+        finally:
+            if response is None:
+                # Failed, timed out or cancelled, only this stream is given
+                # up and the connection is left alone
+                self._reset_stream(stream)
+            elif not isinstance(response, StreamingResponse):
+                self._close_stream(stream.stream_id)
+            # Otherwise the body is still being read, the response closes
+            # the stream once done with it
+
+    async def _with_deadline(
+        self: Self, phase: str, seconds: float | None, func: Any, *args: Any
+    ) -> Any:
+        if seconds is None:
+            return await func(*args)
+        try:
+            return await self._with_timeout(seconds, func, *args)
+        except RequestTimeout:
+            # A shorter limit further in expired first
+            raise
+        except TimeoutError:
+            raise RequestTimeout(phase, seconds) from None
+
+    async def _wait_for_stream_slot(self: Self, priority: int) -> None:
+        connection = self.connection
+        waiters = self.slot_waiters
+        while (
+            connection.open_outbound_streams >= self.max_concurrent_streams
+            or waiters.outranked(priority)
+        ):
+            if self.state != ConnectionState.CONNECTED:
+                break
+            # A freed slot wakes everyone, whoever is more urgent takes it
+            waiters.add(priority)
+            try:
+                await self.stream_slot_freed.wait()
+            finally:
+                if waiters.remove(priority):
+                    self._notify_stream_slot_freed()
+
+    def _close_stream(self: Self, stream_id: int) -> None:
+        if self.streams.pop(stream_id, None) is not None:
+            self._notify_stream_slot_freed()
+
+    def _open_stream(
+        self: Self,
+        headers: list[tuple[bytes, bytes]],
+        end_stream: bool,
+        streaming: bool = False,
+        read_timeout: float | None = None,
+        priority: int | None = None,
+    ) -> StreamState:
+        # Nothing was sent yet, so the request is safe to send elsewhere
+        if self.state != ConnectionState.CONNECTED:
+            raise StreamRefused(
+                f"connection is {self.state.name.lower()}"
+            ) from self.connection_error
+
+        # Picking the stream ID and sending HEADERS must happen without a
+        # checkpoint in between, stream IDs have to be opened in order.
         try:
             stream_id = self.connection.get_next_available_stream_id()
         except NoAvailableStreamIDError:
             self.out_of_stream_ids = True
-            raise
+            self.start_draining()
+            raise StreamRefused("out of stream IDs") from None
 
         try:
-            req_headers, req_body = await request.read()
-            headers = (
-                [
-                    (b":method", method),
-                    (b":authority", self.server_name),
-                    (b":scheme", "https"),
-                    (b":path", path),
-                ]
-                + create_headers(req_headers)
-                + create_headers(self.default_headers)
+            self.connection.send_headers(
+                stream_id,
+                headers,
+                end_stream=end_stream,
+                priority_weight=STREAM_WEIGHTS.get(priority),
             )
-            end_stream = request.end_stream
+        except Exception as exc:
+            # h2 may have updated its HPACK table for a header block it then
+            # did not send, every later one would be decoded against the
+            # wrong table by the server
+            self._fail_connection(ConnectionLost(f"sending headers failed: {exc!r}"))
+            raise
 
-            bucket = self.bucket_manager.get(request.bucket_id)
-            if self.bucket_manager.is_global():
-                self.bucket_manager.wait_global()
+        stream = self.streams[stream_id] = StreamState(
+            stream_id, self._create_event(), streaming, read_timeout
+        )
+        return stream
 
-            for _ in range(self.max_request_retries):
-                await self._send_headers(headers, end_stream, stream_id, bucket)
-                if not end_stream:
-                    await self._send_body(stream_id, req_body, bucket)
+    async def _send_body(self, stream_id: int, stream: AsyncIterable[bytes]) -> None:
+        connection = self.connection
+        async for data in stream:
+            # Frames are cut from a view, the only copy made is h2
+            # serializing them into its output buffer
+            view = memoryview(data)
+            while view:
+                window = await self._wait_for_max_flow(stream_id)
+                # As many frames as the window allows go out in one write
+                batch = min(len(view), window, MAX_WRITE_SIZE)
+                frame_size = connection.max_outbound_frame_size
+                for offset in range(0, batch, frame_size):
+                    connection.send_data(
+                        stream_id, view[offset : min(offset + frame_size, batch)]
+                    )
+                view = view[batch:]
 
-                _, response_headers, body = await self._receive_events(bucket)
-                return body
-        except Exception:
-            raise
+                # Keeps at most one batch queued in front of the socket
+                await self._drain()
 
-    async def _send_headers(
-        self,
-        headers: list[tuple[bytes, bytes]],
-        end_stream: bool,
-        stream_id: int,
-        bucket,
-    ) -> None:
-        self.connection.send_headers(stream_id, headers, end_stream=end_stream)
-        self.connection.increment_flow_control_window(2**24, stream_id=stream_id)
+        connection.end_stream(stream_id)
+        self._flush()
 
-        await self._write_to_socket(bucket)
+    def _flush(self: Self) -> None:
+        """
+        Have the writer task send whatever h2 has queued.
+        """
+        self.flush_requested += 1
+        event, self.output_ready = self.output_ready, self._create_event()
+        event.set()
 
-    async def _send_body(
-        self, stream_id: int, stream: AsyncIterable[bytes], bucket
-    ) -> None:
-        async for data in stream:
-            while data:
-                max_fl0w = await self._wait_for_max_flow(stream_id, bucket)
-                chunk_size = min(len(data), max_fl0w)
-                chunk, data = data[:chunk_size], data[chunk_size:]
-                self.connection.send_data(stream_id, chunk)
+    async def _drain(self: Self) -> None:
+        """
+        Flush and wait until everything queued so far reached the socket.
+        """
+        self._flush()
+        requested = self.flush_requested
+        while self.flushed < requested:
+            if self.connection_error is not None:
+                raise self.connection_error
+            await self.output_flushed.wait()
 
-                await self._write_to_socket(bucket)
+    async def _write_loop(self: Self) -> None:
+        """
+        Background task owning the sending side of the connection.
 
-        self.connection.end_stream(stream_id)
-        await self._write_to_socket(bucket)
+        After being woken up it lets every other runnable task queue its
+        frames first, so a burst of requests goes out in a few large writes
+        instead of one small TLS record per frame.
+        """
+        try:
+            while True:
+                requested = self.flush_requested
+                data = self.connection.data_to_send()
+                if data:
+                    await self._stream_send(data)
+                self.flushed = requested
+                self._notify_output_flushed()
 
-    async def _write_to_socket(self, bucket) -> None:
-        async with bucket:
-            to_send = self.connection.data_to_send()
-            if self.write_error is not None:
-                raise self.write_error
+                if self.flush_requested == requested:
+                    await self.output_ready.wait()
+                    await self._sleep(0)
+        except Exception as exc:
+            self._fail_connection(ConnectionLost(repr(exc)))
+
+    async def _wait_for_max_flow(self: Self, stream_id: int) -> int:
+        while True:
+            stream = self.streams.get(stream_id)
+            if stream is not None and stream.error is not None:
+                raise stream.error
+            if self.connection_error is not None:
+                raise self.connection_error
 
-            try:
-                await self._stream_send(to_send)
-            except Exception as exc:
-                self.write_error = exc
-                self.connection_fail = True
-                raise
-
-    async def _wait_for_max_flow(self: Self, stream_id: int, bucket) -> int:
-        local_flow = self.connection.local_flow_control_window(stream_id)
-        max_frame_size = self.connection.max_outbound_frame_size
-        max_fl0w = min(local_flow, max_frame_size)
-        while max_fl0w == 0:
-            await self._receive_events(bucket)
             local_flow = self.connection.local_flow_control_window(stream_id)
-            max_frame_size = self.connection.max_outbound_frame_size
-            max_fl0w = min(local_flow, max_frame_size)
-        return max_fl0w
-
-    async def _receive_events(
-        self, bucket
-    ) -> tuple[list[BaseEvent], dict[bytes, bytes], bytes]:
-        events_list = []
-        headers = None
-        body = b""
-        response_stream_ended = False
-
-        async with self.read_lock:
-            if self.connection_error is not None:  # pragma: nocover
-                raise ProtocolError(self.connection_error)
-            while not response_stream_ended:
+            if local_flow > 0:
+                return local_flow
+
+            await self.window_updated.wait()
+
+    async def _receive_response(
+        self: Self, stream: StreamState, request: Request
+    ) -> Response:
+        if not stream.streaming:
+            if stream.read_timeout is None:
+                await stream.ended.wait()
+            else:
+                while not stream.ended.is_set():
+                    await self._wait_for_stream_update(stream)
+            if stream.error is not None:
+                raise stream.error
+
+            return Response.from_raw(stream.headers, b"".join(stream.chunks), request)
+
+        while stream.headers is None and stream.error is None:
+            await self._wait_for_stream_update(stream)
+        if stream.error is not None:
+            raise stream.error
+
+        response = StreamingResponse.from_raw(stream.headers, self, stream, request)
+        if response.ok:
+            return response
+
+        # Error bodies are small and the retry policy may look at them
+        return Response(
+            response.status,
+            response.headers,
+            await response.read(),
+            request,
+        )
+
+    async def _wait_for_stream_update(self: Self, stream: StreamState) -> None:
+        stream.updated = self._create_event()
+        await self._with_deadline("read", stream.read_timeout, stream.updated.wait)
+
+    async def _read_chunk(self: Self, stream: StreamState) -> bytes | None:
+        """
+        Next chunk of a streamed body, `None` once it ended.
+
+        Flow control is only acknowledged here, so the server cannot send
+        more than the stream window ahead of the consumer.
+        """
+        while not stream.chunks:
+            if stream.error is not None:
+                raise stream.error
+            if stream.ended.is_set():
+                self._close_stream(stream.stream_id)
+                return None
+            await self._wait_for_stream_update(stream)
+
+        chunk = stream.chunks.popleft()
+        if self.connection_error is None:
+            self.connection.acknowledge_received_data(len(chunk), stream.stream_id)
+            self._flush()
+        return chunk
+
+    async def _close_streaming(self: Self, stream: StreamState) -> None:
+        """
+        Stop reading a streamed body, resetting the stream if it is still
+        open.
+        """
+        self._reset_stream(stream)
+
+    def _reset_stream(self: Self, stream: StreamState) -> None:
+        """
+        Forget a stream nobody waits on anymore, sending RST_STREAM(CANCEL)
+        if the server did not end it yet.
+        """
+        if self.streams.get(stream.stream_id) is not stream:
+            return
+
+        self._close_stream(stream.stream_id)
+        if self.connection_error is not None:
+            return
+
+        if stream.streaming:
+            # Buffered data never reaches the consumer, give its window back
+            unread = sum(map(len, stream.chunks))
+            if unread:
+                self.connection.acknowledge_received_data(unread, stream.stream_id)
+        stream.chunks.clear()
+        try:
+            # Also needed after the server ended its side if the request
+            # body was cut short
+            self.connection.reset_stream(stream.stream_id, ErrorCodes.CANCEL)
+        except ProtocolError:
+            # Already closed on both sides
+            pass
+        self._flush()
+
+    async def _read_loop(self: Self) -> None:
+        """
+        Background task owning the receiving side of the connection.
+
+        Every frame read from the socket is fed to the `H2Connection` and the
+        resulting events are routed to the `StreamState` they belong to.
+        """
+        try:
+            while True:
                 data = await self._stream_recv(65536)
                 if not data:
-                    break
+                    raise ConnectionLost("connection closed by server")
+
                 events = self.connection.receive_data(data)
                 for event in events:
-                    event_stream_id = getattr(event, "stream_id", 0)
-                    if hasattr(event, "error_code") and event_stream_id == 0:
-                        self.connection_error = event
-                        raise ProtocolError(event)
+                    self._dispatch_event(event)
+
+                # Acknowledgements and WINDOW_UPDATEs
+                self._flush()
+        except Exception as exc:
+            if not isinstance(exc, ConnectionLost):
+                exc = ConnectionLost(repr(exc))
+            self._fail_connection(exc)
+        except BaseException:
+            # Cancelled, make sure nobody waits on a dead reader
+            self._fail_connection(ConnectionLost("reader cancelled"))
+            raise
+
+    def _dispatch_event(self: Self, event: BaseEvent) -> None:
+        if isinstance(event, SettingsAcknowledged) and self.rtt is None:
+            self.rtt = monotonic() - self.settings_sent_at
+        if isinstance(event, PingAckReceived):
+            self._handle_ping_ack(event)
+            return
+        if isinstance(event, RemoteSettingsChanged):
+            if not self.settings_received:
+                # The first data after the handshake, TLS 1.3 session tickets
+                # come ahead of it. Saved now, a pool replacing this
+                # connection resumes while it still drains.
+                self._save_tls_session()
+            self.settings_received = True
+        if isinstance(event, (WindowUpdated, RemoteSettingsChanged)):
+            self._notify_window_updated()
+            self._notify_stream_slot_freed()
+
+        if isinstance(event, ConnectionTerminated):
+            self._handle_goaway(event)
+            return
+
+        if isinstance(event, DataReceived):
+            self._grow_connection_window(event.flow_controlled_length)
+
+        stream = self.streams.get(getattr(event, "stream_id", 0))
+        if stream is None:
+            if isinstance(event, DataReceived):
+                # Nobody reads it anymore, but it still counts against the
+                # connection window
+                self.connection.acknowledge_received_data(
+                    event.flow_controlled_length, event.stream_id
+                )
+            return
+
+        if isinstance(event, ResponseReceived):
+            stream.headers = event.headers
+            stream.notify()
+
+        elif isinstance(event, DataReceived):
+            if stream.streaming:
+                # Only padding is acknowledged now, the data itself once read
+                acknowledged = event.flow_controlled_length - len(event.data)
+            else:
+                acknowledged = event.flow_controlled_length
+            if acknowledged:
+                self.connection.acknowledge_received_data(acknowledged, event.stream_id)
+            if event.data:
+                stream.chunks.append(event.data)
+                stream.notify()
+
+        elif isinstance(event, StreamEnded):
+            stream.ended.set()
+            stream.notify()
+
+        elif isinstance(event, StreamResetEvent):
+            stream.fail(StreamReset(event.stream_id, event.error_code))
+            self._notify_window_updated()
+
+    def _handle_ping_ack(self: Self, event: PingAckReceived) -> None:
+        ping = self.pings.pop(event.ping_data, None)
+        if ping is None:
+            return
+
+        sent_at, acked = ping
+        sample = monotonic() - sent_at
+        if self.rtt is None:
+            self.rtt = sample
+        else:
+            self.rtt += RTT_GAIN * (sample - self.rtt)
+        acked.set()
+
+    def _grow_connection_window(self: Self, received: int) -> None:
+        """
+        Size the connection window to the bandwidth-delay product.
+
+        Receiving more than half the window within one RTT means the window,
+        not the link, is what limits the download, so it is doubled.
+        """
+        now = monotonic()
+        if now - self.window_sample_start > (self.rtt or DEFAULT_RTT):
+            self.window_sample_start = now
+            self.window_sample_bytes = 0
+        self.window_sample_bytes += received
 
-                    events_list.append(event)
-                    if isinstance(event, ResponseReceived):
-                        headers = event.headers
+        window = self.connection_window
+        if self.window_sample_bytes * 2 > window and window < MAX_CONNECTION_WINDOW:
+            increment = min(window, MAX_CONNECTION_WINDOW - window)
+            self.connection.increment_flow_control_window(increment)
+            self.connection_window += increment
 
-                    if isinstance(event, DataReceived):
-                        self.connection.acknowledge_received_data(
-                            event.flow_controlled_length, event.stream_id
-                        )
-                        body += event.data
+    def _handle_goaway(self: Self, event: ConnectionTerminated) -> None:
+        # Streams above `last_stream_id` were never looked at by the server,
+        # anything at or below it is still allowed to complete, see
+        # `DrainingH2Connection`.
+        self.start_draining()
+        last_stream_id = event.last_stream_id
+        for stream_id, stream in self.streams.items():
+            if last_stream_id is None or stream_id > last_stream_id:
+                stream.fail(StreamRefused(f"GOAWAY ({event.error_code!r})"))
 
-                    if isinstance(event, StreamEnded):
-                        response_stream_ended = True
-                        break
+    def _notify_window_updated(self: Self) -> None:
+        event, self.window_updated = self.window_updated, self._create_event()
+        event.set()
 
-            await self._write_to_socket(bucket)
+    def _notify_stream_slot_freed(self: Self) -> None:
+        event, self.stream_slot_freed = self.stream_slot_freed, self._create_event()
+        event.set()
 
-        headers = dict(headers)
+    def _notify_output_flushed(self: Self) -> None:
+        event, self.output_flushed = self.output_flushed, self._create_event()
+        event.set()
 
-        return events_list, headers, body
+    def _fail_connection(self: Self, error: Exception) -> None:
+        self.connection_error = error
+        self.connection_fail = True
+        self.state = ConnectionState.CLOSED
+        for stream in self.streams.values():
+            stream.fail(error)
+        pings, self.pings = self.pings, {}
+        for _, acked in pings.values():
+            acked.set()
+        self._notify_window_updated()
+        self._notify_stream_slot_freed()
+        self._notify_output_flushed()
 
     async def __aenter__(self: Self) -> Self:
         return self
@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+from collections import OrderedDict, deque
+from typing import TYPE_CHECKING, Any, AsyncIterator, Awaitable, Callable, Iterable
+
+if TYPE_CHECKING:
+    from typing_extensions import Self
+
+    from .types import Request, Response
+
+
+class BatchResult:
+    """
+    The outcome of one request of a batch, `index` is its position in the
+    requests given to `send_many`.
+    """
+
+    __slots__ = ("index", "request", "response", "error")
+
+    index: int
+    request: Request
+    response: Response | None
+    error: BaseException | None
+
+    def __init__(
+        self: Self,
+        index: int,
+        request: Request,
+        response: Response | None = None,
+        error: BaseException | None = None,
+    ) -> None:
+        self.index = index
+        self.request = request
+        self.response = response
+        self.error = error
+
+    @property
+    def ok(self: Self) -> bool:
+        return self.error is None
+
+    def result(self: Self) -> Response:
+        """
+        The response, or raise what sending the request raised.
+        """
+        if self.error is not None:
+            raise self.error
+        return self.response
+
+
+class Batch:
+    """
+    Sends many requests through `concurrency` workers, yielding each result
+    as soon as it is in.
+
+    Requests are grouped by rate-limit route and handed out round-robin, a
+    group never takes more than its share of the workers while others have
+    requests left. An exhausted bucket then only holds up its own requests
+    instead of every worker. A failed request does not affect the others.
+    """
+
+    send: Callable[[Request], Awaitable[Response]]
+    spawn: Callable[..., Awaitable[None]]
+    create_event: Callable[[], Any]
+    concurrency: int
+    groups: OrderedDict[tuple[str, str], deque[tuple[int, Request]]]
+    inflight: dict[tuple[str, str], int]
+    remaining: int
+    workers: int
+    done: deque[BatchResult]
+    changed: Any
+    closed: bool
+
+    def __init__(
+        self: Self,
+        requests: Iterable[Request],
+        send: Callable[[Request], Awaitable[Response]],
+        spawn: Callable[..., Awaitable[None]],
+        create_event: Callable[[], Any],
+        concurrency: int = 16,
+    ) -> None:
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+
+        self.send = send
+        self.spawn = spawn
+        self.create_event = create_event
+        self.concurrency = concurrency
+        self.groups = OrderedDict()
+        self.inflight = {}
+        self.remaining = 0
+        for index, request in enumerate(requests):
+            key = request.route_key
+            self.groups.setdefault(key, deque()).append((index, request))
+            self.remaining += 1
+        self.workers = 0
+        self.done = deque()
+        self.changed = create_event()
+        self.closed = False
+
+    async def results(self: Self) -> AsyncIterator[BatchResult]:
+        """
+        Start the workers and yield results in the order they complete.
+
+        Leaving the loop early stops the batch from sending anything more,
+        requests already in flight finish in the background.
+        """
+        for _ in range(min(self.concurrency, self.remaining)):
+            self.workers += 1
+            await self.spawn(self._worker)
+
+        try:
+            while self.remaining:
+                while not self.done:
+                    await self.changed.wait()
+                self.remaining -= 1
+                yield self.done.popleft()
+        finally:
+            self.closed = True
+            self._notify_changed()
+
+    def _next(self: Self) -> tuple[tuple[str, str], int, Request] | None:
+        groups = self.groups
+        share = -(-self.concurrency // len(groups))
+        for _ in range(len(groups)):
+            key, queue = next(iter(groups.items()))
+            groups.move_to_end(key)
+            if self.inflight.get(key, 0) < share:
+                index, request = queue.popleft()
+                if not queue:
+                    del groups[key]
+                return key, index, request
+        return None
+
+    async def _worker(self: Self) -> None:
+        try:
+            while self.groups and not self.closed:
+                item = self._next()
+                if item is None:
+                    # Every group with requests left has its share in flight
+                    await self.changed.wait()
+                    continue
+
+                key, index, request = item
+                self.inflight[key] = self.inflight.get(key, 0) + 1
+                try:
+                    response = await self.send(request)
+                except BaseException as exc:
+                    # Cancellation is reported as well, or `results` would
+                    # wait for it forever
+                    self._finish(key, BatchResult(index, request, error=exc))
+                    if not isinstance(exc, Exception):
+                        raise
+                else:
+                    self._finish(key, BatchResult(index, request, response))
+        except BaseException as exc:
+            # Cancelled while sending or waiting for a turn, the last worker
+            # out fails the requests nobody is left to send
+            self.workers -= 1
+            if not self.workers:
+                self._abandon(exc)
+            raise
+        else:
+            self.workers -= 1
+
+    def _finish(self: Self, key: tuple[str, str], result: BatchResult) -> None:
+        self.inflight[key] -= 1
+        if not self.inflight[key]:
+            del self.inflight[key]
+        self.done.append(result)
+        self._notify_changed()
+
+    def _abandon(self: Self, error: BaseException) -> None:
+        for queue in self.groups.values():
+            for index, request in queue:
+                self.done.append(BatchResult(index, request, error=error))
+        self.groups.clear()
+        self._notify_changed()
+
+    def _notify_changed(self: Self) -> None:
+        event, self.changed = self.changed, self.create_event()
+        event.set()
@@ -0,0 +1,354 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any
+
+from ..utils import dumps, loads
+from .exceptions import ConnectionLost, StreamRefused
+from .priority import Priority
+from .ratelimit import BaseBucketManager
+from .types import Headers
+
+if TYPE_CHECKING:
+    from typing_extensions import Self
+
+
+# Only these headers matter to the broker, everything else stays local
+RELAYED_HEADERS = (
+    b"x-ratelimit-limit",
+    b"x-ratelimit-remaining",
+    b"x-ratelimit-reset-after",
+    b"x-ratelimit-bucket",
+    b"x-ratelimit-global",
+    b"x-ratelimit-scope",
+    b"retry-after",
+)
+MAX_MESSAGE_SIZE = 2**16
+
+
+def split_messages(buffer: bytearray) -> list[bytes]:
+    """
+    Pop every complete newline-delimited message off `buffer`.
+    """
+    *messages, rest = buffer.split(b"\n")
+    if len(rest) > MAX_MESSAGE_SIZE:
+        raise ConnectionLost("rate-limit broker message too large")
+    buffer[:] = rest
+    return messages
+
+
+def encode_message(message: dict[str, Any]) -> bytes:
+    return dumps(message) + b"\n"
+
+
+class Grant:
+    """
+    An `acquire` waiting for the broker's answer.
+    """
+
+    __slots__ = ("granted", "abandoned", "error")
+
+    granted: Any
+    abandoned: bool
+    error: Exception | None
+
+    def __init__(self: Self, granted: Any) -> None:
+        self.granted = granted
+        self.abandoned = False
+        self.error = None
+
+
+class BaseSharedBucketManager(BaseBucketManager):
+    """
+    Coordinates rate limits through a `BucketBroker` shared between
+    processes, or between hosts when the broker listens on TCP.
+
+    The broker keeps all bucket state and answers each `acquire` once the
+    request may go out, so every worker behind the same token sees the
+    same limits. `address` is a Unix socket path or a `(host, port)` pair.
+    """
+
+    address: str | tuple[str, int]
+    grants: dict[int, Grant]
+    outbox: list[bytes]
+    next_id: int
+    connection_error: Exception | None
+
+    socket: Any
+    connect_lock: Any
+    outbox_ready: Any
+
+    def __init__(self: Self, address: str | tuple[str, int]) -> None:
+        self.address = address
+        self.grants = {}
+        self.outbox = []
+        self.next_id = 0
+        self.connection_error = None
+        self.socket = None
+        self.outbox_ready = None
+
+    async def _open_socket(self: Self) -> Any:
+        raise NotImplementedError()
+
+    async def _stream_recv(self: Self, max_bytes: int) -> bytes:
+        raise NotImplementedError()
+
+    async def _stream_send(self: Self, data: bytes) -> None:
+        raise NotImplementedError()
+
+    def _create_event(self: Self) -> Any:
+        raise NotImplementedError()
+
+    async def _spawn(self: Self, func: Any, *args: Any) -> None:
+        raise NotImplementedError()
+
+    async def _close_socket(self: Self) -> None:
+        raise NotImplementedError()
+
+    @property
+    def is_connected(self: Self) -> bool:
+        return self.socket is not None and self.connection_error is None
+
+    async def connect(self: Self) -> Self:
+        async with self.connect_lock:
+            if self.is_connected:
+                return self
+            if self.socket is not None:
+                # Stops the tasks still bound to the lost connection
+                await self._close_socket()
+
+            self.socket = await self._open_socket()
+            self.connection_error = None
+            self.outbox_ready = self._create_event()
+            await self._spawn(self._read_loop)
+            await self._spawn(self._write_loop)
+        return self
+
+    async def acquire(
+        self: Self,
+        method: bytes,
+        path: str,
+        priority: int = Priority.NORMAL,
+        *,
+        route: tuple[str, str] | None = None,
+    ) -> int:
+        if self.socket is None:
+            raise RuntimeError("Please connect first")
+        if self.connection_error is not None:
+            await self.connect()
+
+        # IDs are never reused, so a release for a grant from an earlier
+        # connection is simply ignored by the broker
+        grant_id = self.next_id
+        self.next_id += 1
+        grant = self.grants[grant_id] = Grant(self._create_event())
+        self._queue(
+            {
+                "op": "acquire",
+                "id": grant_id,
+                "method": method.decode("ascii"),
+                "path": path,
+                "priority": int(priority),
+            }
+        )
+        try:
+            await grant.granted.wait()
+        except BaseException:
+            if grant.granted.is_set() and grant.error is None:
+                self._queue({"op": "release", "id": grant_id})
+            else:
+                # Given back as soon as the broker grants it
+                grant.abandoned = True
+            raise
+
+        if grant.error is not None:
+            raise grant.error
+        return grant_id
+
+    def release(
+        self: Self,
+        token: int,
+        method: bytes,
+        path: str,
+        status: int | None = None,
+        headers: Headers | None = None,
+        *,
+        route: tuple[str, str] | None = None,
+    ) -> None:
+        if not self.is_connected:
+            # The broker released everything this connection held
+            return
+
+        message = {"op": "release", "id": token}
+        if headers is not None:
+            message["status"] = status
+            message["headers"] = [
+                [name.decode("latin-1"), headers[name].decode("latin-1")]
+                for name in RELAYED_HEADERS
+                if name in headers
+            ]
+        self._queue(message)
+
+    def _queue(self: Self, message: dict[str, Any]) -> None:
+        self.outbox.append(encode_message(message))
+        event, self.outbox_ready = self.outbox_ready, self._create_event()
+        event.set()
+
+    async def _write_loop(self: Self) -> None:
+        try:
+            while True:
+                if not self.outbox:
+                    await self.outbox_ready.wait()
+                    continue
+
+                data = b"".join(self.outbox)
+                self.outbox.clear()
+                await self._stream_send(data)
+        except Exception as exc:
+            self._fail(ConnectionLost(f"rate-limit broker: {exc!r}"))
+
+    async def _read_loop(self: Self) -> None:
+        buffer = bytearray()
+        try:
+            while True:
+                data = await self._stream_recv(65536)
+                if not data:
+                    raise ConnectionLost("rate-limit broker closed the connection")
+
+                buffer += data
+                for message in split_messages(buffer):
+                    self._receive(loads(message))
+        except Exception as exc:
+            if not isinstance(exc, ConnectionLost):
+                exc = ConnectionLost(f"rate-limit broker: {exc!r}")
+            self._fail(exc)
+
+    def _receive(self: Self, message: dict[str, Any]) -> None:
+        grant_id = message["id"]
+        grant = self.grants.pop(grant_id, None)
+        if grant is None:
+            return
+        if grant.abandoned:
+            self._queue({"op": "release", "id": grant_id})
+        else:
+            grant.granted.set()
+
+    def _fail(self: Self, error: Exception) -> None:
+        if self.connection_error is None:
+            self.connection_error = error
+        self.outbox.clear()
+        grants, self.grants = self.grants, {}
+        for grant in grants.values():
+            # Nothing was sent yet, so the request can safely be tried again
+            grant.error = StreamRefused(str(error))
+            grant.granted.set()
+
+
+class BaseBrokerSession:
+    """
+    One `SharedBucketManager` connected to a `BucketBroker`.
+
+    Every `acquire` is waited on in its own task against the broker's
+    in-memory manager. Whatever the peer still holds when it disconnects is
+    released on its behalf.
+    """
+
+    manager: BaseBucketManager
+    grants: dict[int, tuple[Any, bytes, str]]
+    closed: bool
+
+    write_lock: Any
+
+    def __init__(self: Self, manager: BaseBucketManager) -> None:
+        self.manager = manager
+        self.grants = {}
+        self.closed = False
+
+    async def _stream_recv(self: Self, max_bytes: int) -> bytes:
+        raise NotImplementedError()
+
+    async def _stream_send(self: Self, data: bytes) -> None:
+        raise NotImplementedError()
+
+    async def _spawn(self: Self, func: Any, *args: Any) -> None:
+        raise NotImplementedError()
+
+    async def run(self: Self) -> None:
+        buffer = bytearray()
+        try:
+            while True:
+                data = await self._stream_recv(65536)
+                if not data:
+                    return
+
+                buffer += data
+                for message in split_messages(buffer):
+                    await self._handle(loads(message))
+        finally:
+            self.closed = True
+            grants, self.grants = self.grants, {}
+            for token, method, path in grants.values():
+                self.manager.release(token, method, path)
+
+    async def _handle(self: Self, message: dict[str, Any]) -> None:
+        grant_id = message["id"]
+        if message["op"] == "acquire":
+            await self._spawn(
+                self._grant,
+                grant_id,
+                message["method"].encode("ascii"),
+                message["path"],
+                message.get("priority", Priority.NORMAL),
+            )
+            return
+
+        grant = self.grants.pop(grant_id, None)
+        if grant is None:
+            return
+
+        token, method, path = grant
+        raw_headers = message.get("headers")
+        if raw_headers is None:
+            self.manager.release(token, method, path)
+        else:
+            headers = Headers(
+                [
+                    (name.encode("latin-1"), value.encode("latin-1"))
+                    for name, value in raw_headers
+                ]
+            )
+            self.manager.release(token, method, path, message["status"], headers)
+
+    async def _grant(
+        self: Self, grant_id: int, method: bytes, path: str, priority: int
+    ) -> None:
+        token = await self.manager.acquire(method, path, Priority(priority))
+        if self.closed:
+            self.manager.release(token, method, path)
+            return
+
+        self.grants[grant_id] = (token, method, path)
+        try:
+            async with self.write_lock:
+                await self._stream_send(encode_message({"id": grant_id}))
+        except Exception:
+            # The connection is gone, `run` releases the grant once it
+            # notices
+            pass
+
+
+class BaseBucketBroker:
+    """
+    Serves one in-memory bucket manager to every `SharedBucketManager`
+    pointed at it.
+
+    The protocol has no authentication, a TCP broker should only listen on
+    a trusted network.
+    """
+
+    manager: BaseBucketManager
+
+    def __init__(self: Self, manager: BaseBucketManager) -> None:
+        self.manager = manager
+
+    async def serve(self: Self, address: str | tuple[str, int]) -> None:
+        raise NotImplementedError()
@@ -0,0 +1,297 @@
+from __future__ import annotations
+
+import re
+from collections import OrderedDict
+from time import monotonic
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Iterable
+
+from .ratelimit import route_template
+from .singleflight import flight_key
+from .types import Request
+
+if TYPE_CHECKING:
+    from typing_extensions import Self
+
+    from .types import Response
+
+
+API_VERSION = re.compile(r"^/api/v\d+")
+# Requests that change the resource at their path (or create one in it)
+MUTATING_METHODS = frozenset({b"POST", b"PUT", b"PATCH", b"DELETE"})
+
+
+def cache_route(path: str) -> str:
+    """
+    The route a TTL is configured for, `/api/v10/channels/1234` becomes
+    `/channels/{id}`.
+    """
+    return API_VERSION.sub("", route_template(path))
+
+
+class CacheEntry:
+    __slots__ = (
+        "response",
+        "path",
+        "size",
+        "expires",
+        "stale_until",
+        "etag",
+        "revalidating",
+    )
+
+    response: Response
+    path: str
+    size: int
+    expires: float
+    stale_until: float
+    etag: bytes | None
+    revalidating: bool
+
+    def __init__(
+        self: Self,
+        response: Response,
+        path: str,
+        expires: float,
+        stale_until: float,
+    ) -> None:
+        self.response = response
+        self.path = path
+        self.size = len(response.content)
+        self.expires = expires
+        self.stale_until = stale_until
+        self.etag = response.headers.get(b"etag")
+        self.revalidating = False
+
+
+class BaseResponseCache:
+    """
+    Answers GET requests from earlier responses, in front of the rate
+    limiter and the connection, so a hit costs neither a round trip nor
+    quota.
+
+    Only `200` responses of routes with a TTL are kept, `ttls` maps route
+    templates without the API version (`/channels/{id}`) to seconds and
+    every other route uses `default_ttl`. For `stale_ttl` seconds past its
+    TTL an entry is still served while it is refreshed in the background,
+    conditionally if the server sent an `ETag`.
+
+    POST, PUT, PATCH and DELETE requests drop whatever is cached for their
+    path and its parent, invalidation hooks can name further paths a
+    request makes stale. Entries are keyed on URL and `Authorization`, a
+    cache must only be shared between clients using the same token.
+
+    Subclasses provide the storage.
+    """
+
+    ttls: dict[str, float]
+    default_ttl: float
+    stale_ttl: float
+    invalidation_hooks: list[Callable[[Request], Iterable[str]]]
+    fetching: dict[str, int]
+    invalidations: dict[str, int]
+
+    def __init__(
+        self: Self,
+        ttls: dict[str, float] | None = None,
+        default_ttl: float = 0.0,
+        stale_ttl: float = 0.0,
+    ) -> None:
+        self.ttls = ttls or {}
+        self.default_ttl = default_ttl
+        self.stale_ttl = stale_ttl
+        self.invalidation_hooks = []
+        self.fetching = {}
+        self.invalidations = {}
+
+    def _get(self: Self, key: Any) -> CacheEntry | None:
+        raise NotImplementedError()
+
+    def _put(self: Self, key: Any, entry: CacheEntry) -> None:
+        raise NotImplementedError()
+
+    def _invalidate(self: Self, path: str) -> None:
+        raise NotImplementedError()
+
+    def add_invalidation_hook(
+        self: Self, hook: Callable[[Request], Iterable[str]]
+    ) -> None:
+        """
+        Have `hook(request)` name the paths a mutating request makes stale,
+        in addition to its own.
+        """
+        self.invalidation_hooks.append(hook)
+
+    def invalidate(self: Self, path: str) -> None:
+        """
+        Drop every response cached for `path`, whatever its query.
+        """
+        if path in self.fetching:
+            # A response already on its way may predate the change
+            self.invalidations[path] = self.invalidations.get(path, 0) + 1
+        self._invalidate(path)
+
+    def ttl_for(self: Self, path: str) -> float:
+        return self.ttls.get(cache_route(path), self.default_ttl)
+
+    async def fetch(
+        self: Self,
+        request: Request,
+        send: Callable[[Request], Awaitable[Response]],
+        spawn: Callable[..., Awaitable[None]],
+    ) -> Response:
+        """
+        Answer `request` from the cache if possible, otherwise `send` it and
+        remember the response. Stale entries are refreshed through `spawn`,
+        in a task that must not be tied to a single connection.
+        """
+        if request.method in MUTATING_METHODS:
+            try:
+                return await send(request)
+            finally:
+                # Even a failed request may have been applied
+                self._invalidate_for(request)
+
+        path = request.endpoint
+        key = flight_key(request) if request.method == b"GET" else None
+        if key is None or self.ttl_for(path) <= 0:
+            return await send(request)
+
+        entry = self._get(key)
+        if entry is not None:
+            now = monotonic()
+            if now < entry.expires:
+                return entry.response
+            if now < entry.stale_until:
+                if not entry.revalidating:
+                    entry.revalidating = True
+                    await spawn(self._revalidate, request, key, entry, send)
+                return entry.response
+
+        return await self._refresh(request, key, entry, send)
+
+    async def _refresh(
+        self: Self,
+        request: Request,
+        key: Any,
+        entry: CacheEntry | None,
+        send: Callable[[Request], Awaitable[Response]],
+    ) -> Response:
+        path = request.endpoint
+        sent = request
+        if entry is not None and entry.etag is not None:
+            sent = Request(
+                request.method,
+                request.url_string,
+                headers={**request.headers, b"if-none-match": entry.etag},
+                priority=request.priority,
+            )
+
+        self.fetching[path] = self.fetching.get(path, 0) + 1
+        invalidations = self.invalidations.get(path, 0)
+        try:
+            response = await send(sent)
+            if response.status == 304 and entry is not None:
+                response = entry.response
+            if self.invalidations.get(path, 0) == invalidations:
+                self._store(key, path, response)
+            return response
+        finally:
+            self.fetching[path] -= 1
+            if not self.fetching[path]:
+                del self.fetching[path]
+                self.invalidations.pop(path, None)
+
+    async def _revalidate(
+        self: Self,
+        request: Request,
+        key: Any,
+        entry: CacheEntry,
+        send: Callable[[Request], Awaitable[Response]],
+    ) -> None:
+        try:
+            await self._refresh(request, key, entry, send)
+        except Exception:
+            # The stale entry keeps being served until it runs out
+            pass
+        finally:
+            entry.revalidating = False
+
+    def _store(self: Self, key: Any, path: str, response: Response) -> None:
+        if response.status != 200:
+            return
+        if b"no-store" in response.headers.get(b"cache-control", b""):
+            return
+
+        expires = monotonic() + self.ttl_for(path)
+        self._put(key, CacheEntry(response, path, expires, expires + self.stale_ttl))
+
+    def _invalidate_for(self: Self, request: Request) -> None:
+        path = request.endpoint
+        self.invalidate(path)
+        # The collection listing the resource is stale as well
+        parent = path.rpartition("/")[0]
+        if parent:
+            self.invalidate(parent)
+        for hook in self.invalidation_hooks:
+            for path in hook(request):
+                self.invalidate(path)
+
+
+class MemoryResponseCache(BaseResponseCache):
+    """
+    Keeps responses in this process, evicting the least recently used once
+    their bodies add up to more than `max_bytes`.
+    """
+
+    max_bytes: int
+    size: int
+    entries: OrderedDict[Any, CacheEntry]
+    paths: dict[str, set[Any]]
+
+    def __init__(
+        self: Self,
+        ttls: dict[str, float] | None = None,
+        default_ttl: float = 0.0,
+        stale_ttl: float = 0.0,
+        max_bytes: int = 2**24,
+    ) -> None:
+        BaseResponseCache.__init__(self, ttls, default_ttl, stale_ttl)
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries = OrderedDict()
+        self.paths = {}
+
+    def _get(self: Self, key: Any) -> CacheEntry | None:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry.stale_until <= monotonic():
+            self._remove(key)
+            return None
+
+        self.entries.move_to_end(key)
+        return entry
+
+    def _put(self: Self, key: Any, entry: CacheEntry) -> None:
+        if key in self.entries:
+            self._remove(key)
+        if entry.size > self.max_bytes:
+            return
+
+        self.entries[key] = entry
+        self.paths.setdefault(entry.path, set()).add(key)
+        self.size += entry.size
+        while self.size > self.max_bytes:
+            self._remove(next(iter(self.entries)))
+
+    def _invalidate(self: Self, path: str) -> None:
+        for key in list(self.paths.get(path, ())):
+            self._remove(key)
+
+    def _remove(self: Self, key: Any) -> None:
+        entry = self.entries.pop(key)
+        self.size -= entry.size
+        keys = self.paths[entry.path]
+        keys.discard(key)
+        if not keys:
+            del self.paths[entry.path]
@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+from .route import Route
+
+# Compiled once at import, `GET_CHANNEL.request({"channel_id": 1234})` then
+# builds a request without parsing a URL
+
+# Channels
+GET_CHANNEL = Route("GET", "/channels/{channel_id}")
+MODIFY_CHANNEL = Route("PATCH", "/channels/{channel_id}")
+DELETE_CHANNEL = Route("DELETE", "/channels/{channel_id}")
+TRIGGER_TYPING = Route("POST", "/channels/{channel_id}/typing")
+GET_PINNED_MESSAGES = Route("GET", "/channels/{channel_id}/pins")
+PIN_MESSAGE = Route("PUT", "/channels/{channel_id}/pins/{message_id}")
+UNPIN_MESSAGE = Route("DELETE", "/channels/{channel_id}/pins/{message_id}")
+
+# Messages
+GET_CHANNEL_MESSAGES = Route("GET", "/channels/{channel_id}/messages")
+GET_CHANNEL_MESSAGE = Route("GET", "/channels/{channel_id}/messages/{message_id}")
+CREATE_MESSAGE = Route("POST", "/channels/{channel_id}/messages")
+EDIT_MESSAGE = Route("PATCH", "/channels/{channel_id}/messages/{message_id}")
+DELETE_MESSAGE = Route("DELETE", "/channels/{channel_id}/messages/{message_id}")
+BULK_DELETE_MESSAGES = Route("POST", "/channels/{channel_id}/messages/bulk-delete")
+
+# Reactions
+CREATE_REACTION = Route(
+    "PUT", "/channels/{channel_id}/messages/{message_id}/reactions/{emoji}/@me"
+)
+DELETE_OWN_REACTION = Route(
+    "DELETE", "/channels/{channel_id}/messages/{message_id}/reactions/{emoji}/@me"
+)
+GET_REACTIONS = Route(
+    "GET", "/channels/{channel_id}/messages/{message_id}/reactions/{emoji}"
+)
+
+# Guilds
+GET_GUILD = Route("GET", "/guilds/{guild_id}")
+GET_GUILD_CHANNELS = Route("GET", "/guilds/{guild_id}/channels")
+GET_GUILD_ROLES = Route("GET", "/guilds/{guild_id}/roles")
+LIST_GUILD_EMOJIS = Route("GET", "/guilds/{guild_id}/emojis")
+LIST_GUILD_MEMBERS = Route("GET", "/guilds/{guild_id}/members")
+GET_GUILD_MEMBER = Route("GET", "/guilds/{guild_id}/members/{user_id}")
+ADD_GUILD_MEMBER_ROLE = Route(
+    "PUT", "/guilds/{guild_id}/members/{user_id}/roles/{role_id}"
+)
+REMOVE_GUILD_MEMBER_ROLE = Route(
+    "DELETE", "/guilds/{guild_id}/members/{user_id}/roles/{role_id}"
+)
+
+# Users
+GET_CURRENT_USER = Route("GET", "/users/@me")
+GET_USER = Route("GET", "/users/{user_id}")
+
+# Interactions and webhooks, the interaction routes are exempt from the
+# global rate limit
+CREATE_INTERACTION_RESPONSE = Route(
+    "POST", "/interactions/{interaction_id}/{interaction_token}/callback"
+)
+EDIT_ORIGINAL_INTERACTION_RESPONSE = Route(
+    "PATCH", "/webhooks/{application_id}/{interaction_token}/messages/@original"
+)
+CREATE_FOLLOWUP_MESSAGE = Route(
+    "POST", "/webhooks/{application_id}/{interaction_token}"
+)
+EXECUTE_WEBHOOK = Route("POST", "/webhooks/{webhook_id}/{webhook_token}")
+
+# Gateway
+GET_GATEWAY_BOT = Route("GET", "/gateway/bot")
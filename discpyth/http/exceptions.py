@@ -1,3 +1,11 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .types import Response
+
+
 class HTTPException(Exception):
     """
     Base class for all HTTP exceptions.
@@ -5,11 +13,15 @@ class HTTPException(Exception):
 
     code: int
     message: str
+    response: Response | None
 
-    def __init__(self, code: int, message: str) -> None:
+    def __init__(
+        self, code: int, message: str, response: Response | None = None
+    ) -> None:
         super().__init__(f"{code} {message}")
         self.code = code
         self.message = message
+        self.response = response
 
 
 class Forbidden(HTTPException):
@@ -17,8 +29,8 @@ class Forbidden(HTTPException):
     403 Forbidden
     """
 
-    def __init__(self, endpoint: str) -> None:
-        super().__init__(403, f"Forbidden: {endpoint}")
+    def __init__(self, endpoint: str, response: Response | None = None) -> None:
+        super().__init__(403, f"Forbidden: {endpoint}", response)
 
 
 class NotFound(HTTPException):
@@ -26,14 +38,65 @@ class NotFound(HTTPException):
     404 Not Found
     """
 
-    def __init__(self, endpoint: str) -> None:
-        super().__init__(404, f"Not Found: {endpoint}")
+    def __init__(self, endpoint: str, response: Response | None = None) -> None:
+        super().__init__(404, f"Not Found: {endpoint}", response)
 
 
 class ServerError(HTTPException):
     """
-    500 Server Error
+    5xx Server Error
+    """
+
+    def __init__(
+        self, endpoint: str, response: Response | None = None, code: int = 500
+    ) -> None:
+        super().__init__(code, f"Server Error: {endpoint}", response)
+
+
+class ConnectionLost(Exception):
+    """
+    The underlying HTTP/2 connection was closed or failed.
+    """
+
+    def __init__(self, reason: str) -> None:
+        super().__init__(f"Connection lost: {reason}")
+        self.reason = reason
+
+
+class StreamReset(Exception):
+    """
+    The server reset a stream with RST_STREAM.
+    """
+
+    error_code: int
+
+    def __init__(self, stream_id: int, error_code: int) -> None:
+        super().__init__(f"Stream {stream_id} reset with error code {error_code}")
+        self.stream_id = stream_id
+        self.error_code = error_code
+
+
+class RequestTimeout(TimeoutError):
+    """
+    A request exceeded one of its `Timeout` limits. Only its own stream was
+    reset, the connection stays usable.
+    """
+
+    phase: str
+    seconds: float
+
+    def __init__(self, phase: str, seconds: float) -> None:
+        super().__init__(f"{phase} timeout after {seconds}s")
+        self.phase = phase
+        self.seconds = seconds
+
+
+class StreamRefused(Exception):
+    """
+    The request was never processed by the server and can be sent again,
+    either on the same or on another connection.
     """
 
-    def __init__(self, endpoint: str) -> None:
-        super().__init__(500, f"Server Error: {endpoint}")
+    def __init__(self, reason: str) -> None:
+        super().__init__(f"Stream refused: {reason}")
+        self.reason = reason
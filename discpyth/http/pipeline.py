@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+from functools import partial
+from typing import TYPE_CHECKING, Any, AsyncIterator, Awaitable, Callable, Iterable
+
+from .batch import Batch
+
+if TYPE_CHECKING:
+    from .batch import BatchResult
+    from .cache import BaseResponseCache
+    from .retry import RetryPolicy
+    from .singleflight import SingleFlight
+    from .types import Request, Response
+
+
+async def send_request(
+    request: Request,
+    send_once: Callable[[Request], Awaitable[Response]],
+    retry_policy: RetryPolicy,
+    sleep: Callable[[float], Awaitable[None]],
+    spawn: Callable[..., Awaitable[None]],
+    *,
+    stream: bool = False,
+    single_flight: SingleFlight | None = None,
+    response_cache: BaseResponseCache | None = None,
+) -> Response:
+    """
+    Send `request` the way `HTTPClient` and `HTTPPool` do, with `send_once`
+    making a single attempt.
+
+    Attempts are retried according to `retry_policy`. Unless the response
+    is streamed, `response_cache` answers it first and `single_flight` then
+    shares it with identical requests in flight, the cache refreshing stale
+    entries through `spawn`.
+    """
+
+    async def send(request: Request) -> Response:
+        return await retry_policy.call(request, send_once, sleep)
+
+    if stream:
+        return await send(request)
+
+    fetch = send
+    if single_flight is not None:
+        fetch = partial(single_flight.call, send=send)
+    if response_cache is not None:
+        return await response_cache.fetch(request, fetch, spawn)
+    return await fetch(request)
+
+
+def send_batch(
+    requests: Iterable[Request],
+    send: Callable[[Request], Awaitable[Response]],
+    spawn: Callable[..., Awaitable[None]],
+    create_event: Callable[[], Any],
+    concurrency: int,
+) -> AsyncIterator[BatchResult]:
+    """
+    Results of sending `requests` through `send` in workers started with
+    `spawn`, see `Batch`.
+    """
+    return Batch(requests, send, spawn, create_event, concurrency).results()
@@ -0,0 +1,311 @@
+from __future__ import annotations
+
+from functools import partial
+from time import monotonic
+from typing import TYPE_CHECKING, Any, AsyncIterator, Iterable
+
+from .base import ConnectionState
+from .exceptions import ConnectionLost
+from .pipeline import send_batch, send_request
+from .retry import RetryPolicy
+from .singleflight import SingleFlight
+
+if TYPE_CHECKING:
+    from types import TracebackType
+
+    from typing_extensions import Self
+
+    from .base import BaseHTTPClient
+    from .batch import BatchResult
+    from .cache import BaseResponseCache
+    from .types import Request, Response, Timeout
+
+
+class BaseHTTPPool:
+    """
+    Keeps several HTTP/2 connections to the same authority.
+
+    Requests go to the least loaded connection, connections that run out of
+    stream IDs or receive a GOAWAY are drained in the background while a
+    replacement is opened, so callers never have to reconnect themselves.
+    With `keepalive_interval` set, every connection is PINGed that often and
+    the ones that stop answering are replaced as well.
+
+    With `single_flight` enabled, identical GET requests sent while one is
+    already in flight share its response. A `response_cache` answers GET
+    requests before they reach the rate limiter.
+    """
+
+    url: str
+    size: int
+    refill_threshold: int
+    max_reconnect_retries: int
+    max_request_retries: int
+    retry_policy: RetryPolicy
+    keepalive_interval: float | None
+    keepalive_timeout: float
+    timeout: Timeout | None
+    single_flight: SingleFlight | None
+    response_cache: BaseResponseCache | None
+    default_headers: dict[bytes, bytes]
+    clients: list[BaseHTTPClient]
+    replacing: set[BaseHTTPClient]
+    retiring: set[BaseHTTPClient]
+    pending: int
+    connect_error: Exception | None
+
+    bucket_manager: Any
+    client_ready: Any
+
+    def __init__(
+        self: Self,
+        size: int = 2,
+        max_reconnect_retries: int = 3,
+        max_request_retries: int = 3,
+        default_headers: dict[bytes, bytes] | None = None,
+        refill_threshold: int = 2**16,
+        retry_policy: RetryPolicy | None = None,
+        keepalive_interval: float | None = None,
+        keepalive_timeout: float = 20.0,
+        timeout: Timeout | None = None,
+        single_flight: bool = False,
+        response_cache: BaseResponseCache | None = None,
+    ) -> None:
+        if size < 1:
+            raise ValueError("Pool size must be at least 1")
+
+        self.url = None
+        self.size = size
+        self.refill_threshold = refill_threshold
+        self.max_reconnect_retries = max_reconnect_retries
+        self.max_request_retries = max_request_retries
+        self.retry_policy = retry_policy or RetryPolicy(max_request_retries)
+        self.keepalive_interval = keepalive_interval
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = timeout
+        self.single_flight = SingleFlight(self._create_event) if single_flight else None
+        self.response_cache = response_cache
+        self.default_headers = default_headers or {}
+        self.clients = []
+        self.replacing = set()
+        self.retiring = set()
+        self.pending = 0
+        self.connect_error = None
+        self.client_ready = None
+
+    def _create_client(self: Self) -> BaseHTTPClient:
+        raise NotImplementedError()
+
+    def _create_event(self: Self) -> Any:
+        raise NotImplementedError()
+
+    async def _spawn(self: Self, func: Any, *args: Any) -> None:
+        raise NotImplementedError()
+
+    async def _sleep(self: Self, seconds: float) -> None:
+        raise NotImplementedError()
+
+    async def connect(self: Self, url: str) -> Self:
+        self.url = url
+        for _ in range(self.size):
+            client = self._create_client()
+            await client.connect(url)
+            self.clients.append(client)
+        if self.keepalive_interval is not None:
+            await self._spawn(self._keepalive_loop)
+        return self
+
+    @property
+    def rtt(self: Self) -> float | None:
+        """
+        Mean round-trip time of the connections, `None` before any was
+        measured.
+        """
+        samples = [client.rtt for client in self.clients if client.rtt is not None]
+        if not samples:
+            return None
+        return sum(samples) / len(samples)
+
+    async def warmup(self: Self) -> None:
+        """
+        Open any connection that is missing and PING all of them, so the
+        first requests do not pay for the setup.
+        """
+        await self._maintain()
+        while self.pending:
+            await self.client_ready.wait()
+        for client in list(self.clients):
+            if client.is_available:
+                try:
+                    await client.ping(self.keepalive_timeout)
+                except ConnectionLost:
+                    # Dead, replaced right below
+                    pass
+
+        await self._maintain()
+        while self.pending:
+            await self.client_ready.wait()
+
+    async def send(
+        self: Self,
+        request: Request,
+        *,
+        stream: bool = False,
+        timeout: Timeout | None = None,
+    ) -> Response:
+        """
+        Send `request` like `HTTPClient.send` does, each attempt on the least
+        loaded connection.
+        """
+        return await send_request(
+            request,
+            lambda request: self._send_once(request, stream, timeout),
+            self.retry_policy,
+            self._sleep,
+            self._spawn,
+            stream=stream,
+            single_flight=self.single_flight,
+            response_cache=self.response_cache,
+        )
+
+    def send_many(
+        self: Self,
+        requests: Iterable[Request],
+        *,
+        concurrency: int = 16,
+        timeout: Timeout | None = None,
+    ) -> AsyncIterator[BatchResult]:
+        """
+        Send a batch of requests with at most `concurrency` in flight,
+        yielding a `BatchResult` for each as it completes.
+
+        Requests of different rate-limit buckets are interleaved, so one
+        exhausted bucket does not hold up the rest. Failures are reported
+        per request and never cancel the others.
+        """
+        return send_batch(
+            requests,
+            partial(self.send, timeout=timeout),
+            self._spawn,
+            self._create_event,
+            concurrency,
+        )
+
+    async def _send_once(
+        self: Self,
+        request: Request,
+        streaming: bool = False,
+        timeout: Timeout | None = None,
+    ) -> Response:
+        # Every attempt picks a connection again, so a request refused by a
+        # draining connection is retried on a healthy one
+        client = await self._acquire_client()
+        return await client._send_once(request, streaming, timeout)
+
+    async def _acquire_client(self: Self) -> BaseHTTPClient:
+        while True:
+            await self._maintain()
+            available = [client for client in self.clients if client.is_available]
+            if available:
+                return min(available, key=lambda client: client.load)
+
+            if self.pending == 0 and self.connect_error is not None:
+                raise self.connect_error
+            await self.client_ready.wait()
+
+    async def _maintain(self: Self) -> None:
+        """
+        Retire connections that can no longer take new streams and open
+        replacements in the background for the ones about to run dry.
+        """
+        for client in list(self.clients):
+            if not client.is_available:
+                self.clients.remove(client)
+                self.replacing.discard(client)
+                await self._spawn(self._retire, client)
+
+            elif (
+                client.stream_ids_left <= self.refill_threshold
+                and client not in self.replacing
+            ):
+                # Keeps serving requests until the replacement is ready
+                self.replacing.add(client)
+                await self._spawn(self._open_client, client)
+
+        while len(self.clients) + self.pending < self.size:
+            self.pending += 1
+            await self._spawn(self._open_client, None)
+
+    async def _open_client(self: Self, replaces: BaseHTTPClient | None) -> None:
+        client = self._create_client()
+        try:
+            await client.connect(self.url)
+        except Exception as exc:
+            self.connect_error = exc
+            self.replacing.discard(replaces)
+        else:
+            self.connect_error = None
+            self.clients.append(client)
+            if replaces is not None and replaces in self.clients:
+                self.clients.remove(replaces)
+                self.replacing.discard(replaces)
+                await self._spawn(self._retire, replaces)
+        finally:
+            if replaces is None:
+                self.pending -= 1
+            self._notify_client_ready()
+
+    async def _retire(self: Self, client: BaseHTTPClient) -> None:
+        # Kept in `retiring` until closed so `aclose` can pick it up if this
+        # task gets cancelled halfway through.
+        self.retiring.add(client)
+        client.start_draining()
+        while client.streams and client.state != ConnectionState.CLOSED:
+            await client.stream_slot_freed.wait()
+
+        self.retiring.discard(client)
+        try:
+            await client.aclose()
+        except Exception:  # pragma: nocover
+            # The connection is being thrown away, a failed GOAWAY is fine
+            pass
+
+    async def _keepalive_loop(self: Self) -> None:
+        while True:
+            await self._sleep(self.keepalive_interval)
+            pings = [
+                (client, client._send_ping())
+                for client in self.clients
+                if client.is_available
+            ]
+            # All of them were sent at once and share the timeout
+            deadline = monotonic() + self.keepalive_timeout
+            for client, acked in pings:
+                timeout = max(deadline - monotonic(), 0.0)
+                if not await client._wait_for_ping(acked, timeout):
+                    client._fail_connection(ConnectionLost("keepalive PING timed out"))
+            # Replaces the dead ones before a request has to wait for it
+            await self._maintain()
+
+    def _notify_client_ready(self: Self) -> None:
+        event, self.client_ready = self.client_ready, self._create_event()
+        event.set()
+
+    async def aclose(self: Self) -> None:
+        clients = self.clients + list(self.retiring)
+        self.clients = []
+        self.replacing.clear()
+        self.retiring.clear()
+        for client in clients:
+            await client.aclose()
+
+    async def __aenter__(self: Self) -> Self:
+        return self
+
+    async def __aexit__(
+        self: Self,
+        exc_type: type[BaseException] | None,
+        exc_val: BaseException | None,
+        exc_tb: TracebackType | None,
+    ) -> None:
+        await self.aclose()
@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+from enum import IntEnum
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from typing_extensions import Self
+
+
+class Priority(IntEnum):
+    BACKGROUND = 0  # Housekeeping that can wait, e.g. bulk syncs
+    NORMAL = 1
+    INTERACTIVE = 2  # Someone is waiting on it, e.g. interaction responses
+
+
+# HTTP/2 stream weights, `NORMAL` keeps the default of 16 and is not sent
+STREAM_WEIGHTS = {Priority.BACKGROUND: 1, Priority.INTERACTIVE: 256}
+# Share of the global rate limit background requests leave to the others
+BACKGROUND_HEADROOM = 0.2
+
+
+class PriorityWaiters:
+    """
+    Counts the requests waiting for a resource by priority, so whoever
+    wakes up first can step aside for a more urgent request.
+    """
+
+    __slots__ = ("counts",)
+
+    counts: list[int]
+
+    def __init__(self: Self) -> None:
+        self.counts = [0] * len(Priority)
+
+    def outranked(self: Self, priority: int) -> bool:
+        return any(self.counts[priority + 1 :])
+
+    def add(self: Self, priority: int) -> None:
+        self.counts[priority] += 1
+
+    def remove(self: Self, priority: int) -> bool:
+        """
+        Returns whether less urgent requests may have been held back by this
+        one and should check again.
+        """
+        self.counts[priority] -= 1
+        return any(self.counts[:priority])
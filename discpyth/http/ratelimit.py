@@ -0,0 +1,441 @@
+from __future__ import annotations
+
+import re
+from collections import deque
+from time import monotonic
+from typing import TYPE_CHECKING, Any
+
+from .priority import BACKGROUND_HEADROOM, Priority, PriorityWaiters
+
+if TYPE_CHECKING:
+    from typing_extensions import Self
+
+    from .types import Headers
+
+
+# `/channels/{id}`, `/guilds/{id}` and `/webhooks/{id}/{token}` each get
+# their own buckets even when they share a route
+MAJOR_PARAMETERS = re.compile(
+    r"^(?:/api/v\d+)?/(?:channels|guilds|webhooks|interactions)/(\d+)"
+    r"(?:/([A-Za-z0-9_\-.]{60,}))?"
+)
+SNOWFLAKE = re.compile(r"/\d{15,21}(?=/|$)")
+REACTION = re.compile(r"/reactions/[^/]+")
+TOKEN = re.compile(r"/[A-Za-z0-9_\-.]{60,}(?=/|$)")
+# Interaction endpoints are not bound to the global rate limit
+GLOBAL_EXEMPT = re.compile(r"^(?:/api/v\d+)?/interactions/")
+
+# Buckets whose window expired are dropped once there are more than this
+PRUNE_THRESHOLD = 4096
+# Routes answering without rate-limit headers are not limited at all
+UNLIMITED = -1
+# Resets further apart than this (in seconds) belong to different windows
+WINDOW_SLACK = 0.2
+# Requests per second a bot may make across all routes
+GLOBAL_RATE = 50
+
+
+def route_template(path: str) -> str:
+    """
+    Replace the IDs, tokens and emojis in a path (without query) by
+    placeholders.
+
+    `/api/v10/channels/1234/messages/5678` becomes
+    `/api/v10/channels/{id}/messages/{id}`.
+    """
+    route = REACTION.sub("/reactions/{emoji}", path)
+    return TOKEN.sub("/{token}", SNOWFLAKE.sub("/{id}", route))
+
+
+def route_key(method: bytes, path: str) -> tuple[str, str]:
+    """
+    Split a request into its route template and major parameters.
+
+    `GET /api/v10/channels/1234/messages/5678` becomes
+    `("GET /api/v10/channels/{id}/messages/{id}", "1234")`.
+    """
+    path = path.partition("?")[0]
+    match = MAJOR_PARAMETERS.match(path)
+    major = ":".join(filter(None, match.groups())) if match else ""
+    return f"{method.decode('ascii')} {route_template(path)}", major
+
+
+class Bucket:
+    """
+    Tracks one Discord rate-limit bucket.
+
+    Up to `remaining` requests are let through concurrently, the rest wait
+    for the window to reset. Until the first response tells us the limits
+    only a single request is in flight. Waiters are let through by
+    priority.
+    """
+
+    __slots__ = (
+        "key",
+        "limit",
+        "remaining",
+        "reset_at",
+        "window",
+        "inflight",
+        "changed",
+        "waiters",
+    )
+
+    key: str
+    limit: int | None
+    remaining: int
+    reset_at: float
+    window: float
+    inflight: int
+    changed: Any
+    waiters: PriorityWaiters
+
+    def __init__(self: Self, key: str, changed: Any) -> None:
+        self.key = key
+        self.limit = None
+        self.remaining = 1
+        self.reset_at = 0.0
+        self.window = 0.0
+        self.inflight = 0
+        self.changed = changed
+        self.waiters = PriorityWaiters()
+
+    @property
+    def expired(self: Self) -> bool:
+        return self.inflight == 0 and self.reset_at <= monotonic()
+
+    def try_acquire(self: Self) -> float | None:
+        """
+        Reserve a slot, returns `None` on success or else how long to sleep
+        (`0` meaning until another request in this bucket finishes).
+        """
+        if self.limit is None:
+            if self.inflight:
+                return 0.0
+            self.inflight += 1
+            return None
+
+        if self.limit == UNLIMITED:
+            self.inflight += 1
+            return None
+
+        now = monotonic()
+        if self.reset_at <= now:
+            # The window rolled over, assume a fresh one until told otherwise
+            self.remaining = self.limit
+            self.reset_at = now + self.window
+
+        if self.remaining > 0:
+            self.remaining -= 1
+            self.inflight += 1
+            return None
+
+        return max(self.reset_at - now, 0.0)
+
+    def update(self: Self, headers: Headers) -> None:
+        try:
+            limit = int(headers[b"x-ratelimit-limit"])
+            remaining = int(headers[b"x-ratelimit-remaining"])
+            reset_after = float(headers[b"x-ratelimit-reset-after"])
+        except KeyError:
+            if self.limit is None:
+                self.limit = UNLIMITED
+            return
+        except ValueError:
+            return
+
+        reset_at = monotonic() + reset_after
+        if self.limit in (None, UNLIMITED) or reset_at > self.reset_at + WINDOW_SLACK:
+            # First response, or one from a window we did not account for.
+            # Requests reserved locally may not be in the server's count yet.
+            self.remaining = max(remaining - self.inflight, 0)
+        else:
+            # Responses can arrive out of order, trust the lowest count
+            self.remaining = min(self.remaining, remaining)
+        # The server's reset is authoritative, a locally assumed rollover
+        # only moves it later
+        self.reset_at = max(self.reset_at, reset_at)
+        self.window = max(self.window, reset_after)
+        self.limit = limit
+
+    def exhaust(self: Self, retry_after: float) -> None:
+        self.remaining = 0
+        self.reset_at = max(self.reset_at, monotonic() + retry_after)
+
+
+class GlobalLimiter:
+    """
+    The bot-wide rate limit, shared by every bucket and connection.
+
+    At most `rate` requests are let through in any `per` seconds. Send
+    times are reserved ahead, so each waiter sleeps until its own slot
+    instead of all of them racing for the next free one. Background
+    requests never reserve ahead and leave part of every window to the
+    others, so they cannot delay more urgent traffic. A global 429
+    pauses everything until its `Retry-After`, during which a single waiter
+    sleeps and wakes the others through `resumed`.
+    """
+
+    __slots__ = ("per", "slots", "paused_until", "resumed")
+
+    per: float
+    slots: deque[float]
+    paused_until: float
+    resumed: Any
+
+    def __init__(self: Self, rate: int = GLOBAL_RATE, per: float = 1.0) -> None:
+        self.per = per
+        self.slots = deque(maxlen=rate)
+        self.paused_until = 0.0
+        self.resumed = None
+
+    def reserve(self: Self) -> float:
+        """
+        Reserve the next send slot, returns how long to wait for it.
+        """
+        now = monotonic()
+        slots = self.slots
+        at = now
+        if len(slots) == slots.maxlen:
+            # The oldest of the last `rate` slots has to leave the window
+            at = max(now, slots[0] + self.per)
+        slots.append(at)
+        return at - now
+
+    def try_reserve_spare(self: Self) -> float | None:
+        """
+        Take a slot right away if that leaves the headroom of the current
+        window free, returns `None` on success or else how long to wait
+        before trying again.
+        """
+        now = monotonic()
+        slots = self.slots
+        if slots and slots[-1] > now:
+            # Others reserved ahead, wait for that backlog to clear
+            return slots[-1] - now
+
+        start = now - self.per
+        used = sum(1 for at in slots if at > start)
+        if used >= slots.maxlen * (1 - BACKGROUND_HEADROOM):
+            # Slots are kept in order, wait for the oldest in the window
+            return slots[len(slots) - used] - start
+
+        slots.append(now)
+        return None
+
+    def pause(self: Self, retry_after: float) -> None:
+        self.paused_until = max(self.paused_until, monotonic() + retry_after)
+
+    def resume(self: Self) -> None:
+        resumed, self.resumed = self.resumed, None
+        resumed.set()
+
+
+class BaseBucketManager:
+    """
+    Decides when a request may be sent without running into a rate limit.
+
+    `acquire` waits until the request may go out and returns a token, which
+    is handed back to `release` together with the response once it arrived.
+    Both take the `route_key` of the request as `route` if it is known
+    already.
+    """
+
+    async def acquire(
+        self: Self,
+        method: bytes,
+        path: str,
+        priority: int = Priority.NORMAL,
+        *,
+        route: tuple[str, str] | None = None,
+    ) -> Any:
+        raise NotImplementedError()
+
+    def release(
+        self: Self,
+        token: Any,
+        method: bytes,
+        path: str,
+        status: int | None = None,
+        headers: Headers | None = None,
+        *,
+        route: tuple[str, str] | None = None,
+    ) -> None:
+        raise NotImplementedError()
+
+    async def aclose(self: Self) -> None:
+        pass
+
+
+class BaseMemoryBucketManager(BaseBucketManager):
+    """
+    Maps requests onto rate-limit buckets learned from response headers,
+    keeping all state in this process.
+
+    Discord reports the bucket of a route through `X-RateLimit-Bucket`, the
+    route is keyed on that hash plus its major parameters once known and on
+    the route template itself before that.
+    """
+
+    buckets: dict[str, Bucket]
+    routes: dict[str, str]
+    global_limiter: GlobalLimiter
+
+    def __init__(self: Self, global_rate: int = GLOBAL_RATE) -> None:
+        self.buckets = {}
+        self.routes = {}
+        self.global_limiter = GlobalLimiter(global_rate)
+
+    def _create_event(self: Self) -> Any:
+        raise NotImplementedError()
+
+    async def _sleep(self: Self, seconds: float) -> None:
+        raise NotImplementedError()
+
+    def get(
+        self: Self, method: bytes, path: str, route: tuple[str, str] | None = None
+    ) -> Bucket:
+        route, major = route or route_key(method, path)
+        key = f"{self.routes.get(route, route)}:{major}"
+        try:
+            return self.buckets[key]
+        except KeyError:
+            if len(self.buckets) >= PRUNE_THRESHOLD:
+                self._prune()
+            bucket = self.buckets[key] = Bucket(key, self._create_event())
+            return bucket
+
+    async def acquire(
+        self: Self,
+        method: bytes,
+        path: str,
+        priority: int = Priority.NORMAL,
+        *,
+        route: tuple[str, str] | None = None,
+    ) -> Bucket:
+        """
+        Wait until the bucket for this request has room and reserve it,
+        then wait for the global rate limit.
+        """
+        while True:
+            bucket = self.get(method, path, route)
+            if bucket.waiters.outranked(priority):
+                # Leave the slot to the more urgent request
+                delay = 0.0
+            else:
+                delay = bucket.try_acquire()
+                if delay is None:
+                    break
+
+            bucket.waiters.add(priority)
+            try:
+                if delay > 0:
+                    await self._sleep(delay)
+                else:
+                    await bucket.changed.wait()
+            finally:
+                if bucket.waiters.remove(priority):
+                    self._notify_changed(bucket)
+
+        if GLOBAL_EXEMPT.match(path) is None:
+            try:
+                await self._acquire_global(priority)
+            except BaseException:
+                bucket.inflight -= 1
+                self._notify_changed(bucket)
+                raise
+        return bucket
+
+    async def _acquire_global(self: Self, priority: int) -> None:
+        limiter = self.global_limiter
+        while True:
+            delay = limiter.paused_until - monotonic()
+            if delay > 0:
+                await self._wait_global_pause(limiter, delay)
+                continue
+
+            if priority == Priority.BACKGROUND:
+                delay = limiter.try_reserve_spare()
+                if delay is not None:
+                    await self._sleep(delay)
+                    continue
+                return
+
+            delay = limiter.reserve()
+            if delay > 0:
+                await self._sleep(delay)
+            # A slot reserved before a global 429 is given up, otherwise
+            # everything queued behind the pause would go out at once
+            if limiter.paused_until <= monotonic():
+                return
+
+    async def _wait_global_pause(
+        self: Self, limiter: GlobalLimiter, delay: float
+    ) -> None:
+        if limiter.resumed is not None:
+            await limiter.resumed.wait()
+            return
+
+        # The first request to notice the pause sleeps through it, the rest
+        # wait on its event
+        limiter.resumed = self._create_event()
+        try:
+            await self._sleep(delay)
+        finally:
+            limiter.resume()
+
+    def release(
+        self: Self,
+        bucket: Bucket,
+        method: bytes,
+        path: str,
+        status: int | None = None,
+        headers: Headers | None = None,
+        *,
+        route: tuple[str, str] | None = None,
+    ) -> None:
+        """
+        Give back the slot taken by `acquire`, learning from the response.
+        """
+        bucket.inflight -= 1
+        if headers is not None:
+            route = route or route_key(method, path)
+            bucket_hash = headers.get(b"x-ratelimit-bucket")
+            if bucket_hash is not None:
+                name, major = route
+                bucket_hash = self.routes[name] = bucket_hash.decode("ascii")
+                # Carry what was learned so far over to the shared bucket
+                self.buckets.setdefault(f"{bucket_hash}:{major}", bucket)
+
+            # The route may have been mapped onto a shared bucket while this
+            # request was in flight, the headers are about that one
+            current = self.get(method, path, route)
+            current.update(headers)
+
+            if status == 429:
+                try:
+                    retry_after = float(headers[b"retry-after"])
+                except (KeyError, ValueError):
+                    retry_after = None
+
+                if retry_after is None:
+                    pass
+                elif (
+                    headers.get(b"x-ratelimit-global") is not None
+                    or headers.get(b"x-ratelimit-scope") == b"global"
+                ):
+                    self.global_limiter.pause(retry_after)
+                else:
+                    current.exhaust(retry_after)
+
+            if current is not bucket:
+                self._notify_changed(current)
+        self._notify_changed(bucket)
+
+    def _notify_changed(self: Self, bucket: Bucket) -> None:
+        event, bucket.changed = bucket.changed, self._create_event()
+        event.set()
+
+    def _prune(self: Self) -> None:
+        for key in [key for key, bucket in self.buckets.items() if bucket.expired]:
+            del self.buckets[key]
@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+from time import monotonic
+from typing import TYPE_CHECKING, Any, Awaitable, Callable
+
+from h2.errors import ErrorCodes
+
+from ..utils import exponential_backoff
+from .exceptions import ConnectionLost, StreamRefused, StreamReset
+
+if TYPE_CHECKING:
+    from typing_extensions import Self
+
+    from .types import Request, Response
+
+
+IDEMPOTENT_METHODS = frozenset({b"GET", b"HEAD", b"OPTIONS", b"PUT", b"DELETE"})
+RETRY_STATUSES = frozenset({500, 502, 503, 504})
+
+
+class RetryPolicy:
+    """
+    Decides whether and when a failed request is sent again.
+
+    Requests the server provably never processed (`StreamRefused`,
+    RST_STREAM with `REFUSED_STREAM`, `429 Too Many Requests`) are retried
+    for every method. Server errors and lost connections are only retried
+    for idempotent methods, since the server may already have acted on them.
+    A request is never sent again once (part of) a body that can only be
+    read once went out.
+
+    `StreamRefused` does not count against `max_retries`, a request is
+    given up on once it was refused `max_refusals` times instead.
+    """
+
+    __slots__ = (
+        "max_retries",
+        "max_refusals",
+        "base",
+        "cap",
+        "deadline",
+        "retry_statuses",
+    )
+
+    max_retries: int
+    max_refusals: int
+    base: float
+    cap: float
+    deadline: float
+    retry_statuses: frozenset[int]
+
+    def __init__(
+        self: Self,
+        max_retries: int = 3,
+        base: float = 0.5,
+        cap: float = 10.0,
+        deadline: float = 60.0,
+        retry_statuses: frozenset[int] = RETRY_STATUSES,
+        max_refusals: int = 5,
+    ) -> None:
+        self.max_retries = max_retries
+        self.max_refusals = max_refusals
+        self.base = base
+        self.cap = cap
+        self.deadline = deadline
+        self.retry_statuses = retry_statuses
+
+    def get_delay(
+        self: Self,
+        request: Request,
+        attempt: int,
+        elapsed: float,
+        response: Response | None = None,
+        error: Exception | None = None,
+    ) -> float | None:
+        """
+        Seconds to wait before the next attempt, `None` to give up.
+        """
+        if not request.replayable:
+            # Another attempt could only send what is left of the body
+            return None
+
+        if isinstance(error, StreamRefused):
+            # Nothing reached the server, so this does not count as a retry.
+            # The first one is resent right away since the pool picks
+            # another connection for it.
+            if attempt >= self.max_refusals:
+                return None
+            delay = self._backoff(attempt - 1) if attempt else 0.0
+            return delay if elapsed + delay <= self.deadline else None
+
+        if attempt >= self.max_retries:
+            return None
+
+        idempotent = request.method in IDEMPOTENT_METHODS
+        if error is not None:
+            if isinstance(error, StreamReset):
+                if error.error_code != ErrorCodes.REFUSED_STREAM:
+                    return None
+                delay = self._backoff(attempt)
+            elif isinstance(error, ConnectionLost) and idempotent:
+                delay = self._backoff(attempt)
+            else:
+                return None
+
+        elif response.status == 429:
+            delay = max(self._retry_after(response), self._backoff(attempt))
+
+        elif response.status in self.retry_statuses and idempotent:
+            delay = self._backoff(attempt)
+
+        else:
+            return None
+
+        if elapsed + delay > self.deadline:
+            return None
+        return delay
+
+    def _backoff(self: Self, attempt: int) -> float:
+        return exponential_backoff(attempt, self.base, self.cap)
+
+    @staticmethod
+    def _retry_after(response: Response) -> float:
+        try:
+            return float(response.headers[b"retry-after"])
+        except (KeyError, ValueError):
+            return 0.0
+
+    async def call(
+        self: Self,
+        request: Request,
+        send: Callable[[Request], Awaitable[Response]],
+        sleep: Callable[[float], Awaitable[Any]],
+    ) -> Response:
+        """
+        Run `send` until it succeeds or the policy gives up.
+
+        The last error is re-raised, an unsuccessful final response is raised
+        as the matching `HTTPException`.
+        """
+        start = monotonic()
+        attempt = 0
+        refused = 0
+        while True:
+            try:
+                response = await send(request)
+            except StreamRefused as exc:
+                delay = self.get_delay(request, refused, monotonic() - start, error=exc)
+                if delay is None:
+                    raise
+                refused += 1
+                if delay:
+                    await sleep(delay)
+                continue
+            except (StreamReset, ConnectionLost) as exc:
+                delay = self.get_delay(request, attempt, monotonic() - start, error=exc)
+                if delay is None:
+                    raise
+            else:
+                if response.status < 400:
+                    return response
+
+                delay = self.get_delay(
+                    request, attempt, monotonic() - start, response=response
+                )
+                if delay is None:
+                    response.raise_for_status()
+                    return response
+
+            attempt += 1
+            if delay:
+                await sleep(delay)
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any, Awaitable, Callable
+
+from .types import create_headers
+
+if TYPE_CHECKING:
+    from typing_extensions import Self
+
+    from .types import Request, Response
+
+
+# Only requests without side effects and without a body are shared
+COALESCED_METHODS = frozenset({b"GET", b"HEAD"})
+# The answer to these depends on what the caller already has, a `304` is no
+# use to anyone else
+CONDITIONAL_HEADERS = frozenset({b"if-none-match", b"if-modified-since"})
+
+
+def flight_key(request: Request) -> tuple[bytes, str, bytes | None] | None:
+    """
+    What makes two requests identical, `None` if `request` must not be
+    shared.
+    """
+    if request.method not in COALESCED_METHODS or not request.end_stream:
+        return None
+
+    authorization = None
+    for name, value in create_headers(request.headers):
+        if name == b"authorization":
+            authorization = value
+        elif name in CONDITIONAL_HEADERS:
+            return None
+    return request.method, request.path, authorization
+
+
+class Flight:
+    """
+    A request other callers are waiting on.
+    """
+
+    __slots__ = ("done", "response", "error")
+
+    done: Any
+    response: Response | None
+    error: BaseException | None
+
+    def __init__(self: Self, done: Any) -> None:
+        self.done = done
+        self.response = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Lets concurrent identical requests share a single round trip.
+
+    The first caller sends the request, everyone asking for the same thing
+    while it is in flight gets the same `Response` (or exception) instead
+    of sending their own. Nothing is kept once the request completed, so
+    results are never stale. The shared `Response` must not be mutated.
+    """
+
+    flights: dict[tuple[bytes, str, bytes | None], Flight]
+    create_event: Callable[[], Any]
+
+    def __init__(self: Self, create_event: Callable[[], Any]) -> None:
+        self.flights = {}
+        self.create_event = create_event
+
+    async def call(
+        self: Self,
+        request: Request,
+        send: Callable[[Request], Awaitable[Response]],
+    ) -> Response:
+        key = flight_key(request)
+        if key is None:
+            return await send(request)
+
+        while True:
+            flight = self.flights.get(key)
+            if flight is None:
+                break
+
+            await flight.done.wait()
+            if flight.response is not None:
+                return flight.response
+            if flight.error is not None:
+                raise flight.error
+            # The caller that sent it was cancelled, take over
+
+        flight = self.flights[key] = Flight(self.create_event())
+        try:
+            flight.response = await send(request)
+            return flight.response
+        except Exception as exc:
+            flight.error = exc
+            raise
+        finally:
+            self._land(key, flight)
+
+    def _land(self: Self, key: tuple[bytes, str, bytes | None], flight: Flight) -> None:
+        del self.flights[key]
+        flight.done.set()
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+from ssl import PROTOCOL_TLS_CLIENT, SSLContext
+from typing import TYPE_CHECKING
+
+from certifi import where
+
+if TYPE_CHECKING:
+    from socket import socket
+    from ssl import MemoryBIO, SSLObject, SSLSession, SSLSocket
+
+    from typing_extensions import Self
+
+
+class ResumingSSLContext(SSLContext):
+    """
+    Client `SSLContext` offering the last saved TLS session to every new
+    connection.
+
+    A resumed handshake saves a round trip and the certificate chain
+    verification, which is what makes reconnect storms expensive. Sessions
+    are not keyed by host, so a context should only be used for a single
+    server.
+    """
+
+    session: SSLSession | None = None
+
+    def save_session(self: Self, session: SSLSession | None) -> None:
+        if session is not None:
+            self.session = session
+
+    def wrap_socket(
+        self: Self,
+        sock: socket,
+        server_side: bool = False,
+        do_handshake_on_connect: bool = True,
+        suppress_ragged_eofs: bool = True,
+        server_hostname: str | None = None,
+        session: SSLSession | None = None,
+    ) -> SSLSocket:
+        return SSLContext.wrap_socket(
+            self,
+            sock,
+            server_side=server_side,
+            do_handshake_on_connect=do_handshake_on_connect,
+            suppress_ragged_eofs=suppress_ragged_eofs,
+            server_hostname=server_hostname,
+            session=session or self.session,
+        )
+
+    def wrap_bio(
+        self: Self,
+        incoming: MemoryBIO,
+        outgoing: MemoryBIO,
+        server_side: bool = False,
+        server_hostname: str | None = None,
+        session: SSLSession | None = None,
+    ) -> SSLObject:
+        return SSLContext.wrap_bio(
+            self,
+            incoming,
+            outgoing,
+            server_side=server_side,
+            server_hostname=server_hostname,
+            session=session or self.session,
+        )
+
+
+def create_ssl_context() -> ResumingSSLContext:
+    # Loading the CA bundle is the expensive part, build this once and reuse
+    # it for every connection to the same server
+    context = ResumingSSLContext(PROTOCOL_TLS_CLIENT)
+    context.load_verify_locations(cafile=where())
+    context.set_alpn_protocols(["h2"])
+    return context
@@ -1,19 +1,59 @@
 from __future__ import annotations
-from binascii import hexlify
 
+from binascii import hexlify
 from enum import IntEnum
+from functools import cached_property, partial
+from inspect import iscoroutinefunction
 from mimetypes import guess_type
-from os import SEEK_END, fstat, urandom
-from typing import TYPE_CHECKING, Any, AsyncIterable, AsyncIterable, AsyncIterator
-from urllib.parse import urlencode, urlparse, urlunparse
-from ..utils import dumps
+from mmap import ACCESS_READ, mmap
+from os import SEEK_END, PathLike, fstat, stat, urandom
+from stat import S_ISREG
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Callable,
+    Iterable,
+    Iterator,
+    Mapping,
+)
+from urllib.parse import urlparse
+
+from hpack import NeverIndexedHeaderTuple
+
+from ..utils import MISSING, dumps, loads
+from .exceptions import Forbidden, HTTPException, NotFound, ServerError
+from .priority import Priority
+from .ratelimit import GLOBAL_EXEMPT, route_key
 
 if TYPE_CHECKING:
+    from types import TracebackType
     from urllib.parse import ParseResult
+
     from typing_extensions import Self
 
 
 CHUNK_SIZE = 64 * 1024
+# Spare `CHUNK_SIZE` buffers of `read_file`, files that cannot be mapped are
+# read into one of them instead of a new `bytes` per chunk
+READ_BUFFERS: list[bytearray] = []
+MAX_READ_BUFFERS = 8
+# Kept out of the HPACK dynamic table, their values change from request to
+# request and would only evict the headers that repeat
+VOLATILE_HEADERS = frozenset(
+    {b":path", b"content-length", b"if-none-match", b"x-audit-log-reason"}
+)
+# Not allowed in HTTP/2 (RFC 9113 section 8.2.2), `te` only as `trailers`
+CONNECTION_HEADERS = frozenset(
+    {
+        b"connection",
+        b"keep-alive",
+        b"proxy-connection",
+        b"transfer-encoding",
+        b"upgrade",
+    }
+)
 
 
 def to_bytes(value: str | bytes) -> bytes:
@@ -25,24 +65,160 @@ def create_headers(
 ) -> list[tuple[bytes, bytes]]:
     headrs = []
     for key, value in headers.items():
-        key, value = to_bytes(key), to_bytes(value)
-        headrs.append((key.lower(), value))
+        key, value = to_bytes(key).lower(), to_bytes(value)
+        # Checked here, h2 only notices once it already updated its HPACK
+        # table for the headers before, which breaks the whole connection
+        if not key or key.startswith(b":"):
+            raise ValueError(f"Invalid header name: {key!r}")
+        if key in CONNECTION_HEADERS or (key == b"te" and value != b"trailers"):
+            raise ValueError(f"Connection-specific header: {key!r}")
+        if key in VOLATILE_HEADERS:
+            headrs.append(NeverIndexedHeaderTuple(key, value))
+        else:
+            headrs.append((key, value))
     return headrs
 
 
-def get_file_length(file: Any) -> int:
+def freeze_headers(
+    headers: Mapping[str | bytes, str | bytes]
+    | Iterable[tuple[str | bytes, str | bytes]]
+) -> tuple[tuple[bytes, bytes], ...]:
+    """
+    Encode headers sent with every request once, instead of per request.
+    """
+    return tuple(create_headers(dict(headers)))
+
+
+# Left as is by form encoding (like `urllib.parse.quote_plus`), a space
+# becomes `+` and every other byte is percent-encoded
+FORM_SAFE = b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789_.-~"
+FORM_QUOTED = tuple(
+    bytes((byte,)) if byte in FORM_SAFE else b"+" if byte == 0x20 else b"%%%02X" % byte
+    for byte in range(256)
+)
+# Values of these types give one pair per item
+FORM_SEQUENCES = frozenset({list, tuple, set, frozenset})
+
+
+def quote_form(value: bytes) -> bytes:
+    if not value.translate(None, FORM_SAFE):
+        # Nothing to quote, the common case for IDs and numbers
+        return value
+    return b"".join([FORM_QUOTED[byte] for byte in value])
+
+
+def _form_str(value: str) -> bytes:
+    return quote_form(value.encode("utf-8"))
+
+
+def _form_int(value: int) -> bytes:
+    return b"%d" % value
+
+
+def _form_bool(value: bool) -> bytes:
+    return b"true" if value else b"false"
+
+
+def _form_none(value: None) -> bytes:
+    return b""
+
+
+# Looked up by exact type, anything else goes through `str`
+FORM_COERCIONS: dict[type, Callable[[Any], bytes]] = {
+    str: _form_str,
+    int: _form_int,
+    bool: _form_bool,
+    type(None): _form_none,
+    bytes: quote_form,
+}
+
+
+def form_value(value: Any) -> bytes:
+    coerce = FORM_COERCIONS.get(type(value))
+    if coerce is None:
+        return _form_str(str(value))
+    return coerce(value)
+
+
+def encode_form(data: Mapping[Any, Any] | Iterable[tuple[Any, Any]]) -> bytes:
+    """
+    Encode `data` as `application/x-www-form-urlencoded`, which is the
+    format of query strings as well.
+
+    Sequences give one pair per item and `MISSING` values are left out.
+    `True`, `False` and `None` become `true`, `false` and an empty value.
+    """
+    pairs = []
+    # `dict` is checked first, `isinstance` against an ABC is slow
+    mapping = isinstance(data, dict) or isinstance(data, Mapping)
+    for key, value in data.items() if mapping else data:
+        if value is MISSING:
+            continue
+        key = form_value(key) + b"="
+        if type(value) in FORM_SEQUENCES:
+            pairs.extend([key + form_value(item) for item in value])
+        else:
+            pairs.append(key + form_value(value))
+    return b"&".join(pairs)
+
+
+def get_file_length(file: Any) -> int | None:
+    """
+    Bytes left in a file object from its current position, `None` if that
+    cannot be told (pipes, sockets, ...).
+    """
     try:
-        filedescriptor = file.fileno()
-        length = fstat(filedescriptor).st_size
+        position = file.tell()
     except (AttributeError, OSError):
-        try:
-            pos = file.tell()
-            length = file.seek(0, SEEK_END)
-            file.seek(pos)
-        except (AttributeError, OSError):
-            length = 0
+        return None
+
+    try:
+        stat = fstat(file.fileno())
+        if S_ISREG(stat.st_mode):
+            return stat.st_size - position
+    except (AttributeError, OSError):
+        pass
 
-    return length
+    try:
+        length = file.seek(0, SEEK_END)
+        file.seek(position)
+    except (AttributeError, OSError):
+        return None
+    return length - position
+
+
+def get_async_file_length(file: Any) -> int | None:
+    """
+    Size of an async file object, `None` if it is not a regular file.
+    """
+    # aiofiles exposes `fileno` directly, anyio's `AsyncFile` the file it
+    # wraps
+    file = getattr(file, "wrapped", file)
+    try:
+        stat = fstat(file.fileno())
+    except (AttributeError, OSError):
+        return None
+    return stat.st_size if S_ISREG(stat.st_mode) else None
+
+
+def map_file(file: Any) -> mmap | None:
+    """
+    Map a file read-only, `None` if it is not a regular (non-empty) file.
+    """
+    try:
+        return mmap(file.fileno(), 0, access=ACCESS_READ)
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+def quote_header_value(value: str | bytes) -> bytes:
+    # Escaped like browsers do, a quote or line break would end the header
+    return (
+        to_bytes(value)
+        .replace(b"\r", b"%0D")
+        .replace(b"\n", b"%0A")
+        .replace(b'"', b"%22")
+    )
 
 
 class Stream:
@@ -53,99 +229,238 @@ class Stream:
         yield self.data
 
 
+def content_source(
+    content: Any,
+) -> tuple[memoryview | Callable[[], AsyncIterator[bytes]], int | None]:
+    """
+    How to send `content` as (part of) a request body and its length if
+    known. In-memory content is returned as a view, everything else as a
+    function starting a fresh read, so a retried request sends it again
+    where `is_replayable` allows.
+    """
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    if isinstance(content, (bytes, bytearray, memoryview)):
+        view = memoryview(content).cast("B")
+        return view, len(view)
+
+    if isinstance(content, PathLike):
+        return partial(read_path, content), stat(content).st_size
+
+    read = getattr(content, "read", None)
+    if read is not None and iscoroutinefunction(read):
+        return partial(read_async_file, content), get_async_file_length(content)
+    if isinstance(content, AsyncIterable):
+        return partial(read_iterable, content), None
+    if read is not None:
+        length = get_file_length(content)
+        try:
+            start = content.tell()
+        except (AttributeError, OSError):
+            start = None
+        return partial(read_file, content, start, length), length
+
+    raise TypeError(f"Cannot send {type(content).__name__} as a request body")
+
+
+def is_replayable(content: Any) -> bool:
+    """
+    Whether `content_source` reads all of `content` every time, iterators
+    and files that cannot be rewound give their content only once.
+    """
+    if isinstance(content, (str, bytes, bytearray, memoryview, PathLike)):
+        return True
+
+    read = getattr(content, "read", None)
+    if read is not None and iscoroutinefunction(read):
+        return hasattr(content, "seek")
+    if isinstance(content, AsyncIterable):
+        # Iterated afresh for every read, unless it is an iterator itself
+        return not isinstance(content, AsyncIterator)
+    if read is not None:
+        try:
+            content.tell()
+        except (AttributeError, OSError):
+            return False
+    return True
+
+
+async def read_path(path: PathLike) -> AsyncIterator[bytes]:
+    with open(path, "rb") as file:
+        async for chunk in read_file(file, 0, None):
+            yield chunk
+
+
+async def read_file(
+    file: Any, start: int | None, length: int | None
+) -> AsyncIterator[bytes]:
+    """
+    Contents of `file` from `start`, as one view if it can be mapped and in
+    `CHUNK_SIZE` chunks otherwise.
+
+    Binary files are read into a buffer that is reused for every chunk and
+    then by later reads, a chunk is only valid until the next one is asked
+    for.
+    """
+    # Positioned again, a retried request sends the same content
+    if start is not None:
+        file.seek(start)
+
+    mapped = map_file(file)
+    if mapped is not None:
+        end = len(mapped) if length is None else start + length
+        try:
+            yield memoryview(mapped)[start or 0 : end]
+        finally:
+            try:
+                mapped.close()
+            except BufferError:
+                # The sender still holds the view, the mapping goes
+                # away with it
+                pass
+        return
+
+    readinto = getattr(file, "readinto", None)
+    if readinto is None:
+        # Text files
+        chunk = file.read(CHUNK_SIZE)
+        while chunk:
+            yield to_bytes(chunk)
+            chunk = file.read(CHUNK_SIZE)
+        return
+
+    buffer = READ_BUFFERS.pop() if READ_BUFFERS else bytearray(CHUNK_SIZE)
+    try:
+        view = memoryview(buffer)
+        read = readinto(buffer)
+        while read:
+            yield view[:read]
+            read = readinto(buffer)
+    finally:
+        if len(READ_BUFFERS) < MAX_READ_BUFFERS:
+            READ_BUFFERS.append(buffer)
+
+
+async def read_async_file(file: Any) -> AsyncIterator[bytes]:
+    if hasattr(file, "seek"):
+        await file.seek(0)
+
+    chunk = await file.read(CHUNK_SIZE)
+    while chunk:
+        yield to_bytes(chunk)
+        chunk = await file.read(CHUNK_SIZE)
+
+
+async def read_iterable(iterable: AsyncIterable) -> AsyncIterator[bytes]:
+    async for chunk in iterable:
+        yield to_bytes(chunk)
+
+
 class MultiPartStream:
+    """
+    A `multipart/form-data` body, streamed part by part.
+
+    Field values and file contents can be `str`, `bytes`, a path, a file or
+    async file object or any async iterable of bytes. Only the framing
+    around the contents is rendered upfront, which gives the exact
+    `Content-Length` unless a part's size cannot be told in advance.
+
+    Files on disk are memory-mapped and handed out as a single view, the
+    connection cuts it into frames as the flow-control window allows, so
+    their contents go from the page cache to the socket without being
+    buffered. Other files and iterables are read `CHUNK_SIZE` bytes at a
+    time, binary files into buffers reused from one chunk and one request
+    to the next. A part that `is_replayable` rejects can only be sent once.
+    """
+
+    boundary: bytes
+    encode_headers: dict[str | bytes, dict[str | bytes, str | bytes]]
+    parts: list[tuple[bytes, memoryview | Callable[[], AsyncIterator[bytes]]]]
+    length: int | None
+
     def __init__(
         self,
         data: dict[str | bytes, str | bytes],
-        files: dict[str, tuple[str | bytes, bytes | AsyncIterable]],
-        headers: dict[str, str] | None = None,
+        files: dict[str | bytes, tuple[str | bytes | None, Any]],
+        headers: dict[str | bytes, dict[str | bytes, str | bytes]] | None = None,
     ):
-        self.data = data
-        self.files = files
-        self.encode_headers = headers or {}
         self.boundary = hexlify(urandom(16))
+        self.encode_headers = headers or {}
+        self.parts = []
+        self.length = 0
 
-        self.length, self.rendered_headers = self.render_headers()
+        for name, value in data.items():
+            self._add_part(name, None, value, is_file=False)
+        for name, (filename, content) in files.items():
+            self._add_part(name, filename, content, is_file=True)
+
+        self.closing = b"--" + self.boundary + b"--\r\n"
+        if self.length is not None:
+            self.length += len(self.closing)
 
     @property
-    def headers(self) -> dict[str, str]:
-        return {
-            "Content-Type": f"multipart/form-data; boundary={self.boundary.decode('utf-8')}",
-            "Content-Length": str(self.length),
+    def headers(self) -> dict[bytes, bytes]:
+        headers = {
+            b"content-type": b"multipart/form-data; boundary=" + self.boundary,
         }
+        if self.length is not None:
+            headers[b"content-length"] = str(self.length).encode("utf-8")
+        return headers
 
-    def render_headers(self) -> tuple[int, dict[str | bytes, str | bytes]]:
-        headers = {}
-        length = 0
-        boundary_len = len(self.boundary) + 4
-        for key, value in self.data.items():
-            length += len(value) + 2 + boundary_len
-            headers[key] = b""
-            headers[key] += (
-                b'Content-Disposition: form-data; name="' + to_bytes(key) + b'"\r\n'
-            )
-            extra_headers = self.encode_headers.get(key, {})
-            for extra_key, extra_value in extra_headers.items():
-                headers[key] += (
-                    to_bytes(extra_key) + b": " + to_bytes(extra_value) + b"\r\n"
-                )
-
-        for name, (filename, content) in self.files.items():
-            if isinstance(content, AsyncIterable):
-                length += get_file_length(content) + 2 + boundary_len
+    def _add_part(
+        self,
+        name: str | bytes,
+        filename: str | bytes | None,
+        content: Any,
+        is_file: bool,
+    ) -> None:
+        head = (
+            b"--"
+            + self.boundary
+            + b'\r\nContent-Disposition: form-data; name="'
+            + quote_header_value(name)
+            + b'"'
+        )
+        if filename:
+            head += b'; filename="' + quote_header_value(filename) + b'"'
+        head += b"\r\n"
+        if is_file:
+            if isinstance(filename, bytes):
+                filename = filename.decode("utf-8")
+            content_type = guess_type(filename or "")[0] or "application/octet-stream"
+            head += b"Content-Type: " + content_type.encode("utf-8") + b"\r\n"
+        for key, value in self.encode_headers.get(name, {}).items():
+            head += to_bytes(key) + b": " + to_bytes(value) + b"\r\n"
+        head += b"\r\n"
+
+        body, length = content_source(content)
+        self.parts.append((head, body))
+        if self.length is not None:
+            if length is None:
+                self.length = None
             else:
-                length += len(content) + 2 + boundary_len
-
-            headers[name] = b""
-            headers[name] += (
-                b'Content-Disposition: form-data; name="' + to_bytes(name) + b'"'
-            )
-            if filename:
-                headers[name] += b'; filename="' + to_bytes(filename) + b'"'
-            headers[name] += b"\r\n"
-            headers[name] += (
-                b"Content-Type: "
-                + to_bytes(guess_type(filename)[0] or "application/octet-stream")
-                + b"\r\n"
-            )
-            extra_headers = self.encode_headers.get(key, {})
-            for extra_key, extra_value in extra_headers.items():
-                headers[name] += (
-                    to_bytes(extra_key) + b": " + to_bytes(extra_value) + b"\r\n"
-                )
-
-        length += len(b"\r\n".join(headers.values())) + boundary_len + 4
-
-        return length, headers
+                self.length += len(head) + length + 2
 
     async def __aiter__(self) -> AsyncIterator[bytes]:
-        data = self.data
-        files = self.files
-        boundary = self.boundary
-
-        for key, value in data.items():
-            yield b"--" + boundary + b"\r\n" + (
-                # Headers
-                self.rendered_headers[key]
-                + b"\r\n"
-                # Body
-                + to_bytes(value)
-            ) + b"\r\n"
-
-        for name, (_, content) in files.items():
-            yield b"--" + boundary + b"\r\n" + self.rendered_headers[name] + b"\r\n"
-            if isinstance(content, AsyncIterable):
-                if hasattr(content, "seek"):
-                    await content.seek(0)
-
-                chunk = await content.read(CHUNK_SIZE)
-                while chunk:
-                    yield to_bytes(chunk)
-                    chunk = await content.read(CHUNK_SIZE)
+        # Framing and small parts are coalesced, so the sender is not woken
+        # up for a few bytes at a time
+        pending = bytearray()
+        for head, body in self.parts:
+            pending += head
+            if isinstance(body, memoryview) and len(body) <= CHUNK_SIZE:
+                pending += body
+            else:
+                yield bytes(pending)
+                pending.clear()
+                if isinstance(body, memoryview):
+                    yield body
                 else:
-                    yield b"\r\n"
+                    async for chunk in body():
+                        yield chunk
+            pending += b"\r\n"
 
-        yield b"--" + boundary + b"--\r\n"
+        pending += self.closing
+        yield bytes(pending)
 
 
 class ContentType(IntEnum):
@@ -158,18 +473,28 @@ class ContentType(IntEnum):
 
 
 class Encoder:
-    __slots__ = {"type", "data", "files", "multipart_headers", "_end_stream", "_data"}
+    __slots__ = {
+        "type",
+        "data",
+        "files",
+        "multipart_headers",
+        "_end_stream",
+        "_data",
+        "_source",
+        "_read_once",
+        "_consumed",
+    }
 
     type: ContentType
     data: str | bytes | dict | None
-    files: dict[str, tuple[str, str | bytes | AsyncIterable, str]]
+    files: dict[str | bytes, tuple[str | bytes | None, Any]]
     multipart_headers: dict[str | bytes, str | bytes]
 
     def __init__(
         self: Self,
         content_type: ContentType,
         data: str | bytes | dict | Any | None,
-        files: dict[str | bytes, tuple[str | bytes, bytes | AsyncIterable]] = None,
+        files: dict[str | bytes, tuple[str | bytes | None, Any]] = None,
         multipart_headers: dict[str, str] = None,
     ) -> None:
         self.type = content_type
@@ -177,31 +502,78 @@ class Encoder:
         self.files = files or {}
         self.multipart_headers = multipart_headers or {}
         self._end_stream = True if content_type == ContentType.NONE else False
+        self._data = None
+        # Resolved once, a file is read from where the caller left it on
+        # every attempt rather than from wherever the last one stopped
+        self._source = (
+            content_source(data) if content_type == ContentType.CONTENT else None
+        )
+        self._read_once = not all(map(is_replayable, self._sources()))
+        self._consumed = False
 
     @property
     def end_stream(self: Self) -> bool:
         return self._end_stream
 
+    @property
+    def replayable(self: Self) -> bool:
+        """
+        Whether the body can still be sent in full, `False` once sending
+        started on one that can only be read once.
+        """
+        return not self._consumed
+
+    def _sources(self: Self) -> list[Any]:
+        if self.type == ContentType.CONTENT:
+            return [self.data]
+        if self.type == ContentType.MULTIPART:
+            return [
+                *(self.data or {}).values(),
+                *(content for _, content in self.files.values()),
+            ]
+        return []
+
     async def encode(self: Self) -> tuple[dict[bytes, bytes], AsyncIterable[bytes]]:
+        if self._consumed:
+            raise RuntimeError("The request body can only be sent once")
+        if self._read_once:
+            headers, body = await self._encode()
+            return headers, self._consume(body)
+        return await self._encode()
+
+    async def _consume(self: Self, body: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+        # Only flagged once sending starts, a request refused before that
+        # can still be retried
+        self._consumed = True
+        async for chunk in body:
+            yield chunk
+
+    async def _encode(self: Self) -> tuple[dict[bytes, bytes], AsyncIterable[bytes]]:
         # already encoded, no need to go through the process again
-        if hasattr(self, "_data"):
+        if self._data is not None:
             return self._data
 
         # Ugly if/else tree
         if self.type == ContentType.NONE:
             return self.encode_none()  # type: ignore
         elif self.type == ContentType.CONTENT:
+            # Files and iterables have to be read again for every attempt,
+            # if they can be
             return await self.encode_content()
         elif self.type == ContentType.TEXT:
-            return self.encode_text()
+            self._data = self.encode_text()
         elif self.type == ContentType.JSON:
-            return self.encode_json()
+            self._data = self.encode_json()
         elif self.type == ContentType.MULTIPART:
-            return await self.encode_multipart()
+            # Its parts are read again on every iteration
+            self._data = await self.encode_multipart()
         elif self.type == ContentType.URL_ENCODED:
-            return self.encode_urlencoded()
+            self._data = self.encode_urlencoded()
+        else:
+            raise ValueError(f"Unknown content type: {self.type}")
 
-        raise ValueError(f"Unknown content type: {self.type}")
+        # Retries send the same body without serializing it again
+        return self._data
 
     def encode_none(self: Self) -> tuple[dict[bytes, bytes], None]:
         return {}, None
@@ -209,26 +581,13 @@ class Encoder:
     async def encode_content(
         self: Self,
     ) -> tuple[dict[bytes, bytes], AsyncIterable[bytes]]:
-        content = self.data
-
-        if isinstance(content, (bytes, str)):
-            body = to_bytes(content)
-            length = str(len(body)).encode("utf-8")
-            headers = {b"content-length": length} if body else {}
+        # Files and iterables are passed through to the connection chunk by
+        # chunk, `Content-Length` is only sent when known upfront
+        body, length = self._source
+        headers = {b"content-length": str(length).encode("utf-8")} if length else {}
+        if isinstance(body, memoryview):
             return headers, Stream(body)
-
-        # file or file-like object
-        elif isinstance(content, AsyncIterable):
-            body = b""
-            async for chunk in content:
-                try:
-                    body += chunk
-                except TypeError:
-                    # Raised when not using `rb` mode for opening the file
-                    # or the iterator did not return `bytes`
-                    body += chunk.encode("utf-8")
-
-            return {b"transfer-encoding": b"chunked"}, Stream(body)
+        return headers, body()
 
     def encode_text(self: Self) -> tuple[dict[bytes, bytes], AsyncIterable[bytes]]:
         text = self.data
@@ -240,8 +599,13 @@ class Encoder:
             Stream(to_bytes(text)),
         )
 
-    def encode_json(self: Self) -> tuple[dict[bytes, bytes], bytes]:
-        body = dumps(self.data)
+    def encode_json(self: Self) -> tuple[dict[bytes, bytes], AsyncIterable[bytes]]:
+        data = self.data
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            # Serialized by the caller already, sent as is
+            body = memoryview(data).cast("B")
+        else:
+            body = dumps(data)
         return (
             {
                 b"content-type": b"application/json",
@@ -254,7 +618,7 @@ class Encoder:
         self: Self,
     ) -> tuple[dict[bytes, bytes], AsyncIterable[bytes]]:
         stream = MultiPartStream(
-            self.data,
+            self.data or {},
             self.files,
             self.multipart_headers,
         )
@@ -263,30 +627,7 @@ class Encoder:
     def encode_urlencoded(
         self: Self,
     ) -> tuple[dict[bytes, bytes], AsyncIterable[bytes]]:
-        data = []
-        for key, value in data.items():
-            if isinstance(value, (list, tuple, set)):
-                for item in value:
-                    if item is True:
-                        item = "true"
-                    elif item is False:
-                        item = "false"
-                    elif item is None:
-                        item = ""
-                    else:
-                        item = str(item)
-                    data.append((key, item))
-            else:
-                if value is True:
-                    value = "true"
-                elif value is False:
-                    value = "false"
-                elif value is None:
-                    value = ""
-                value = str(value)
-                data.append((key, value))
-
-        body = urlencode(data, doseq=True).encode("utf-8")
+        body = encode_form(self.data or {})
         return (
             {
                 b"content-type": b"application/x-www-form-urlencoded",
@@ -296,12 +637,54 @@ class Encoder:
         )
 
 
+class Timeout:
+    """
+    Time limits for a request, in seconds. `None` disables a limit.
+
+    `connect` bounds opening a connection and, per request, waiting for a
+    free stream on it. `read` bounds every wait for the next part of the
+    response, including the chunks of a streamed body. `total` bounds a
+    whole attempt from waiting for a stream until the response headers (or
+    complete body, unless streamed) arrived. Rate-limit waits do not count
+    towards any of them.
+    """
+
+    __slots__ = ("connect", "read", "total")
+
+    connect: float | None
+    read: float | None
+    total: float | None
+
+    def __init__(
+        self: Self,
+        connect: float | None = 10.0,
+        read: float | None = 30.0,
+        total: float | None = None,
+    ) -> None:
+        self.connect = connect
+        self.read = read
+        self.total = total
+
+    def __repr__(self: Self) -> str:
+        return f"Timeout(connect={self.connect}, read={self.read}, total={self.total})"
+
+
 class Request:
+    """
+    An HTTP request, see `Route.request` for building one without parsing
+    its URL.
+
+    `path` (the `:path` sent, including the query), `authority` and
+    `route_key` are worked out from `url_string` when first needed, a
+    `Route` fills them in upfront.
+    """
+
     method: bytes
-    url: ParseResult
+    url_string: str
     headers: dict[str | bytes, str | bytes]
     multipart_headers: dict[str | bytes, str | bytes]
     encoder: Encoder
+    priority: Priority
 
     def __init__(
         self: Self,
@@ -310,24 +693,248 @@ class Request:
         *,
         content_type: ContentType = ContentType.NONE,
         data: str | bytes | dict | Any | None = None,
-        files: dict[str | bytes, tuple[str | bytes, bytes | AsyncIterable]] = None,
+        files: dict[str | bytes, tuple[str | bytes | None, Any]] = None,
         headers: dict[str | bytes, str | bytes] | None = None,
         multipart_headers: dict[str | bytes, str | bytes] = None,
+        priority: int | None = None,
+        params: Mapping[str, Any] | Iterable[tuple[str, Any]] | None = None,
     ) -> None:
         self.method = to_bytes(method.upper())
-        self.url = urlparse(url)
+        if params:
+            query = encode_form(params).decode("ascii")
+            if query:
+                url += ("&" if "?" in url else "?") + query
+        self.url_string = url
         self.headers = headers or {}
         self.encoder = Encoder(content_type, data, files, multipart_headers)
-
-    @property
-    def bucket_id(self: Self) -> str:
-        return urlunparse(
-            (self.url.scheme, self.url.netloc, self.url.path, None, None, None)
-        )
+        if priority is None:
+            # Interactions have to be answered within seconds. Told from the
+            # raw URL, which is otherwise only parsed when first needed
+            interactive = False
+            if "/interactions/" in url:
+                start = url.find("/", url.find("//") + 2)
+                interactive = GLOBAL_EXEMPT.match(url[start:]) is not None
+            priority = Priority.INTERACTIVE if interactive else Priority.NORMAL
+        self.priority = Priority(priority)
+
+    @cached_property
+    def url(self: Self) -> ParseResult:
+        return urlparse(self.url_string)
+
+    @cached_property
+    def path(self: Self) -> str:
+        return self.url._replace(scheme="", netloc="").geturl() or "/"
+
+    @cached_property
+    def endpoint(self: Self) -> str:
+        """
+        The path without the query.
+        """
+        return self.path.partition("?")[0]
+
+    @cached_property
+    def authority(self: Self) -> bytes:
+        return self.url.netloc.encode("ascii")
+
+    @cached_property
+    def route_key(self: Self) -> tuple[str, str]:
+        return route_key(self.method, self.endpoint)
 
     @property
     def end_stream(self: Self) -> bool:
         return self.encoder.end_stream
 
+    @property
+    def replayable(self: Self) -> bool:
+        return self.encoder.replayable
+
     async def read(self: Self) -> tuple[dict[bytes, bytes], bytes]:
         return await self.encoder.encode()
+
+
+class Headers(Mapping[bytes, bytes]):
+    """
+    Read-only, case-insensitive view over response headers.
+
+    Keys can be given as `str` or `bytes`, values are returned as received.
+    Repeated headers are joined with `, ` as allowed by RFC 9110.
+    """
+
+    __slots__ = ("_headers",)
+
+    _headers: dict[bytes, bytes]
+
+    def __init__(self: Self, raw: list[tuple[bytes, bytes]]) -> None:
+        headers = {}
+        for key, value in raw:
+            key = key.lower()
+            if key in headers:
+                headers[key] += b", " + value
+            else:
+                headers[key] = value
+        self._headers = headers
+
+    def __getitem__(self: Self, key: str | bytes) -> bytes:
+        return self._headers[to_bytes(key).lower()]
+
+    def __contains__(self: Self, key: object) -> bool:
+        if not isinstance(key, (str, bytes)):
+            return False
+        return to_bytes(key).lower() in self._headers
+
+    def __iter__(self: Self) -> Iterator[bytes]:
+        return iter(self._headers)
+
+    def __len__(self: Self) -> int:
+        return len(self._headers)
+
+    def __repr__(self: Self) -> str:
+        return f"Headers({self._headers!r})"
+
+
+def parse_headers(raw_headers: list[tuple[bytes, bytes]]) -> tuple[int, Headers]:
+    status = 0
+    headers = []
+    for key, value in raw_headers:
+        if key == b":status":
+            status = int(value)
+        elif not key.startswith(b":"):
+            headers.append((key, value))
+    return status, Headers(headers)
+
+
+class Response:
+    __slots__ = ("status", "headers", "content", "request", "_json")
+
+    status: int
+    headers: Headers
+    content: memoryview
+    request: Request
+
+    def __init__(
+        self: Self,
+        status: int,
+        headers: Headers,
+        content: bytes,
+        request: Request,
+    ) -> None:
+        self.status = status
+        self.headers = headers
+        self.content = memoryview(content)
+        self.request = request
+        self._json = MISSING
+
+    @classmethod
+    def from_raw(
+        cls: type[Self],
+        raw_headers: list[tuple[bytes, bytes]],
+        content: bytes,
+        request: Request,
+    ) -> Self:
+        status, headers = parse_headers(raw_headers)
+        return cls(status, headers, content, request)
+
+    @property
+    def ok(self: Self) -> bool:
+        return 200 <= self.status < 400
+
+    def json(self: Self) -> Any:
+        """
+        Decode the body as JSON, the result is cached after the first call.
+
+        Empty bodies (e.g. `204 No Content`) decode to `None`.
+        """
+        if self._json is MISSING:
+            self._json = loads(self.content) if self.content else None
+        return self._json
+
+    def raise_for_status(self: Self) -> None:
+        status = self.status
+        if status < 400:
+            return
+
+        endpoint = self.request.endpoint
+        if status == 403:
+            raise Forbidden(endpoint, self)
+        elif status == 404:
+            raise NotFound(endpoint, self)
+        elif status >= 500:
+            raise ServerError(endpoint, self, status)
+        raise HTTPException(status, f"Client Error: {endpoint}", self)
+
+    def __repr__(self: Self) -> str:
+        return f"<Response [{self.status}] {len(self.content)} bytes>"
+
+
+class StreamingResponse(Response):
+    """
+    A response whose body is read in chunks as it arrives.
+
+    Flow control is only acknowledged for chunks that were read, so a slow
+    consumer throttles the server instead of buffering the body. `content`
+    stays empty until `read` is called. The stream has to be released,
+    either by reading it to the end or through `aclose` / `async with`.
+    """
+
+    __slots__ = ("_client", "_stream")
+
+    _client: Any
+    _stream: Any
+
+    def __init__(
+        self: Self,
+        status: int,
+        headers: Headers,
+        request: Request,
+        client: Any,
+        stream: Any,
+    ) -> None:
+        Response.__init__(self, status, headers, b"", request)
+        self._client = client
+        self._stream = stream
+
+    @classmethod
+    def from_raw(
+        cls: type[Self],
+        raw_headers: list[tuple[bytes, bytes]],
+        client: Any,
+        stream: Any,
+        request: Request,
+    ) -> Self:
+        status, headers = parse_headers(raw_headers)
+        return cls(status, headers, request, client, stream)
+
+    async def iter_chunks(self: Self) -> AsyncIterator[bytes]:
+        try:
+            while True:
+                chunk = await self._client._read_chunk(self._stream)
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            await self.aclose()
+
+    def __aiter__(self: Self) -> AsyncIterator[bytes]:
+        return self.iter_chunks()
+
+    async def read(self: Self) -> memoryview:
+        """
+        Read the rest of the body into `content`.
+        """
+        chunks = [chunk async for chunk in self.iter_chunks()]
+        self.content = memoryview(b"".join(chunks))
+        return self.content
+
+    async def aclose(self: Self) -> None:
+        await self._client._close_streaming(self._stream)
+
+    async def __aenter__(self: Self) -> Self:
+        return self
+
+    async def __aexit__(
+        self: Self,
+        exc_type: type[BaseException] | None,
+        exc_val: BaseException | None,
+        exc_tb: TracebackType | None,
+    ) -> None:
+        await self.aclose()
@@ -0,0 +1,16 @@
+from .base import LazyField, lazy, model
+from .channel import Channel, Overwrite, ThreadMetadata
+from .guild import Emoji, Guild, Member, Role
+from .message import (
+    Attachment,
+    Embed,
+    EmbedAuthor,
+    EmbedField,
+    EmbedFooter,
+    EmbedMedia,
+    EmbedProvider,
+    Message,
+    MessageReference,
+    Reaction,
+)
+from .user import User
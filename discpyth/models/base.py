@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+__all__ = ("model", "lazy", "LazyField")
+
+from typing import TYPE_CHECKING, Any, Callable, Union
+
+from attrs import field, fields, resolve_types
+from cattr import override
+from cattr._compat import is_union_type
+
+from ..constants import T
+from ..utils import MISSING, Missing, converter, define
+
+if TYPE_CHECKING:
+    from typing_extensions import Self
+
+
+# What a lazy field holds until it is first read, the JSON it came from
+RAW_TYPES = (dict, list)
+
+
+def lazy(default: Any = MISSING) -> Any:
+    """
+    A field structured from the payload on first access rather than with
+    the rest of the model. Meant for nested objects and arrays.
+    """
+    return field(default=default, metadata={"lazy": True})
+
+
+class LazyField:
+    """
+    Replaces the slot of a lazy field on a model. The slot keeps the raw
+    JSON until the field is first read, which structures it once and
+    stores the result in its place.
+    """
+
+    __slots__ = ("name", "owner", "slot", "type")
+
+    name: str
+    owner: type
+    slot: Any
+    type: Any
+
+    def __init__(self: Self, name: str, owner: type, slot: Any) -> None:
+        self.name = name
+        self.owner = owner
+        self.slot = slot
+        self.type = None
+
+    def __get__(self: Self, instance: Any, owner: type | None = None) -> Any:
+        if instance is None:
+            return self
+
+        value = self.slot.__get__(instance, owner)
+        if isinstance(value, RAW_TYPES):
+            if self.type is None:
+                resolve_types(self.owner)
+                self.type = getattr(fields(self.owner), self.name).type
+            value = converter.structure(value, self.type)
+            self.slot.__set__(instance, value)
+        return value
+
+    def __set__(self: Self, instance: Any, value: Any) -> None:
+        # Only reached through `__init__`, the model itself is frozen
+        self.slot.__set__(instance, value)
+
+    def __delete__(self: Self, instance: Any) -> None:
+        self.slot.__delete__(instance)
+
+    def raw(self: Self, instance: Any) -> Any:
+        """
+        The value in the slot, structured or not.
+        """
+        return self.slot.__get__(instance, self.owner)
+
+
+def model(cls: type[T] | None = None, **kwargs: Any) -> Any:
+    """
+    `define` for Discord models, fields declared with `lazy()` are left as
+    JSON when the model is structured and only decoded once read.
+    """
+    if cls is None:
+        return lambda cls: model(cls, **kwargs)
+
+    cls = define(cls, **kwargs)
+    names = [a.name for a in fields(cls) if a.metadata.get("lazy")]
+    lazy_fields = []
+    for name in names:
+        descriptor = LazyField(name, cls, cls.__dict__[name])
+        setattr(cls, name, descriptor)
+        lazy_fields.append(descriptor)
+
+    # Generated (un)structure functions skip lazy fields, see below
+    cls.__overrides__ = {
+        **getattr(cls, "__overrides__", {}),
+        **{name: override(omit=True) for name in names},
+    }
+    cls.__lazy_fields__ = tuple(lazy_fields)
+    return cls
+
+
+def is_model(cls: Any) -> bool:
+    return isinstance(cls, type) and "__lazy_fields__" in cls.__dict__
+
+
+def make_structure(cls: type[T]) -> Callable[[Any, Any], T]:
+    structure = converter.gen_structure_attrs_fromdict(cls)
+    lazy_fields = cls.__lazy_fields__
+
+    def structure_model(payload: dict[str, Any], _: Any) -> T:
+        instance = structure(payload)
+        for descriptor in lazy_fields:
+            name = descriptor.name
+            if name in payload:
+                descriptor.slot.__set__(instance, payload[name])
+        return instance
+
+    return structure_model
+
+
+def make_unstructure(cls: type[T]) -> Callable[[T], dict[str, Any]]:
+    unstructure = converter.gen_unstructure_attrs_fromdict(cls)
+    lazy_fields = cls.__lazy_fields__
+
+    def unstructure_model(instance: T) -> dict[str, Any]:
+        payload = unstructure(instance)
+        for descriptor in lazy_fields:
+            value = descriptor.raw(instance)
+            if value is MISSING:
+                continue
+            # Never read, so it is still the JSON it was structured from
+            if not isinstance(value, RAW_TYPES):
+                value = converter.unstructure(value)
+            payload[descriptor.name] = value
+        return payload
+
+    return unstructure_model
+
+
+def is_absent(type_: Any) -> bool:
+    return is_union_type(type_) and Missing in type_.__args__
+
+
+def make_absent_structure(type_: Any) -> Callable[[Any, Any], Any]:
+    # `MISSING` is never in a payload, only the field default when the key is
+    present = Union[tuple(arg for arg in type_.__args__ if arg is not Missing)]
+    structure = converter._structure_func.dispatch(present)
+    return lambda value, _: structure(value, present)
+
+
+converter.register_structure_hook_factory(is_model, make_structure)
+converter.register_unstructure_hook_factory(is_model, make_unstructure)
+converter.register_structure_hook_factory(is_absent, make_absent_structure)
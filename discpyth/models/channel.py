@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+__all__ = ("Overwrite", "ThreadMetadata", "Channel")
+
+from ..utils import MISSING, Absent
+from .base import lazy, model
+from .user import User
+
+
+@model
+class Overwrite:
+    id: int
+    type: int
+    allow: int
+    deny: int
+
+
+@model
+class ThreadMetadata:
+    archived: bool
+    auto_archive_duration: int
+    archive_timestamp: str
+    locked: bool
+    invitable: Absent[bool] = MISSING
+    create_timestamp: Absent[str | None] = MISSING
+
+
+@model
+class Channel:
+    id: int
+    type: int
+    guild_id: Absent[int] = MISSING
+    position: Absent[int] = MISSING
+    name: Absent[str | None] = MISSING
+    topic: Absent[str | None] = MISSING
+    nsfw: Absent[bool] = MISSING
+    last_message_id: Absent[int | None] = MISSING
+    bitrate: Absent[int] = MISSING
+    user_limit: Absent[int] = MISSING
+    rate_limit_per_user: Absent[int] = MISSING
+    icon: Absent[str | None] = MISSING
+    owner_id: Absent[int] = MISSING
+    application_id: Absent[int] = MISSING
+    parent_id: Absent[int | None] = MISSING
+    last_pin_timestamp: Absent[str | None] = MISSING
+    rtc_region: Absent[str | None] = MISSING
+    video_quality_mode: Absent[int] = MISSING
+    message_count: Absent[int] = MISSING
+    member_count: Absent[int] = MISSING
+    default_auto_archive_duration: Absent[int] = MISSING
+    permissions: Absent[int] = MISSING
+    flags: Absent[int] = MISSING
+    permission_overwrites: Absent[tuple[Overwrite, ...]] = lazy()
+    recipients: Absent[tuple[User, ...]] = lazy()
+    thread_metadata: Absent[ThreadMetadata] = lazy()
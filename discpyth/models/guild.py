@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+__all__ = ("Role", "Emoji", "Member", "Guild")
+
+from ..utils import MISSING, Absent
+from .base import lazy, model
+from .channel import Channel
+from .user import User
+
+
+@model
+class Role:
+    id: int
+    name: str
+    color: int
+    hoist: bool
+    position: int
+    permissions: int
+    managed: bool
+    mentionable: bool
+    icon: Absent[str | None] = MISSING
+    unicode_emoji: Absent[str | None] = MISSING
+    flags: Absent[int] = MISSING
+
+
+@model
+class Emoji:
+    id: int | None
+    name: str | None
+    require_colons: Absent[bool] = MISSING
+    managed: Absent[bool] = MISSING
+    animated: Absent[bool] = MISSING
+    available: Absent[bool] = MISSING
+    roles: Absent[tuple[int, ...]] = lazy()
+    user: Absent[User] = lazy()
+
+
+@model
+class Member:
+    joined_at: str
+    deaf: Absent[bool] = MISSING
+    mute: Absent[bool] = MISSING
+    nick: Absent[str | None] = MISSING
+    avatar: Absent[str | None] = MISSING
+    premium_since: Absent[str | None] = MISSING
+    flags: Absent[int] = MISSING
+    pending: Absent[bool] = MISSING
+    permissions: Absent[int] = MISSING
+    communication_disabled_until: Absent[str | None] = MISSING
+    # Left out of the members embedded in messages
+    user: Absent[User] = lazy()
+    roles: tuple[int, ...] = lazy()
+
+
+@model
+class Guild:
+    id: int
+    name: str
+    icon: str | None
+    splash: str | None
+    discovery_splash: str | None
+    owner_id: int
+    afk_channel_id: int | None
+    afk_timeout: int
+    verification_level: int
+    default_message_notifications: int
+    explicit_content_filter: int
+    mfa_level: int
+    application_id: int | None
+    system_channel_id: int | None
+    system_channel_flags: int
+    rules_channel_id: int | None
+    vanity_url_code: str | None
+    description: str | None
+    banner: str | None
+    premium_tier: int
+    preferred_locale: str
+    public_updates_channel_id: int | None
+    nsfw_level: int
+    premium_progress_bar_enabled: bool
+    max_members: Absent[int] = MISSING
+    premium_subscription_count: Absent[int] = MISSING
+    approximate_member_count: Absent[int] = MISSING
+    approximate_presence_count: Absent[int] = MISSING
+    # Only sent with GUILD_CREATE
+    joined_at: Absent[str] = MISSING
+    large: Absent[bool] = MISSING
+    unavailable: Absent[bool] = MISSING
+    member_count: Absent[int] = MISSING
+    roles: tuple[Role, ...] = lazy()
+    emojis: tuple[Emoji, ...] = lazy()
+    features: tuple[str, ...] = lazy()
+    members: Absent[tuple[Member, ...]] = lazy()
+    channels: Absent[tuple[Channel, ...]] = lazy()
+    threads: Absent[tuple[Channel, ...]] = lazy()
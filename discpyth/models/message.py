@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+__all__ = (
+    "Attachment",
+    "EmbedFooter",
+    "EmbedMedia",
+    "EmbedProvider",
+    "EmbedAuthor",
+    "EmbedField",
+    "Embed",
+    "Reaction",
+    "MessageReference",
+    "Message",
+)
+
+from ..utils import MISSING, Absent
+from .base import lazy, model
+from .channel import Channel
+from .guild import Emoji, Member
+from .user import User
+
+
+@model
+class Attachment:
+    id: int
+    filename: str
+    size: int
+    url: str
+    proxy_url: str
+    description: Absent[str] = MISSING
+    content_type: Absent[str] = MISSING
+    height: Absent[int | None] = MISSING
+    width: Absent[int | None] = MISSING
+    ephemeral: Absent[bool] = MISSING
+
+
+@model
+class EmbedFooter:
+    text: str
+    icon_url: Absent[str] = MISSING
+    proxy_icon_url: Absent[str] = MISSING
+
+
+@model
+class EmbedMedia:
+    # Images, thumbnails and videos
+    url: Absent[str] = MISSING
+    proxy_url: Absent[str] = MISSING
+    height: Absent[int] = MISSING
+    width: Absent[int] = MISSING
+
+
+@model
+class EmbedProvider:
+    name: Absent[str] = MISSING
+    url: Absent[str] = MISSING
+
+
+@model
+class EmbedAuthor:
+    name: str
+    url: Absent[str] = MISSING
+    icon_url: Absent[str] = MISSING
+    proxy_icon_url: Absent[str] = MISSING
+
+
+@model
+class EmbedField:
+    name: str
+    value: str
+    inline: Absent[bool] = MISSING
+
+
+@model
+class Embed:
+    title: Absent[str] = MISSING
+    type: Absent[str] = MISSING
+    description: Absent[str] = MISSING
+    url: Absent[str] = MISSING
+    timestamp: Absent[str] = MISSING
+    color: Absent[int] = MISSING
+    footer: Absent[EmbedFooter] = lazy()
+    image: Absent[EmbedMedia] = lazy()
+    thumbnail: Absent[EmbedMedia] = lazy()
+    video: Absent[EmbedMedia] = lazy()
+    provider: Absent[EmbedProvider] = lazy()
+    author: Absent[EmbedAuthor] = lazy()
+    fields: Absent[tuple[EmbedField, ...]] = lazy()
+
+
+@model
+class Reaction:
+    count: int
+    me: bool
+    emoji: Emoji = lazy()
+
+
+@model
+class MessageReference:
+    message_id: Absent[int] = MISSING
+    channel_id: Absent[int] = MISSING
+    guild_id: Absent[int] = MISSING
+    fail_if_not_exists: Absent[bool] = MISSING
+
+
+@model
+class Message:
+    id: int
+    channel_id: int
+    content: str
+    timestamp: str
+    edited_timestamp: str | None
+    tts: bool
+    mention_everyone: bool
+    pinned: bool
+    type: int
+    guild_id: Absent[int] = MISSING
+    webhook_id: Absent[int] = MISSING
+    application_id: Absent[int] = MISSING
+    flags: Absent[int] = MISSING
+    position: Absent[int] = MISSING
+    author: User = lazy()
+    # Only sent with MESSAGE_CREATE and MESSAGE_UPDATE in guilds
+    member: Absent[Member] = lazy()
+    mentions: tuple[User, ...] = lazy()
+    mention_roles: tuple[int, ...] = lazy()
+    attachments: tuple[Attachment, ...] = lazy()
+    embeds: tuple[Embed, ...] = lazy()
+    reactions: Absent[tuple[Reaction, ...]] = lazy()
+    message_reference: Absent[MessageReference] = lazy()
+    referenced_message: Absent[Message | None] = lazy()
+    thread: Absent[Channel] = lazy()
@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+__all__ = ("User",)
+
+from ..utils import MISSING, Absent
+from .base import model
+
+
+@model
+class User:
+    id: int
+    username: str
+    discriminator: str
+    avatar: str | None
+    global_name: Absent[str | None] = MISSING
+    bot: Absent[bool] = MISSING
+    system: Absent[bool] = MISSING
+    mfa_enabled: Absent[bool] = MISSING
+    banner: Absent[str | None] = MISSING
+    accent_color: Absent[int | None] = MISSING
+    locale: Absent[str] = MISSING
+    verified: Absent[bool] = MISSING
+    email: Absent[str | None] = MISSING
+    flags: Absent[int] = MISSING
+    premium_type: Absent[int] = MISSING
+    public_flags: Absent[int] = MISSING
@@ -14,6 +14,7 @@ __all__ = (
 from functools import partial
 from inspect import stack as istack
 from logging import Formatter, Logger, StreamHandler, getLogger
+from random import uniform
 from typing import TYPE_CHECKING, Any, Set, TypeAlias, Union, get_origin
 
 from attrs import define, fields
@@ -30,6 +31,7 @@ from .constants import LOGGER_FORMAT, T
 
 try:
     from cattrs.preconf.orjson import configure_converter
+    from orjson import OPT_NON_STR_KEYS
     from orjson import dumps as _dumps
     from orjson import loads as _loads
 
@@ -60,8 +62,13 @@ def get_current_backend() -> _anyio | _curio:
         return _curio
 
 
-def exponential_backoff(base: int, factor: int) -> int:
-    return base**factor or factor
+def exponential_backoff(attempt: int, base: float = 0.5, cap: float = 30.0) -> float:
+    """
+    Capped exponential backoff with full jitter.
+
+    Returns a random delay between 0 and `min(cap, base * 2**attempt)`.
+    """
+    return uniform(0, min(cap, base * 2**attempt))
 
 
 class Sentinel:
@@ -222,15 +229,24 @@ configure_converter(converter)
 
 
 def dumps(obj: Any) -> bytes:
-    # dump = _dumps(converter.unstructure(obj))
-    dump = _dumps(obj)
+    # Only what the JSON library cannot serialize itself (attrs models) goes
+    # through the converter, everything else is never walked in Python
     if ORJSON:
-        return dump
-
+        return _dumps(obj, default=converter.unstructure, option=OPT_NON_STR_KEYS)
+
+    dump = _dumps(
+        obj,
+        default=converter.unstructure,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
     return dump.encode("utf-8")
 
 
-def loads(string: str) -> T:
+def loads(string: str | bytes | memoryview) -> T:
+    if not ORJSON and isinstance(string, memoryview):
+        # stdlib `json` does not accept buffers
+        string = string.tobytes()
     return _loads(string)
 
 
@@ -0,0 +1,302 @@
+import ssl
+from pathlib import Path
+
+import anyio
+import pytest
+from anyio.abc import SocketAttribute
+from anyio.streams.tls import TLSListener
+from h2.config import H2Configuration
+from h2.connection import H2Connection
+from h2.events import (
+    ConnectionTerminated,
+    DataReceived,
+    RemoteSettingsChanged,
+    RequestReceived,
+    StreamEnded,
+    StreamReset,
+    WindowUpdated,
+)
+from h2.exceptions import StreamClosedError
+from hyperframe.frame import GoAwayFrame
+
+from discpyth.backends._anyio import http as anyio_http
+from discpyth.http.tls import create_ssl_context
+from discpyth.http.types import Response
+
+# Self-signed for `discord.com`, key and certificate in one file
+CERTIFICATE = str(Path(__file__).parent / "certs" / "discord.com.pem")
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+def respond(request, status=200, headers=(), content=b""):
+    raw = [(b":status", str(status).encode())] + list(headers)
+    return Response.from_raw(raw, content, request)
+
+
+def spawner(task_group, scopes=None):
+    """
+    A `spawn` running tasks in `task_group`, each in a cancel scope of its
+    own that is added to `scopes` if given.
+    """
+
+    async def spawn(func, *args):
+        scope = anyio.CancelScope()
+        if scopes is not None:
+            scopes.append(scope)
+
+        async def run():
+            with scope:
+                await func(*args)
+
+        task_group.start_soon(run)
+
+    return spawn
+
+
+class FakeServer:
+    """
+    Stands in for the `send` of a connection, answering every request with
+    the next of `outcomes` and with the last one once they run out.
+
+    An exception is raised, an async function is called with the request
+    and its result used instead, a tuple holds a status and headers and
+    anything else is a status. The body of the n-th response is `n`.
+
+    Every answer takes `delay` seconds. With `read_body` the request body
+    is read first and kept in `bodies`, with `etag` responses carry it and
+    a matching `If-None-Match` gets a `304`.
+    """
+
+    def __init__(self, *outcomes, delay=0.0, read_body=False, etag=None):
+        self.outcomes = list(outcomes) or [200]
+        self.delay = delay
+        self.read_body = read_body
+        self.etag = etag
+        self.sent = []
+        self.bodies = []
+        self.sleeps = []
+        self.inflight = 0
+        self.max_inflight = 0
+
+    @property
+    def calls(self):
+        return len(self.sent)
+
+    async def send(self, request):
+        self.sent.append(request)
+        outcome = self.outcomes[min(len(self.sent), len(self.outcomes)) - 1]
+        self.inflight += 1
+        self.max_inflight = max(self.max_inflight, self.inflight)
+        try:
+            if self.read_body:
+                _, body = await request.read()
+                self.bodies.append(b"".join([bytes(chunk) async for chunk in body]))
+            if self.delay:
+                await anyio.sleep(self.delay)
+            if not isinstance(outcome, BaseException) and callable(outcome):
+                outcome = await outcome(request)
+            if isinstance(outcome, BaseException):
+                raise outcome
+            status, headers = outcome if isinstance(outcome, tuple) else (outcome, ())
+            headers = list(headers)
+            if self.etag is not None:
+                if request.headers.get(b"if-none-match") == self.etag:
+                    return respond(request, 304)
+                headers.append((b"etag", self.etag))
+            return respond(request, status, headers, str(len(self.sent)).encode())
+        finally:
+            self.inflight -= 1
+
+    async def sleep(self, seconds):
+        self.sleeps.append(seconds)
+
+
+class ServerRequest:
+    def __init__(self, connection, stream_id, headers, weight):
+        self.connection = connection
+        self.stream_id = stream_id
+        self.headers = headers
+        self.weight = weight
+        self.body = bytearray()
+
+    @property
+    def method(self):
+        return dict(self.headers)[b":method"]
+
+    @property
+    def path(self):
+        return dict(self.headers)[b":path"].decode()
+
+    def respond(self, status=200, headers=(), body=b""):
+        return self.connection.respond(self.stream_id, status, headers, body)
+
+
+class ServerConnection:
+    """
+    One connection to `H2Server`, answering each request once its body
+    arrived.
+    """
+
+    def __init__(self, server, stream, index):
+        self.server = server
+        self.stream = stream
+        self.index = index
+        self.h2 = H2Connection(H2Configuration(client_side=False))
+        self.pending = {}
+        self.received = 0
+        self.frozen = False
+        self.send_lock = anyio.Lock()
+        self.window_updated = anyio.Event()
+
+    async def flush(self):
+        async with self.send_lock:
+            data = self.h2.data_to_send()
+            if data:
+                await self.stream.send(data)
+
+    async def respond(self, stream_id, status=200, headers=(), body=b""):
+        headers = [(b":status", str(status).encode()), *headers]
+        headers.append((b"content-length", str(len(body)).encode()))
+        try:
+            self.h2.send_headers(stream_id, headers, end_stream=not body)
+            view = memoryview(body)
+            while view:
+                window = min(
+                    self.h2.local_flow_control_window(stream_id),
+                    self.h2.max_outbound_frame_size,
+                )
+                if window <= 0:
+                    await self.flush()
+                    await self.window_updated.wait()
+                    continue
+                self.h2.send_data(
+                    stream_id, view[:window], end_stream=window >= len(view)
+                )
+                self.server.data_sent += min(window, len(view))
+                view = view[window:]
+            await self.flush()
+        except StreamClosedError:
+            # Reset by the client
+            pass
+
+    async def goaway(self, last_stream_id):
+        # h2 would refuse to send anything afterwards, the streams it leaves
+        # to complete included
+        frame = GoAwayFrame(0)
+        frame.last_stream_id = last_stream_id
+        async with self.send_lock:
+            await self.stream.send(self.h2.data_to_send() + frame.serialize())
+
+    async def serve(self):
+        if self.server.max_concurrent_streams is not None:
+            self.h2.local_settings.max_concurrent_streams = (
+                self.server.max_concurrent_streams
+            )
+        self.h2.initiate_connection()
+        await self.flush()
+        async with anyio.create_task_group() as tg:
+            try:
+                while True:
+                    data = await self.stream.receive()
+                    if self.frozen:
+                        continue
+                    self.received += len(data)
+                    for event in self.h2.receive_data(data):
+                        if isinstance(event, ConnectionTerminated):
+                            return
+                        self.handle(event, tg)
+                    await self.flush()
+            except (anyio.EndOfStream, anyio.BrokenResourceError):
+                pass
+            finally:
+                tg.cancel_scope.cancel()
+
+    def handle(self, event, task_group):
+        if isinstance(event, RequestReceived):
+            priority = event.priority_updated
+            self.pending[event.stream_id] = ServerRequest(
+                self, event.stream_id, event.headers, priority and priority.weight
+            )
+        elif isinstance(event, DataReceived):
+            self.pending[event.stream_id].body += event.data
+            self.h2.acknowledge_received_data(
+                event.flow_controlled_length, event.stream_id
+            )
+        elif isinstance(event, StreamEnded):
+            request = self.pending.pop(event.stream_id)
+            self.server.requests.append(request)
+            task_group.start_soon(self.answer, request)
+        elif isinstance(event, StreamReset):
+            self.pending.pop(event.stream_id, None)
+            self.server.resets.append((self.index, event.stream_id))
+        if isinstance(event, (WindowUpdated, RemoteSettingsChanged)):
+            event, self.window_updated = self.window_updated, anyio.Event()
+            event.set()
+
+    async def answer(self, request):
+        response = await self.server.handler(request)
+        if response is not None:
+            await request.respond(*response)
+
+
+class H2Server:
+    """
+    HTTP/2 server over TLS on localhost, which the anyio backend connects to
+    in place of `discord.com` for the tests using the `h2_server` fixture.
+
+    Each request is answered with the status, headers and body returned by
+    `handler(request)`, or not at all for `None`. Everything sent on a
+    connection while it is `frozen` is ignored, PINGs included.
+    """
+
+    def __init__(self):
+        self.handler = self.echo
+        self.max_concurrent_streams = None
+        self.connections = []
+        self.requests = []
+        self.resets = []
+        self.data_sent = 0
+        self.port = None
+
+    @staticmethod
+    async def echo(request):
+        return 200, [(b"content-type", b"application/octet-stream")], request.body
+
+    def ssl_context(self):
+        context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        context.load_cert_chain(CERTIFICATE)
+        context.set_alpn_protocols(["h2"])
+        return context
+
+    def client_ssl_context(self):
+        context = create_ssl_context()
+        context.load_verify_locations(CERTIFICATE)
+        return context
+
+    async def connect_tcp(self, host, port, **kwargs):
+        return await anyio.connect_tcp(
+            "127.0.0.1", self.port, tls_hostname=host, **kwargs
+        )
+
+    async def serve(self, stream):
+        connection = ServerConnection(self, stream, len(self.connections))
+        self.connections.append(connection)
+        await connection.serve()
+
+
+@pytest.fixture
+async def h2_server(monkeypatch):
+    server = H2Server()
+    listener = await anyio.create_tcp_listener(local_host="127.0.0.1")
+    server.port = listener.extra(SocketAttribute.local_port)
+    monkeypatch.setattr(anyio_http, "connect_tcp", server.connect_tcp)
+    monkeypatch.setattr(anyio_http, "create_ssl_context", server.client_ssl_context)
+    async with anyio.create_task_group() as tg:
+        tls_listener = TLSListener(listener, server.ssl_context(), False)
+        tg.start_soon(tls_listener.serve, server.serve)
+        yield server
+        tg.cancel_scope.cancel()
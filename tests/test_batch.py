@@ -0,0 +1,155 @@
+import anyio
+import pytest
+from conftest import FakeServer, spawner
+
+from discpyth.http.batch import Batch
+from discpyth.http.types import Request
+
+pytestmark = pytest.mark.anyio
+
+API = "https://discord.com/api/v10"
+
+
+def request(channel, index=0):
+    # Route keys only pick up snowflakes as major parameters
+    channel_id = 100000000000000000 + channel
+    message_id = 200000000000000000 + index
+    return Request("GET", f"{API}/channels/{channel_id}/messages/{message_id}")
+
+
+def by_channel(failing=(), blocked=(), release=None):
+    """
+    Fails the requests to `failing` channels and holds back those to
+    `blocked` ones until `release` is set.
+    """
+
+    async def outcome(request):
+        channel = int(request.path.split("/")[4]) - 100000000000000000
+        if channel in blocked:
+            await release.wait()
+        if channel in failing:
+            return ValueError(channel)
+        return 200
+
+    return outcome
+
+
+async def collect(batch):
+    results = []
+    with anyio.fail_after(2):
+        async for result in batch.results():
+            results.append(result)
+    return results
+
+
+async def test_every_request_gets_a_result():
+    server = FakeServer(delay=0.01)
+    requests = [request(channel_id, i) for channel_id in (1, 2) for i in range(5)]
+    async with anyio.create_task_group() as tg:
+        batch = Batch(requests, server.send, spawner(tg), anyio.Event)
+        results = await collect(batch)
+
+    assert sorted(result.index for result in results) == list(range(10))
+    for result in results:
+        assert result.ok
+        assert result.request is requests[result.index]
+        assert result.result().status == 200
+
+
+async def test_concurrency_is_bounded():
+    server = FakeServer(delay=0.01)
+    requests = [request(1, i) for i in range(12)]
+    async with anyio.create_task_group() as tg:
+        batch = Batch(requests, server.send, spawner(tg), anyio.Event, 3)
+        await collect(batch)
+
+    assert server.max_inflight == 3
+    assert len(server.sent) == 12
+
+
+async def test_a_stuck_route_does_not_hold_up_the_others():
+    release = anyio.Event()
+    server = FakeServer(by_channel(blocked={1}, release=release), delay=0.01)
+    requests = [request(1, i) for i in range(4)] + [request(2, i) for i in range(4)]
+    results = []
+    async with anyio.create_task_group() as tg:
+        batch = Batch(requests, server.send, spawner(tg), anyio.Event, 4)
+        async for result in batch.results():
+            results.append(result)
+            if len(results) == 4:
+                # Only once the other route is done
+                assert {r.request.path for r in results} == {
+                    r.path for r in requests[4:]
+                }
+                release.set()
+
+    assert len(results) == 8
+
+
+async def test_failures_are_reported_per_request():
+    server = FakeServer(by_channel(failing={2}), delay=0.01)
+    requests = [request(1), request(2), request(3)]
+    async with anyio.create_task_group() as tg:
+        batch = Batch(requests, server.send, spawner(tg), anyio.Event)
+        results = sorted(await collect(batch), key=lambda result: result.index)
+
+    assert [result.ok for result in results] == [True, False, True]
+    assert isinstance(results[1].error, ValueError)
+    with pytest.raises(ValueError):
+        results[1].result()
+
+
+async def test_cancelled_workers_fail_what_is_left():
+    server = FakeServer(by_channel(blocked={1}, release=anyio.Event()))
+    requests = [request(1, i) for i in range(6)]
+    async with anyio.create_task_group() as tg:
+        workers = []
+
+        async def cancel_soon():
+            await anyio.sleep(0.05)
+            for scope in workers:
+                scope.cancel()
+
+        tg.start_soon(cancel_soon)
+        batch = Batch(requests, server.send, spawner(tg, workers), anyio.Event, 2)
+        results = await collect(batch)
+
+    assert len(server.sent) == 2
+    assert sorted(result.index for result in results) == list(range(6))
+    assert not any(result.ok for result in results)
+
+
+async def test_the_other_workers_take_over_from_a_cancelled_one():
+    server = FakeServer(delay=0.01)
+    requests = [request(1, i) for i in range(6)]
+    async with anyio.create_task_group() as tg:
+        workers = []
+
+        async def cancel_soon():
+            await anyio.sleep(0.015)
+            workers[0].cancel()
+
+        tg.start_soon(cancel_soon)
+        batch = Batch(requests, server.send, spawner(tg, workers), anyio.Event, 2)
+        results = await collect(batch)
+
+    assert sorted(result.index for result in results) == list(range(6))
+    assert [result.ok for result in results].count(False) == 1
+
+
+async def test_leaving_early_stops_sending():
+    server = FakeServer(delay=0.01)
+    requests = [request(1, i) for i in range(20)]
+    async with anyio.create_task_group() as tg:
+        batch = Batch(requests, server.send, spawner(tg), anyio.Event, 2)
+        results = batch.results()
+        async for _ in results:
+            break
+        await results.aclose()
+
+    assert len(server.sent) < 20
+
+
+def test_concurrency_must_be_positive():
+    with pytest.raises(ValueError):
+        Batch([], None, None, anyio.Event, 0)
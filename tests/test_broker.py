@@ -0,0 +1,109 @@
+from contextlib import asynccontextmanager
+from time import monotonic
+
+import anyio
+import pytest
+
+from discpyth.backends._anyio.broker import BucketBroker, SharedBucketManager
+from discpyth.http.exceptions import StreamRefused
+from discpyth.http.types import Headers
+
+pytestmark = pytest.mark.anyio
+
+MESSAGES = "/api/v10/channels/1/messages"
+
+
+def ratelimit_headers(remaining, reset_after=10.0):
+    return Headers(
+        [
+            (b"x-ratelimit-limit", b"5"),
+            (b"x-ratelimit-remaining", str(remaining).encode()),
+            (b"x-ratelimit-reset-after", str(reset_after).encode()),
+            (b"x-ratelimit-bucket", b"abcd"),
+        ]
+    )
+
+
+@asynccontextmanager
+async def running_broker(path):
+    """
+    Serve a broker at `path`, yields the cancel scope stopping it.
+    """
+    scope = anyio.CancelScope()
+
+    async def serve():
+        with scope:
+            await BucketBroker().serve(str(path))
+
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(serve)
+        while not path.exists():
+            await anyio.sleep(0.001)
+        yield scope
+        scope.cancel()
+
+
+@asynccontextmanager
+async def workers(path):
+    async with SharedBucketManager(str(path)) as first:
+        async with SharedBucketManager(str(path)) as second:
+            yield first, second
+
+
+async def acquires_within(manager, seconds=0.1):
+    with anyio.move_on_after(seconds):
+        token = await manager.acquire(b"GET", MESSAGES)
+        manager.release(token, b"GET", MESSAGES)
+        return True
+    return False
+
+
+async def test_workers_see_the_same_limits(tmp_path):
+    path = tmp_path / "broker.sock"
+    async with running_broker(path):
+        async with workers(path) as (first, second):
+            token = await first.acquire(b"GET", MESSAGES)
+            first.release(token, b"GET", MESSAGES, 200, ratelimit_headers(0, 0.2))
+
+            start = monotonic()
+            with anyio.fail_after(2):
+                token = await second.acquire(b"GET", MESSAGES)
+            second.release(token, b"GET", MESSAGES)
+            assert monotonic() - start >= 0.15
+
+
+async def test_unknown_buckets_let_one_request_through_across_workers(tmp_path):
+    path = tmp_path / "broker.sock"
+    async with running_broker(path):
+        async with workers(path) as (first, second):
+            token = await first.acquire(b"GET", MESSAGES)
+            assert not await acquires_within(second)
+
+            first.release(token, b"GET", MESSAGES, 200, ratelimit_headers(4))
+            assert await acquires_within(second)
+
+
+async def test_grants_of_a_closed_worker_are_released(tmp_path):
+    path = tmp_path / "broker.sock"
+    async with running_broker(path):
+        async with SharedBucketManager(str(path)) as second:
+            async with SharedBucketManager(str(path)) as first:
+                await first.acquire(b"GET", MESSAGES)
+            assert await acquires_within(second)
+
+
+async def test_losing_the_broker_refuses_waiting_acquires(tmp_path):
+    path = tmp_path / "broker.sock"
+    async with running_broker(path) as broker:
+        async with workers(path) as (first, second):
+            await first.acquire(b"GET", MESSAGES)
+
+            async def stop_broker():
+                await anyio.sleep(0.05)
+                broker.cancel()
+
+            async with anyio.create_task_group() as tg:
+                tg.start_soon(stop_broker)
+                with anyio.fail_after(2), pytest.raises(StreamRefused):
+                    await second.acquire(b"GET", MESSAGES)
+            assert not second.is_connected
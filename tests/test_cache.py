@@ -0,0 +1,188 @@
+import anyio
+import pytest
+from conftest import FakeServer, spawner
+
+from discpyth.http.cache import MemoryResponseCache, cache_route
+from discpyth.http.singleflight import SingleFlight, flight_key
+from discpyth.http.types import Request
+
+pytestmark = pytest.mark.anyio
+
+API = "https://discord.com/api/v10"
+CHANNEL = f"{API}/channels/100000000000000001"
+
+
+async def fetch(cache, server, tg, url=CHANNEL, method="GET"):
+    return await cache.fetch(Request(method, url), server.send, spawner(tg))
+
+
+def test_routes_drop_the_api_version():
+    assert cache_route("/api/v10/channels/100000000000000001") == "/channels/{id}"
+
+
+async def test_fresh_entries_are_served_from_the_cache():
+    cache = MemoryResponseCache(default_ttl=10)
+    server = FakeServer()
+    async with anyio.create_task_group() as tg:
+        first = await fetch(cache, server, tg)
+        second = await fetch(cache, server, tg)
+
+    assert second is first
+    assert len(server.sent) == 1
+
+
+async def test_routes_without_a_ttl_are_not_cached():
+    cache = MemoryResponseCache(ttls={"/guilds/{id}": 10})
+    server = FakeServer()
+    async with anyio.create_task_group() as tg:
+        await fetch(cache, server, tg)
+        await fetch(cache, server, tg)
+
+    assert len(server.sent) == 2
+
+
+async def test_only_plain_200_responses_are_kept():
+    cache = MemoryResponseCache(default_ttl=10)
+    async with anyio.create_task_group() as tg:
+        server = FakeServer(404)
+        await fetch(cache, server, tg)
+        await fetch(cache, server, tg)
+        assert len(server.sent) == 2
+
+        server = FakeServer((200, [(b"cache-control", b"no-store")]))
+        await fetch(cache, server, tg)
+        await fetch(cache, server, tg)
+        assert len(server.sent) == 2
+
+
+async def test_stale_entries_are_served_while_revalidated():
+    cache = MemoryResponseCache(default_ttl=0.05, stale_ttl=10)
+    server = FakeServer(etag=b'"v1"')
+    async with anyio.create_task_group() as tg:
+        first = await fetch(cache, server, tg)
+        await anyio.sleep(0.06)
+        stale = await fetch(cache, server, tg)
+        assert stale is first
+
+        # The stale entry was refreshed by the background `304`
+        await anyio.sleep(0.01)
+        assert len(server.sent) == 2
+        assert server.sent[1].headers[b"if-none-match"] == b'"v1"'
+        assert await fetch(cache, server, tg) is first
+        assert len(server.sent) == 2
+
+
+async def test_a_stale_entry_is_revalidated_once():
+    cache = MemoryResponseCache(default_ttl=0.05, stale_ttl=10)
+    server = FakeServer(etag=b'"v1"')
+    async with anyio.create_task_group() as tg:
+        await fetch(cache, server, tg)
+        await anyio.sleep(0.06)
+        server.delay = 0.05
+        for _ in range(5):
+            await fetch(cache, server, tg)
+
+    assert len(server.sent) == 2
+
+
+async def test_expired_entries_are_fetched_again():
+    cache = MemoryResponseCache(default_ttl=0.02)
+    server = FakeServer()
+    async with anyio.create_task_group() as tg:
+        first = await fetch(cache, server, tg)
+        await anyio.sleep(0.03)
+        second = await fetch(cache, server, tg)
+
+    assert second is not first
+    assert second.content == b"2"
+
+
+async def test_mutations_invalidate_the_path_and_its_parent():
+    cache = MemoryResponseCache(default_ttl=10)
+    server = FakeServer()
+    message = f"{CHANNEL}/messages/200000000000000001"
+    async with anyio.create_task_group() as tg:
+        await fetch(cache, server, tg, f"{CHANNEL}/messages")
+        await fetch(cache, server, tg, message)
+        await fetch(cache, server, tg, message, "DELETE")
+        await fetch(cache, server, tg, f"{CHANNEL}/messages")
+        await fetch(cache, server, tg, message)
+
+    assert len(server.sent) == 5
+
+
+async def test_invalidation_hooks_name_further_paths():
+    cache = MemoryResponseCache(default_ttl=10)
+    cache.add_invalidation_hook(lambda request: ["/api/v10/users/@me"])
+    server = FakeServer()
+    async with anyio.create_task_group() as tg:
+        await fetch(cache, server, tg, f"{API}/users/@me")
+        await fetch(cache, server, tg, f"{API}/users/@me/settings", "PATCH")
+        await fetch(cache, server, tg, f"{API}/users/@me")
+
+    assert len(server.sent) == 3
+
+
+async def test_responses_predating_an_invalidation_are_not_kept():
+    cache = MemoryResponseCache(default_ttl=10)
+    server = FakeServer(delay=0.05)
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(fetch, cache, server, tg)
+        await anyio.sleep(0.01)
+        cache.invalidate("/api/v10/channels/100000000000000001")
+        await anyio.sleep(0.06)
+        server.delay = 0.0
+        await fetch(cache, server, tg)
+
+    assert len(server.sent) == 2
+
+
+async def test_least_recently_used_entries_are_evicted():
+    cache = MemoryResponseCache(default_ttl=10, max_bytes=2)
+    server = FakeServer()
+    async with anyio.create_task_group() as tg:
+        for channel in (1, 2, 1, 3, 1, 2):
+            await fetch(cache, server, tg, f"{API}/channels/10000000000000000{channel}")
+
+    # 1 stays in, 2 was the least recently used when 3 came
+    assert len(server.sent) == 4
+    assert cache.size <= 2
+
+
+async def test_conditional_requests_do_not_share_a_flight():
+    assert flight_key(Request("GET", CHANNEL)) is not None
+    conditional = Request("GET", CHANNEL, headers={"If-None-Match": '"v1"'})
+    assert flight_key(conditional) is None
+
+    server = FakeServer(etag=b'"v1"', delay=0.02)
+    flights = SingleFlight(anyio.Event)
+    responses = []
+
+    async def send(request):
+        responses.append(await flights.call(request, server.send))
+
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(
+            send, Request("GET", CHANNEL, headers={b"if-none-match": b'"v1"'})
+        )
+        await anyio.sleep(0)
+        tg.start_soon(send, Request("GET", CHANNEL))
+
+    assert sorted(response.status for response in responses) == [200, 304]
+    assert len(server.sent) == 2
+
+
+async def test_identical_gets_share_a_flight():
+    server = FakeServer(delay=0.02)
+    flights = SingleFlight(anyio.Event)
+    responses = []
+
+    async def send():
+        responses.append(await flights.call(Request("GET", CHANNEL), server.send))
+
+    async with anyio.create_task_group() as tg:
+        for _ in range(3):
+            tg.start_soon(send)
+
+    assert len(server.sent) == 1
+    assert responses[0] is responses[1] is responses[2]
@@ -0,0 +1,417 @@
+import anyio
+import pytest
+from anyio.streams.tls import TLSAttribute
+from h2.exceptions import ProtocolError
+
+from discpyth.backends._anyio.http import HTTPClient
+from discpyth.http.base import (
+    INITIAL_CONNECTION_WINDOW,
+    MAX_CONNECTION_WINDOW,
+    STREAM_WINDOW,
+)
+from discpyth.http.exceptions import ConnectionLost, NotFound, RequestTimeout
+from discpyth.http.types import ContentType, Request, Timeout
+
+pytestmark = pytest.mark.anyio
+
+API = "https://discord.com/api/v10"
+
+
+def channel(n):
+    return f"{API}/channels/{100000000000000000 + n}/messages"
+
+
+async def test_requests_share_one_connection(h2_server):
+    release = anyio.Event()
+    waiting = 0
+
+    async def handler(request):
+        nonlocal waiting
+        waiting += 1
+        if waiting == 8:
+            release.set()
+        await release.wait()
+        return 200, [], request.path.encode()
+
+    h2_server.handler = handler
+    responses = {}
+    async with HTTPClient() as client:
+        await client.connect(API)
+
+        async def send(n):
+            responses[n] = await client.send(Request("GET", channel(n)))
+
+        with anyio.fail_after(5):
+            async with anyio.create_task_group() as tg:
+                for n in range(8):
+                    tg.start_soon(send, n)
+
+    # All eight were in flight at once, one stream each
+    assert len(h2_server.connections) == 1
+    assert len({request.stream_id for request in h2_server.requests}) == 8
+    for n, response in responses.items():
+        assert response.status == 200
+        assert response.content == channel(n)[len("https://discord.com") :].encode()
+
+
+async def test_responses_carry_status_headers_and_body(h2_server):
+    async def handler(request):
+        if request.path.endswith("/missing"):
+            return 404, [], b'{"code": 10008}'
+        return 200, [(b"Content-Type", b"application/json")], b'{"id": "1"}'
+
+    h2_server.handler = handler
+    async with HTTPClient() as client:
+        await client.connect(API)
+        with anyio.fail_after(5):
+            response = await client.send(Request("GET", channel(1)))
+            with pytest.raises(NotFound) as info:
+                await client.send(Request("GET", channel(1) + "/missing"))
+
+    assert response.status == 200
+    assert response.headers["content-type"] == b"application/json"
+    assert response.json() == {"id": "1"}
+    assert info.value.response.json() == {"code": 10008}
+
+
+async def test_request_bodies_arrive_whole(h2_server):
+    payload = bytes(range(256)) * 1024
+    async with HTTPClient() as client:
+        await client.connect(API)
+        with anyio.fail_after(5):
+            response = await client.send(
+                Request(
+                    "POST", channel(1), content_type=ContentType.CONTENT, data=payload
+                )
+            )
+
+    assert h2_server.requests[0].body == payload
+    assert response.content == payload
+
+
+async def test_connection_specific_headers_are_refused_upfront(h2_server):
+    async with HTTPClient() as client:
+        await client.connect(API)
+        with pytest.raises(ValueError):
+            await client.send(
+                Request("GET", channel(1), headers={"Connection": "close"})
+            )
+        with pytest.raises(ValueError):
+            await client.send(Request("GET", channel(1), headers={"TE": "gzip"}))
+        with anyio.fail_after(5):
+            response = await client.send(Request("GET", channel(1)))
+
+    assert response.status == 200
+    assert len(h2_server.connections) == 1
+
+
+async def test_headers_h2_refuses_do_not_leak_the_stream(h2_server):
+    async with HTTPClient() as client:
+        await client.connect(API)
+        headers = [
+            (b":method", b"GET"),
+            (b":scheme", b"https"),
+            (b":authority", b"discord.com"),
+            (b":path", b"/"),
+            (b"keep-alive", b"timeout=5"),
+        ]
+        with pytest.raises(ProtocolError):
+            client._open_stream(headers, True)
+
+        # Its HPACK table is out of sync, the connection is not used again
+        assert client.streams == {}
+        assert not client.is_available
+        with anyio.fail_after(5):
+            response = await client.send(Request("GET", channel(1)))
+
+    assert response.status == 200
+    assert len(h2_server.connections) == 2
+
+
+def test_invalid_default_headers_are_refused():
+    with pytest.raises(ValueError):
+        HTTPClient(default_headers={"": "value"})
+
+
+async def test_goaway_lets_earlier_streams_complete(h2_server):
+    arrived = []
+
+    async def handler(request):
+        if request.connection.index > 0:
+            return 200, [], bytes(request.body)
+        arrived.append(request)
+        if len(arrived) < 2:
+            return None
+        first, second = sorted(arrived, key=lambda request: request.stream_id)
+        await request.connection.goaway(first.stream_id)
+        # Answered only after the GOAWAY reached the client
+        await anyio.sleep(0.05)
+        await first.respond(200, [], bytes(first.body))
+        return None
+
+    h2_server.handler = handler
+    responses = {}
+    async with HTTPClient() as client:
+        await client.connect(API)
+
+        async def send(n):
+            request = Request(
+                "POST", channel(n), content_type=ContentType.CONTENT, data=b"%d" % n
+            )
+            responses[n] = await client.send(request)
+
+        with anyio.fail_after(5):
+            async with anyio.create_task_group() as tg:
+                tg.start_soon(send, 1)
+                tg.start_soon(send, 2)
+
+    # The one past `last_stream_id` went out again on a new connection
+    assert {n: response.content for n, response in responses.items()} == {
+        1: b"1",
+        2: b"2",
+    }
+    assert [request.connection.index for request in h2_server.requests] == [0, 0, 1]
+
+
+async def test_connections_resume_the_tls_session_of_one_still_open(h2_server):
+    async with HTTPClient() as first:
+        await first.connect(API)
+        with anyio.fail_after(5):
+            await first.send(Request("GET", channel(1)))
+
+        async with HTTPClient(ssl_context=first.ssl_context) as second:
+            await second.connect(API)
+            ssl_object = second.socket.extra(TLSAttribute.ssl_object)
+            assert ssl_object.session_reused
+
+
+async def test_streamed_bodies_are_not_sent_ahead_of_the_reader(h2_server):
+    body = bytes(range(256)) * (4 * STREAM_WINDOW // 256)
+
+    async def handler(request):
+        return 200, [], body
+
+    h2_server.handler = handler
+
+    async with HTTPClient() as client:
+        await client.connect(API)
+        with anyio.fail_after(5):
+            response = await client.send(Request("GET", channel(1)), stream=True)
+            await anyio.sleep(0.2)
+            # Held back by the stream window until the body is read
+            assert h2_server.data_sent <= STREAM_WINDOW
+
+            received = bytearray()
+            async for chunk in response:
+                received += chunk
+
+    assert received == body
+    assert client.streams == {}
+
+
+async def test_leaving_a_streamed_body_early_resets_only_its_stream(h2_server):
+    body = b"x" * (4 * STREAM_WINDOW)
+
+    async def handler(request):
+        return 200, [], body
+
+    h2_server.handler = handler
+
+    async with HTTPClient() as client:
+        await client.connect(API)
+        with anyio.fail_after(5):
+            async with await client.send(
+                Request("GET", channel(1)), stream=True
+            ) as response:
+                async for _ in response:
+                    break
+            assert client.streams == {}
+
+            again = await client.send(Request("GET", channel(2)))
+
+    assert len(again.content) == len(body)
+    assert h2_server.resets == [(0, h2_server.requests[0].stream_id)]
+    assert len(h2_server.connections) == 1
+
+
+async def test_one_task_writes_and_bursts_are_coalesced(h2_server):
+    release = anyio.Event()
+
+    async def handler(request):
+        if len(h2_server.requests) == 20:
+            release.set()
+        await release.wait()
+        return 200, [], b""
+
+    h2_server.handler = handler
+    async with HTTPClient() as client:
+        await client.connect(API)
+        writes = []
+        stream_send = client._stream_send
+
+        async def record(data):
+            writes.append(anyio.get_current_task().id)
+            await stream_send(data)
+
+        client._stream_send = record
+        with anyio.fail_after(5):
+            async with anyio.create_task_group() as tg:
+                for n in range(20):
+                    tg.start_soon(client.send, Request("GET", channel(n)))
+
+    assert len(set(writes)) == 1
+    # Far fewer writes than requests and their acknowledgements
+    assert len(writes) < 10
+
+
+async def test_the_stream_window_is_only_advertised_through_settings(h2_server):
+    async with HTTPClient() as client:
+        await client.connect(API)
+        with anyio.fail_after(5):
+            for n in range(3):
+                await client.send(Request("GET", channel(n)))
+
+        h2 = h2_server.connections[0].h2
+        assert h2.remote_settings.initial_window_size == STREAM_WINDOW
+        stream_id = h2_server.requests[-1].stream_id
+        assert h2.local_flow_control_window(stream_id) == STREAM_WINDOW
+
+
+async def test_the_connection_window_grows_with_the_download_rate(h2_server):
+    body = b"x" * (2 * INITIAL_CONNECTION_WINDOW)
+
+    async def handler(request):
+        return 200, [], body
+
+    h2_server.handler = handler
+    async with HTTPClient() as client:
+        await client.connect(API)
+        with anyio.fail_after(5):
+            await client.ping()
+            # Everything arrives within one (pretend) round trip
+            client.rtt = 60.0
+            response = await client.send(Request("GET", channel(1)))
+
+        assert len(response.content) == len(body)
+        assert client.connection_window > INITIAL_CONNECTION_WINDOW
+        assert client.connection_window <= MAX_CONNECTION_WINDOW
+
+
+async def test_warmup_measures_the_round_trip(h2_server):
+    async with HTTPClient() as client:
+        await client.connect(API)
+        with anyio.fail_after(5):
+            rtt = await client.warmup()
+
+    assert 0 < rtt < 1
+    assert client.rtt is not None
+
+
+async def test_an_unanswered_ping_fails_the_connection(h2_server):
+    async with HTTPClient() as client:
+        await client.connect(API)
+        with anyio.fail_after(5):
+            await client.ping()
+            h2_server.connections[0].frozen = True
+            with pytest.raises(ConnectionLost):
+                await client.ping(timeout=0.1)
+
+        assert not client.is_available
+
+
+async def test_keepalive_replaces_a_dead_connection(h2_server):
+    async with HTTPClient(keepalive_interval=0.05, keepalive_timeout=0.1) as client:
+        await client.connect(API)
+        with anyio.fail_after(5):
+            await client.ping()
+            h2_server.connections[0].frozen = True
+            while len(h2_server.connections) < 2 or not client.is_available:
+                await anyio.sleep(0.01)
+            response = await client.send(Request("GET", channel(1)))
+
+    assert response.status == 200
+    assert h2_server.requests[0].connection.index == 1
+
+
+async def slow_channel_handler(request):
+    if request.path == channel(0)[len("https://discord.com") :]:
+        await anyio.sleep(10)
+    return 200, [], b"done"
+
+
+@pytest.mark.parametrize(
+    "timeout, phase",
+    [(Timeout(read=0.1), "read"), (Timeout(total=0.1), "total")],
+)
+async def test_a_timeout_resets_only_its_own_stream(h2_server, timeout, phase):
+    h2_server.handler = slow_channel_handler
+    async with HTTPClient() as client:
+        await client.connect(API)
+        other = {}
+
+        async def send_other():
+            await anyio.sleep(0.05)
+            other["response"] = await client.send(Request("GET", channel(1)))
+
+        with anyio.fail_after(5):
+            async with anyio.create_task_group() as tg:
+                tg.start_soon(send_other)
+                with pytest.raises(RequestTimeout) as info:
+                    await client.send(Request("GET", channel(0)), timeout=timeout)
+
+        assert info.value.phase == phase
+        assert client.is_available
+        assert client.streams == {}
+
+    assert other["response"].content == b"done"
+    slow = h2_server.requests[0]
+    assert h2_server.resets == [(0, slow.stream_id)]
+    assert len(h2_server.connections) == 1
+
+
+async def test_a_cancelled_request_resets_only_its_own_stream(h2_server):
+    h2_server.handler = slow_channel_handler
+    async with HTTPClient() as client:
+        await client.connect(API)
+        with anyio.fail_after(5):
+            with anyio.move_on_after(0.1):
+                await client.send(Request("GET", channel(0)))
+            assert client.streams == {}
+            response = await client.send(Request("GET", channel(1)))
+
+    assert response.content == b"done"
+    assert h2_server.resets == [(0, h2_server.requests[0].stream_id)]
+    assert len(h2_server.connections) == 1
+
+
+async def test_repeated_headers_are_sent_as_hpack_indices(h2_server):
+    headers = {"Authorization": "Bot " + "t" * 70, "User-Agent": "DiscordBot (x, 1)"}
+    async with HTTPClient(default_headers=headers) as client:
+        await client.connect(API)
+        with anyio.fail_after(5):
+            await client.ping()
+            sizes = []
+            for n in range(2):
+                received = h2_server.connections[0].received
+                await client.send(Request("GET", channel(1), headers={"X-Foo": "1"}))
+                sizes.append(h2_server.connections[0].received - received)
+
+    first, second = h2_server.requests
+    assert first.headers == second.headers
+    names = [name for name, _ in first.headers]
+    assert names[:4] == [b":method", b":scheme", b":authority", b":path"]
+    assert dict(first.headers)[b"authorization"] == headers["Authorization"].encode()
+    # Only the never-indexed path is sent literally again
+    assert sizes[1] < sizes[0] / 2
+
+
+async def test_request_headers_override_default_ones(h2_server):
+    async with HTTPClient(default_headers={"User-Agent": "default"}) as client:
+        await client.connect(API)
+        with anyio.fail_after(5):
+            await client.send(Request("GET", channel(1), headers={"user-agent": "own"}))
+
+    user_agents = [
+        value for name, value in h2_server.requests[0].headers if name == b"user-agent"
+    ]
+    assert user_agents == [b"own"]
@@ -0,0 +1,68 @@
+import attrs
+import pytest
+
+from discpyth.models import Message, User
+from discpyth.utils import MISSING, converter, create_model, loads
+
+AUTHOR = {"id": "80351110224678912", "username": "Nelly", "discriminator": "1337"}
+
+
+def message_payload(**extra):
+    return {
+        "id": "334385199974967042",
+        "channel_id": "290926798999357250",
+        "content": "Supa Hot",
+        "timestamp": "2017-07-11T17:27:07.299000+00:00",
+        "edited_timestamp": None,
+        "tts": False,
+        "mention_everyone": False,
+        "pinned": False,
+        "type": 0,
+        "author": {**AUTHOR, "avatar": None},
+        "mentions": [],
+        "mention_roles": [],
+        "attachments": [],
+        "embeds": [{"title": "a", "fields": [{"name": "n", "value": "v"}]}],
+        **extra,
+    }
+
+
+def test_scalar_fields_are_structured_upfront():
+    message = create_model(message_payload(), Message)
+    assert message.id == 334385199974967042
+    assert message.content == "Supa Hot"
+    assert message.guild_id is MISSING
+    with pytest.raises(attrs.exceptions.FrozenInstanceError):
+        message.content = "edited"
+
+
+def test_nested_fields_are_structured_on_first_read():
+    payload = message_payload()
+    message = create_model(payload, Message)
+    assert Message.author.raw(message) is payload["author"]
+
+    author = message.author
+    assert isinstance(author, User)
+    assert author.id == 80351110224678912
+    assert message.author is author
+    assert message.embeds[0].fields[0].value == "v"
+    assert message.member is MISSING
+
+
+def test_payloads_decoded_by_the_json_library_work_too():
+    raw = b'{"id": "1", "username": "a", "discriminator": "0", "avatar": null}'
+    user = create_model(loads(raw), User)
+    assert user.id == 1
+    assert user.avatar is None
+
+
+def test_unread_fields_are_unstructured_as_received():
+    payload = message_payload(message_reference={"message_id": "1"})
+    message = create_model(payload, Message)
+    assert message.embeds[0].title == "a"
+
+    data = converter.unstructure(message)
+    assert data["author"] is payload["author"]
+    assert data["message_reference"] is payload["message_reference"]
+    assert data["embeds"] == [{"title": "a", "fields": [{"name": "n", "value": "v"}]}]
+    assert "member" not in data
@@ -0,0 +1,86 @@
+import anyio
+import pytest
+
+from discpyth.backends._anyio.http import HTTPPool
+from discpyth.http.types import Request
+
+pytestmark = pytest.mark.anyio
+
+API = "https://discord.com/api/v10"
+
+
+def channel(n):
+    return f"{API}/channels/{100000000000000000 + n}/messages"
+
+
+async def test_requests_go_to_the_least_loaded_connection(h2_server):
+    release = anyio.Event()
+
+    async def handler(request):
+        if len(h2_server.requests) == 8:
+            release.set()
+        await release.wait()
+        return 200, [], b""
+
+    h2_server.handler = handler
+    async with HTTPPool(size=2) as pool:
+        await pool.connect(API)
+        with anyio.fail_after(5):
+            async with anyio.create_task_group() as tg:
+                for n in range(8):
+                    tg.start_soon(pool.send, Request("GET", channel(n)))
+
+    indices = [request.connection.index for request in h2_server.requests]
+    assert sorted(indices) == [0] * 4 + [1] * 4
+
+
+async def test_a_connection_told_to_go_away_is_replaced(h2_server):
+    async def handler(request):
+        if request.connection.index == 0:
+            await request.connection.goaway(request.stream_id)
+        return 200, [], b""
+
+    h2_server.handler = handler
+    async with HTTPPool(size=2) as pool:
+        await pool.connect(API)
+        first = pool.clients[0]
+        with anyio.fail_after(5):
+            for n in range(6):
+                response = await pool.send(Request("GET", channel(n)))
+                assert response.status == 200
+            await pool.warmup()
+
+        assert first not in pool.clients
+        assert first.connection_initialized is False
+        assert len(pool.clients) == 2
+        assert all(client.is_available for client in pool.clients)
+
+    assert len(h2_server.connections) == 3
+
+
+async def test_batches_are_sent_across_the_pool(h2_server):
+    async with HTTPPool(size=2) as pool:
+        await pool.connect(API)
+        requests = [Request("GET", channel(n)) for n in range(10)]
+        results = []
+        with anyio.fail_after(5):
+            async for result in pool.send_many(requests, concurrency=4):
+                results.append(result)
+
+    assert sorted(result.index for result in results) == list(range(10))
+    assert all(result.result().status == 200 for result in results)
+
+
+async def test_warmup_replaces_connections_that_stopped_answering(h2_server):
+    async with HTTPPool(size=2, keepalive_timeout=0.1) as pool:
+        await pool.connect(API)
+        with anyio.fail_after(5):
+            await pool.warmup()
+            h2_server.connections[0].frozen = True
+            await pool.warmup()
+
+        assert len(pool.clients) == 2
+        assert all(client.is_available for client in pool.clients)
+        assert pool.rtt is not None
+
+    assert len(h2_server.connections) == 3
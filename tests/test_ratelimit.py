@@ -0,0 +1,160 @@
+from time import monotonic
+
+import anyio
+import pytest
+
+from discpyth.backends._anyio.http import BucketManager
+from discpyth.http.priority import Priority
+from discpyth.http.ratelimit import GlobalLimiter, route_key
+from discpyth.http.types import Headers
+
+pytestmark = pytest.mark.anyio
+
+MESSAGES = "/api/v10/channels/1/messages"
+PINS = "/api/v10/channels/1/pins"
+
+
+def ratelimit_headers(remaining, reset_after=10.0, limit=5, bucket=b"abcd", **extra):
+    raw = [
+        (b"x-ratelimit-limit", str(limit).encode()),
+        (b"x-ratelimit-remaining", str(remaining).encode()),
+        (b"x-ratelimit-reset-after", str(reset_after).encode()),
+        (b"x-ratelimit-bucket", bucket),
+    ]
+    raw += [(name.replace("_", "-").encode(), value) for name, value in extra.items()]
+    return Headers(raw)
+
+
+async def request(manager, path, status=200, headers=None, method=b"GET"):
+    token = await manager.acquire(method, path)
+    manager.release(token, method, path, status, headers)
+
+
+async def acquires_within(manager, path, seconds=0.05):
+    with anyio.move_on_after(seconds):
+        token = await manager.acquire(b"GET", path)
+        manager.release(token, b"GET", path)
+        return True
+    return False
+
+
+def test_route_key_splits_major_parameters():
+    path = "/api/v10/channels/123456789012345678/messages/876543210987654321"
+    assert route_key(b"GET", path + "?limit=5") == (
+        "GET /api/v10/channels/{id}/messages/{id}",
+        "123456789012345678",
+    )
+
+
+async def test_unknown_buckets_let_one_request_through():
+    manager = BucketManager()
+    token = await manager.acquire(b"GET", MESSAGES)
+    assert not await acquires_within(manager, MESSAGES)
+
+    manager.release(token, b"GET", MESSAGES, 200, ratelimit_headers(4))
+    assert await acquires_within(manager, MESSAGES)
+
+
+async def test_routes_without_headers_are_unlimited():
+    manager = BucketManager()
+    await request(manager, MESSAGES, headers=Headers([]))
+    tokens = [await manager.acquire(b"GET", MESSAGES) for _ in range(10)]
+    assert len(tokens) == 10
+
+
+async def test_exhausted_buckets_wait_for_the_reset():
+    manager = BucketManager()
+    await request(manager, MESSAGES, headers=ratelimit_headers(0, reset_after=0.2))
+
+    start = monotonic()
+    await request(manager, MESSAGES)
+    assert monotonic() - start >= 0.15
+
+
+async def test_buckets_are_shared_by_hash_and_major_parameter():
+    manager = BucketManager()
+    await request(manager, MESSAGES, headers=ratelimit_headers(0))
+    await request(manager, "/api/v10/channels/2/messages", headers=ratelimit_headers(4))
+
+    # Same bucket hash for another route of channel 1, not of channel 2
+    await request(manager, PINS, headers=ratelimit_headers(3))
+    assert not await acquires_within(manager, MESSAGES)
+    assert await acquires_within(manager, "/api/v10/channels/2/messages")
+
+
+async def test_429_exhausts_the_shared_bucket_of_an_in_flight_request():
+    manager = BucketManager()
+    await request(manager, MESSAGES, headers=ratelimit_headers(4))
+
+    # Acquired before its route is known to share the bucket of MESSAGES
+    token = await manager.acquire(b"GET", PINS)
+    manager.release(
+        token,
+        b"GET",
+        PINS,
+        429,
+        Headers([(b"retry-after", b"10"), (b"x-ratelimit-scope", b"user")]),
+    )
+    assert await acquires_within(manager, MESSAGES)
+
+    token = await manager.acquire(b"GET", PINS)
+    manager.release(token, b"GET", PINS, 429, ratelimit_headers(1, retry_after=b"10"))
+    assert not await acquires_within(manager, MESSAGES)
+
+
+async def test_global_429_pauses_every_route():
+    manager = BucketManager()
+    await request(
+        manager,
+        MESSAGES,
+        429,
+        Headers([(b"retry-after", b"0.2"), (b"x-ratelimit-global", b"true")]),
+    )
+
+    start = monotonic()
+    await request(manager, "/api/v10/guilds/1/members")
+    assert monotonic() - start >= 0.15
+
+
+async def test_interactions_skip_the_global_limit():
+    manager = BucketManager()
+    manager.global_limiter.pause(10.0)
+    assert await acquires_within(manager, "/api/v10/interactions/1/token/callback")
+    assert not await acquires_within(manager, MESSAGES)
+
+
+async def test_waiters_are_let_through_by_priority():
+    manager = BucketManager()
+    await request(manager, MESSAGES, headers=ratelimit_headers(0, reset_after=0.1))
+
+    order = []
+
+    async def wait(priority):
+        token = await manager.acquire(b"GET", MESSAGES, priority)
+        order.append(priority)
+        manager.release(token, b"GET", MESSAGES, 200, ratelimit_headers(0, 0.1))
+
+    async with anyio.create_task_group() as task_group:
+        task_group.start_soon(wait, Priority.BACKGROUND)
+        await anyio.sleep(0.01)
+        task_group.start_soon(wait, Priority.NORMAL)
+        await anyio.sleep(0.01)
+        task_group.start_soon(wait, Priority.INTERACTIVE)
+
+    assert order == [Priority.INTERACTIVE, Priority.NORMAL, Priority.BACKGROUND]
+
+
+def test_global_limiter_spaces_out_reservations():
+    limiter = GlobalLimiter(rate=5, per=1.0)
+    delays = [limiter.reserve() for _ in range(6)]
+    assert delays[:5] == [0.0] * 5
+    assert delays[5] > 0.9
+
+
+def test_background_requests_leave_headroom():
+    limiter = GlobalLimiter(rate=10, per=1.0)
+    spare = [limiter.try_reserve_spare() for _ in range(10)]
+    assert spare[:8] == [None] * 8
+    assert spare[8] > 0.9
+    # Everyone else still gets the rest of the window
+    assert limiter.reserve() == 0.0
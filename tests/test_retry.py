@@ -0,0 +1,194 @@
+from io import BytesIO
+
+import pytest
+from conftest import FakeServer
+from h2.errors import ErrorCodes
+
+from discpyth.http.exceptions import (
+    ConnectionLost,
+    HTTPException,
+    ServerError,
+    StreamRefused,
+    StreamReset,
+)
+from discpyth.http.retry import RetryPolicy
+from discpyth.http.types import ContentType, Request
+
+pytestmark = pytest.mark.anyio
+
+URL = "https://discord.com/api/v10/channels/1/messages"
+
+
+async def chunks(*parts):
+    for part in parts:
+        yield part
+
+
+async def call(policy, method, server):
+    return await policy.call(Request(method, URL), server.send, server.sleep)
+
+
+async def test_success_is_returned_right_away():
+    server = FakeServer(200)
+    response = await call(RetryPolicy(), "POST", server)
+    assert response.status == 200
+    assert server.calls == 1
+
+
+async def test_refused_streams_are_capped_by_count():
+    server = FakeServer(StreamRefused("connection is closed"))
+    with pytest.raises(StreamRefused):
+        await call(RetryPolicy(max_refusals=3, deadline=3600.0), "POST", server)
+    assert server.calls == 4
+
+
+async def test_refused_streams_do_not_count_as_retries():
+    server = FakeServer(StreamRefused("GOAWAY"), StreamRefused("GOAWAY"), 503, 200)
+    response = await call(RetryPolicy(max_retries=1, base=0.0), "GET", server)
+    assert response.status == 200
+    assert server.calls == 4
+
+
+async def test_rate_limited_requests_wait_for_retry_after():
+    server = FakeServer((429, [(b"retry-after", b"1.5")]), 200)
+    response = await call(RetryPolicy(base=0.0), "POST", server)
+    assert response.status == 200
+    assert server.sleeps == [1.5]
+
+
+async def test_server_errors_are_retried_for_idempotent_methods():
+    server = FakeServer(500, 502, 200)
+    response = await call(RetryPolicy(base=0.0), "PUT", server)
+    assert response.status == 200
+    assert server.calls == 3
+
+
+async def test_server_errors_are_raised_for_other_methods():
+    server = FakeServer(500, 200)
+    with pytest.raises(ServerError):
+        await call(RetryPolicy(base=0.0), "POST", server)
+    assert server.calls == 1
+
+
+async def test_gives_up_after_max_retries():
+    server = FakeServer(503)
+    with pytest.raises(ServerError):
+        await call(RetryPolicy(max_retries=2, base=0.0), "GET", server)
+    assert server.calls == 3
+
+
+async def test_client_errors_are_not_retried():
+    server = FakeServer(400, 200)
+    with pytest.raises(HTTPException) as info:
+        await call(RetryPolicy(base=0.0), "GET", server)
+    assert info.value.code == 400
+    assert server.calls == 1
+
+
+async def test_lost_connections_are_retried_for_idempotent_methods():
+    server = FakeServer(ConnectionLost("reset"), 200)
+    response = await call(RetryPolicy(base=0.0), "GET", server)
+    assert response.status == 200
+
+    server = FakeServer(ConnectionLost("reset"), 200)
+    with pytest.raises(ConnectionLost):
+        await call(RetryPolicy(base=0.0), "POST", server)
+
+
+async def test_only_refused_stream_resets_are_retried():
+    server = FakeServer(StreamReset(1, ErrorCodes.REFUSED_STREAM), 200)
+    response = await call(RetryPolicy(base=0.0), "POST", server)
+    assert response.status == 200
+
+    server = FakeServer(StreamReset(1, ErrorCodes.INTERNAL_ERROR), 200)
+    with pytest.raises(StreamReset):
+        await call(RetryPolicy(base=0.0), "GET", server)
+
+
+async def test_deadline_stops_retries():
+    server = FakeServer((429, [(b"retry-after", b"30")]), 200)
+    with pytest.raises(HTTPException):
+        await call(RetryPolicy(deadline=10.0), "GET", server)
+    assert server.calls == 1
+
+
+async def test_multipart_parts_read_once_are_not_resent():
+    request = Request(
+        "POST",
+        URL,
+        content_type=ContentType.MULTIPART,
+        files={"file": ("a.txt", chunks(b"first", b"second"))},
+    )
+    server = FakeServer(503, 200, read_body=True)
+    with pytest.raises(ServerError):
+        await RetryPolicy(base=0.0).call(request, server.send, server.sleep)
+    assert server.calls == 1
+    assert not request.replayable
+    assert b"firstsecond" in server.bodies[0]
+
+
+async def test_multipart_parts_read_once_survive_a_refusal_before_sending():
+    request = Request(
+        "POST",
+        URL,
+        content_type=ContentType.MULTIPART,
+        files={"file": ("a.txt", chunks(b"data"))},
+    )
+    server = FakeServer(StreamRefused("GOAWAY"), 200)
+    response = await RetryPolicy().call(request, server.send, server.sleep)
+    assert response.status == 200
+    assert server.calls == 2
+
+
+async def test_multipart_parts_read_again_are_resent(tmp_path):
+    path = tmp_path / "a.txt"
+    path.write_bytes(b"on disk")
+    request = Request(
+        "PUT",
+        URL,
+        content_type=ContentType.MULTIPART,
+        data={"payload_json": "{}"},
+        files={"file": ("a.txt", path)},
+    )
+    server = FakeServer(503, 200, read_body=True)
+    response = await RetryPolicy(base=0.0).call(request, server.send, server.sleep)
+    assert response.status == 200
+    assert server.calls == 2
+    assert request.replayable
+    assert b"on disk" in server.bodies[1]
+    assert len(server.bodies[0]) == len(server.bodies[1])
+
+
+async def test_content_read_once_is_not_resent():
+    request = Request(
+        "PUT", URL, content_type=ContentType.CONTENT, data=chunks(b"a", b"b")
+    )
+    server = FakeServer(503, 200, read_body=True)
+    with pytest.raises(ServerError):
+        await RetryPolicy(base=0.0).call(request, server.send, server.sleep)
+    assert server.bodies == [b"ab"]
+    with pytest.raises(RuntimeError):
+        await request.read()
+
+
+async def test_content_iterated_afresh_is_resent():
+    class Chunks:
+        def __aiter__(self):
+            return chunks(b"a", b"b")
+
+    request = Request("PUT", URL, content_type=ContentType.CONTENT, data=Chunks())
+    server = FakeServer(503, 200, read_body=True)
+    response = await RetryPolicy(base=0.0).call(request, server.send, server.sleep)
+    assert response.status == 200
+    assert server.bodies == [b"ab", b"ab"]
+
+
+async def test_seekable_content_is_resent_from_where_it_started():
+    file = BytesIO(b"header;payload")
+    file.seek(7)
+    request = Request("PUT", URL, content_type=ContentType.CONTENT, data=file)
+    server = FakeServer(503, 200, read_body=True)
+    response = await RetryPolicy(base=0.0).call(request, server.send, server.sleep)
+    assert response.status == 200
+    assert server.bodies == [b"payload", b"payload"]
+    assert request.replayable
@@ -0,0 +1,55 @@
+import pytest
+
+from discpyth.http import endpoints
+from discpyth.http.priority import Priority
+from discpyth.http.route import API_BASE, Route
+from discpyth.http.types import Request
+
+ROUTES = [value for value in vars(endpoints).values() if isinstance(value, Route)]
+VALUES = {
+    "channel_id": 100000000000000001,
+    "message_id": 200000000000000002,
+    "guild_id": 300000000000000003,
+    "user_id": 400000000000000004,
+    "role_id": 500000000000000005,
+    "webhook_id": 600000000000000006,
+    "application_id": 700000000000000007,
+    "interaction_id": 800000000000000008,
+    "interaction_token": "a" * 70,
+    "webhook_token": "b" * 70,
+    "emoji": "👍",
+}
+
+
+@pytest.mark.parametrize("route", ROUTES, ids=repr)
+def test_routes_match_parsed_requests(route):
+    assert route.route is not None
+
+    request = route.request(VALUES, params={"limit": 50})
+    assert "url" not in request.__dict__
+    parsed = Request(route.method, request.url_string)
+    assert request.path == parsed.path
+    assert request.endpoint == parsed.endpoint
+    assert request.authority == parsed.authority
+    assert request.route_key == parsed.route_key
+    assert request.priority == parsed.priority
+
+
+def test_requests_are_only_parsed_when_needed():
+    url = f"{API_BASE}/interactions/800000000000000008/{'a' * 70}/callback"
+    request = Request("POST", url)
+    assert request.priority == Priority.INTERACTIVE
+    assert "url" not in request.__dict__
+    assert request.endpoint.startswith("/api/v10/interactions/")
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        f"{API_BASE}/channels/100000000000000001/messages",
+        f"{API_BASE}/channels/100000000000000001/messages?q=/interactions/",
+        "https://discord.com/interactions",
+    ],
+)
+def test_other_requests_have_normal_priority(url):
+    assert Request("GET", url).priority == Priority.NORMAL
@@ -0,0 +1,193 @@
+from io import BytesIO
+from urllib.parse import urlencode
+
+import pytest
+from hpack import NeverIndexedHeaderTuple
+
+from discpyth.http import types
+from discpyth.http.exceptions import Forbidden, HTTPException, NotFound, ServerError
+from discpyth.http.types import (
+    CHUNK_SIZE,
+    ContentType,
+    Request,
+    Response,
+    encode_form,
+    freeze_headers,
+)
+from discpyth.utils import MISSING, define, dumps, loads
+
+pytestmark = pytest.mark.anyio
+
+URL = "https://discord.com/api/v10/channels/1/messages"
+
+
+def response(status=200, headers=(), content=b""):
+    raw = [(b":status", str(status).encode())] + list(headers)
+    return Response.from_raw(raw, content, Request("GET", URL))
+
+
+def test_response_headers_are_case_insensitive():
+    headers = response(
+        headers=[
+            (b"Content-Type", b"application/json"),
+            (b"vary", b"a"),
+            (b"Vary", b"b"),
+        ]
+    ).headers
+    assert headers["content-type"] == b"application/json"
+    assert headers[b"CONTENT-TYPE"] == b"application/json"
+    assert headers["vary"] == b"a, b"
+    assert "x-missing" not in headers
+    assert b":status" not in headers
+
+
+def test_response_body_is_decoded_once():
+    resp = response(content=b'{"id": "1"}')
+    assert resp.status == 200
+    assert resp.ok
+    assert isinstance(resp.content, memoryview)
+    assert resp.json() == {"id": "1"}
+    assert resp.json() is resp.json()
+    assert response(204).json() is None
+
+
+@pytest.mark.parametrize(
+    "status, exception",
+    [(403, Forbidden), (404, NotFound), (503, ServerError), (429, HTTPException)],
+)
+def test_error_statuses_raise(status, exception):
+    resp = response(status)
+    assert not resp.ok
+    with pytest.raises(exception) as info:
+        resp.raise_for_status()
+    assert info.value.code == status
+    assert info.value.response is resp
+
+
+def test_successful_statuses_do_not_raise():
+    response(200).raise_for_status()
+    response(304).raise_for_status()
+
+
+async def read_body(request):
+    headers, body = await request.read()
+    chunks = []
+    async for chunk in body:
+        # Copied, the next chunk may overwrite this one
+        chunks.append((chunk, bytes(chunk)))
+    return headers, chunks
+
+
+async def test_file_chunks_are_read_into_a_reused_buffer():
+    data = bytes(range(256)) * (CHUNK_SIZE // 128 + 1)
+    first = Request("PUT", URL, content_type=ContentType.CONTENT, data=BytesIO(data))
+    _, chunks = await read_body(first)
+    assert b"".join(copy for _, copy in chunks) == data
+    assert len({id(chunk.obj) for chunk, _ in chunks}) == 1
+
+    second = Request("PUT", URL, content_type=ContentType.CONTENT, data=BytesIO(data))
+    _, again = await read_body(second)
+    assert again[0][0].obj is chunks[0][0].obj
+
+
+async def test_multipart_parts_from_files_are_sent_whole():
+    data = b"x" * (CHUNK_SIZE * 2 + 5)
+    request = Request(
+        "POST",
+        URL,
+        content_type=ContentType.MULTIPART,
+        data={"payload_json": "{}"},
+        files={"files[0]": ("a.bin", BytesIO(data))},
+    )
+    headers, chunks = await read_body(request)
+    body = b"".join(copy for _, copy in chunks)
+    assert int(headers[b"content-length"]) == len(body)
+    assert data in body
+
+
+@define
+class Embed:
+    title: str
+    color: int = 0
+
+
+async def json_body(data):
+    request = Request("POST", URL, content_type=ContentType.JSON, data=data)
+    headers, chunks = await read_body(request)
+    body = b"".join(copy for _, copy in chunks)
+    assert headers[b"content-type"] == b"application/json"
+    assert int(headers[b"content-length"]) == len(body)
+    return body
+
+
+async def test_json_bodies_are_compact_utf8():
+    body = await json_body({"content": "héllo", 123: [True, None]})
+    assert body == '{"content":"héllo","123":[true,null]}'.encode()
+
+
+async def test_models_in_json_bodies_are_unstructured():
+    body = await json_body({"embeds": [Embed("a"), Embed("b", 5)]})
+    assert loads(body) == {"embeds": [{"title": "a"}, {"title": "b", "color": 5}]}
+
+
+async def test_serialized_json_is_sent_as_is():
+    assert await json_body(b'{"already": "encoded"}') == b'{"already": "encoded"}'
+
+
+async def test_json_bodies_are_serialized_once(monkeypatch):
+    calls = []
+
+    def counting_dumps(obj):
+        calls.append(obj)
+        return dumps(obj)
+
+    monkeypatch.setattr(types, "dumps", counting_dumps)
+    request = Request("POST", URL, content_type=ContentType.JSON, data={"a": 1})
+    _, first = await read_body(request)
+    _, second = await read_body(request)
+    assert [copy for _, copy in first] == [copy for _, copy in second] == [b'{"a":1}']
+    assert len(calls) == 1
+
+
+def test_forms_match_urllib():
+    data = {"q": "a b&c=d/é", "limit": 50, "safe": "A-z_0.9~"}
+    assert encode_form(data).decode() == urlencode(data)
+
+
+def test_form_values_are_coerced_per_type():
+    data = [
+        ("flag", True),
+        ("off", False),
+        ("empty", None),
+        ("ids", [1, 2]),
+        ("skipped", MISSING),
+        ("raw", b"x y"),
+        ("ratio", 0.5),
+    ]
+    assert encode_form(data) == (
+        b"flag=true&off=false&empty=&ids=1&ids=2&raw=x+y&ratio=0.5"
+    )
+
+
+async def test_url_encoded_bodies_carry_their_data():
+    request = Request(
+        "POST", URL, content_type=ContentType.URL_ENCODED, data={"a": 1, "b": "c d"}
+    )
+    headers, chunks = await read_body(request)
+    assert headers[b"content-type"] == b"application/x-www-form-urlencoded"
+    assert b"".join(copy for _, copy in chunks) == b"a=1&b=c+d"
+
+
+def test_params_are_appended_to_the_query():
+    request = Request("GET", URL + "?around=1", params={"limit": 5, "after": MISSING})
+    assert request.path == "/api/v10/channels/1/messages?around=1&limit=5"
+    assert Request("GET", URL, params={"before": MISSING}).path == (
+        "/api/v10/channels/1/messages"
+    )
+
+
+def test_default_headers_are_encoded_once():
+    frozen = freeze_headers({"User-Agent": "bot", b"X-Audit-Log-Reason": "why"})
+    assert frozen == ((b"user-agent", b"bot"), (b"x-audit-log-reason", b"why"))
+    assert isinstance(frozen[1], NeverIndexedHeaderTuple)
+    assert not isinstance(frozen[0], NeverIndexedHeaderTuple)